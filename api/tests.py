@@ -0,0 +1,178 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from core.changelog import compact_changelog
+from customers.models import Customer
+from products.models import Product
+from sales.models import Sale
+
+
+class PosApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.customer = Customer.objects.create(name='Ali', phone='0300 1234567')
+        self.products = [
+            Product.objects.create(name=f'Tyre {i}', price=Decimal('100.00'), stock_quantity=10, barcode=f'CODE{i}')
+            for i in range(5)
+        ]
+
+    def test_requires_login(self):
+        self.client.logout()
+        resp = self.client.get(reverse('api:product_list'))
+        self.assertEqual(resp.status_code, 401)
+
+    def test_sparse_fields_and_cursor_pagination(self):
+        url = reverse('api:product_list')
+        resp = self.client.get(url, {'fields': 'id,name', 'limit': 2})
+        data = resp.json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(set(data['results'][0]), {'id', 'name'})
+        seen = [r['id'] for r in data['results']]
+        while data['next_cursor']:
+            data = self.client.get(url, {'fields': 'id', 'limit': 2, 'cursor': data['next_cursor']}).json()
+            seen += [r['id'] for r in data['results']]
+        self.assertEqual(seen, sorted((p.id for p in self.products), reverse=True))
+        self.assertEqual(self.client.get(url, {'fields': 'nope'}).status_code, 400)
+
+    def test_etag_not_modified(self):
+        url = reverse('api:product_detail', args=[self.products[0].id])
+        resp = self.client.get(url)
+        etag = resp['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Product.objects.filter(pk=self.products[0].id).update(price=Decimal('120.00'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cart_and_checkout(self):
+        cart_url = reverse('api:cart')
+        self.client.post(cart_url, {'product_id': self.products[0].id, 'quantity': 2}, content_type='application/json')
+        resp = self.client.post(cart_url, {'code': 'CODE1'}, content_type='application/json')
+        self.assertEqual(resp.json()['count'], 2)
+        resp = self.client.put(reverse('api:cart_item', args=[self.products[1].id]), {'quantity': 3}, content_type='application/json')
+        self.assertEqual(resp.json()['total'], '500.00')
+
+        resp = self.client.post(reverse('api:checkout'), {
+            'customer_id': self.customer.id, 'payment_type': 'INSTALLMENT', 'total_installments': 2,
+        }, content_type='application/json')
+        self.assertEqual(resp.status_code, 201)
+        sale = Sale.objects.get(pk=resp.json()['id'])
+        self.assertEqual(sale.total_amount, Decimal('500.00'))
+        self.assertEqual(len(resp.json()['items']), 2)
+        self.assertEqual(self.client.get(cart_url).json()['count'], 0)
+
+        plan_id = self.client.get(reverse('api:installment_list')).json()['results'][0]['id']
+        resp = self.client.post(reverse('api:installment_payment', args=[plan_id]), {'amount': '500'}, content_type='application/json')
+        self.assertEqual(resp.json()['plan']['status'], 'PAID')
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.balance, Decimal('0'))
+
+    def test_checkout_refuses_stale_cart_prices(self):
+        self.client.post(reverse('api:cart'), {'product_id': self.products[0].id, 'quantity': 2}, content_type='application/json')
+        Product.objects.filter(pk=self.products[0].id).update(price=Decimal('120.00'))
+        resp = self.client.post(reverse('api:checkout'), {}, content_type='application/json')
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()['price_changes'][0]['new_price'], '120.00')
+        self.assertEqual(resp.json()['cart']['total'], '240.00')
+        self.assertFalse(Sale.objects.exists())
+        resp = self.client.post(reverse('api:checkout'), {}, content_type='application/json')
+        self.assertEqual((resp.status_code, resp.json()['total_amount']), (201, '240.00'))
+
+    def test_checkout_insufficient_stock(self):
+        self.client.post(reverse('api:cart'), {'product_id': self.products[0].id, 'quantity': 50}, content_type='application/json')
+        resp = self.client.post(reverse('api:checkout'), {}, content_type='application/json')
+        self.assertEqual(resp.status_code, 409)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+
+    def _sync(self, since, limit=500):
+        return self.client.get(reverse('api:sync'), {'since': since, 'limit': limit}).json()
+
+    def test_only_changes_since_sequence(self):
+        a = Product.objects.create(name='A', price=Decimal('1.00'))
+        b = Product.objects.create(name='B', price=Decimal('2.00'))
+        Customer.objects.create(name='Ali')
+        first = self._sync(0)
+        self.assertFalse(first['more'])
+        self.assertEqual([r[1] for r in first['product']['rows']], ['A', 'B'])
+        self.assertEqual(len(first['customer']['rows']), 1)
+
+        a.price = Decimal('1.50')
+        a.save()
+        b_id = b.id
+        b.delete()
+        delta = self._sync(first['seq'])
+        self.assertEqual(delta['product']['rows'], [[a.id, 'A', None, None, None, None, '1.50', 0]])
+        self.assertEqual(delta['product']['deleted'], [b_id])
+        self.assertEqual(delta['customer']['rows'], [])
+        self.assertEqual(self._sync(delta['seq'])['seq'], delta['seq'])
+
+    def test_batches_and_compaction(self):
+        product = Product.objects.create(name='A', price=Decimal('1.00'))
+        for i in range(4):
+            product.stock_quantity = i
+            product.save(update_fields=['stock_quantity'])
+        batch = self._sync(0, limit=2)
+        self.assertTrue(batch['more'])
+        self.assertEqual(len(batch['product']['rows']), 1)
+        self.assertEqual(compact_changelog(), 4)
+        final = self._sync(0)
+        self.assertEqual(final['product']['rows'][0][7], 3)
+
+
+class SaleBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.customer = Customer.objects.create(name='Ali')
+        self.tyre = Product.objects.create(name='Tyre', price=Decimal('100.00'), stock_quantity=3)
+
+    def _post(self, sales):
+        return self.client.post(reverse('api:sale_batch'), {'sales': sales}, content_type='application/json').json()
+
+    def test_batch_is_idempotent_and_reports_per_sale(self):
+        sales = [
+            {'client_ref': 't1-1', 'customer_id': self.customer.id, 'items': [{'product_id': self.tyre.id, 'quantity': 1}],
+             'date': '2026-01-05T10:30:00'},
+            {'client_ref': 't1-2', 'items': [{'product_id': self.tyre.id, 'quantity': 1, 'price': '90.00'}]},
+            {'client_ref': 't1-3', 'items': [{'product_id': self.tyre.id, 'quantity': 5}]},
+            {'client_ref': 't1-4', 'payment_type': 'INSTALLMENT', 'customer_id': self.customer.id,
+             'installment': {'total_installments': 2}, 'items': [{'product_id': self.tyre.id, 'quantity': 1}]},
+        ]
+        data = self._post(sales)
+        self.assertEqual([r['status'] for r in data['results']], ['created', 'created', 'error', 'created'])
+        self.assertIn('Insufficient stock', data['results'][2]['error'])
+        self.tyre.refresh_from_db()
+        self.assertEqual(self.tyre.stock_quantity, 0)
+        first = Sale.objects.get(client_ref='t1-1')
+        self.assertEqual(first.date.date().isoformat(), '2026-01-05')
+        self.assertEqual(Sale.objects.get(client_ref='t1-2').total_amount, Decimal('90.00'))
+
+        replay = self._post(sales)
+        self.assertEqual([r['status'] for r in replay['results']], ['duplicate', 'duplicate', 'error', 'duplicate'])
+        self.assertEqual(replay['results'][0]['sale_id'], first.id)
+        self.assertEqual(Sale.objects.count(), 3)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.sale_count, 2)
+
+    def test_malformed_and_rejected_entries_fail_alone(self):
+        item = {'product_id': self.tyre.id, 'quantity': 1}
+        data = self._post([
+            {'client_ref': 'b-1', 'items': ['oops']},
+            {'client_ref': 'b-2', 'payment_type': 'INSTALLMENT', 'installment': 'x', 'items': [item]},
+            {'client_ref': 'b-3', 'payment_type': 'INSTALLMENT', 'customer_id': self.customer.id,
+             'installment': {'total_installments': -3}, 'items': [item]},
+            {'client_ref': 'b-4', 'items': [item]},
+        ])
+        self.assertEqual([(r['status'], r.get('error')) for r in data['results']], [
+            ('error', 'items must be a list of objects'),
+            ('error', 'installment must be an object'),
+            ('error', 'Sale rejected by the database'),
+            ('created', None),
+        ])
+        self.assertEqual(list(Sale.objects.values_list('client_ref', flat=True)), ['b-4'])
@@ -0,0 +1,20 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('products/', views.product_list, name='product_list'),
+    path('products/<int:pk>/', views.product_detail, name='product_detail'),
+    path('customers/', views.customer_list, name='customer_list'),
+    path('customers/<int:pk>/', views.customer_detail, name='customer_detail'),
+    path('cart/', views.cart, name='cart'),
+    path('cart/<int:product_id>/', views.cart_item, name='cart_item'),
+    path('sync/', views.sync, name='sync'),
+    path('checkout/', views.checkout, name='checkout'),
+    path('sales/', views.sale_list, name='sale_list'),
+    path('sales/batch/', views.sale_batch, name='sale_batch'),
+    path('sales/<int:pk>/', views.sale_detail, name='sale_detail'),
+    path('installments/', views.installment_list, name='installment_list'),
+    path('installments/<int:plan_id>/payments/', views.installment_payment, name='installment_payment'),
+]
@@ -0,0 +1,120 @@
+import base64
+import hashlib
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from core.metrics import cache_lookup, instrument
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        # Further keys for the JSON error body
+        self.extra = extra
+
+
+def api_view(methods=('GET',)):
+    """Wrap a JSON endpoint: session auth (401 instead of a login redirect), allowed methods
+    and ApiError/Http404 -> JSON error responses."""
+    def decorator(view):
+        @instrument
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JsonResponse({'error': 'Authentication required.'}, status=401)
+            if request.method not in methods:
+                response = JsonResponse({'error': f'Method {request.method} not allowed.'}, status=405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as e:
+                return JsonResponse({'error': e.message, **e.extra}, status=e.status)
+            except Http404:
+                return JsonResponse({'error': 'Not found.'}, status=404)
+        return wrapper
+    return decorator
+
+
+def json_body(request):
+    """Request payload from a JSON body, falling back to form-encoded POST data."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise ApiError('Malformed JSON body.')
+        if not isinstance(data, dict):
+            raise ApiError('JSON body must be an object.')
+        return data
+    return request.POST.dict()
+
+
+def json_response(request, payload, status=200):
+    """JsonResponse with a content-hash ETag; answers 304 when If-None-Match matches."""
+    body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':'))
+    etag = quote_etag(hashlib.md5(body.encode(), usedforsecurity=False).hexdigest())
+    if request.method in ('GET', 'HEAD') and status == 200:
+        conditional = get_conditional_response(request, etag=etag)
+        cache_lookup('api_etag', conditional is not None)
+        if conditional is not None:
+            return conditional
+    response = HttpResponse(body, status=status, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+def select_fields(request, available, default):
+    """Sparse fieldsets: ``?fields=id,name`` picks a subset of ``available`` (name -> getter)."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(default)
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise ApiError(f'Unknown field(s): {", ".join(unknown)}. Available: {", ".join(available)}.')
+    return fields
+
+
+def serialize(obj, fields, available):
+    return {name: available[name](obj) for name in fields}
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError('Invalid cursor.')
+
+
+def paginate(request, qs):
+    """Keyset pagination on descending id: ``?limit=`` and an opaque ``?cursor=``.
+
+    Never issues COUNT(*) or OFFSET, so every page costs one indexed range scan.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        raise ApiError('limit must be an integer.')
+    qs = qs.order_by('-id')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        qs = qs.filter(id__lt=decode_cursor(cursor))
+    rows = list(qs[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
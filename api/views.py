@@ -0,0 +1,313 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Sum
+from django.shortcuts import get_object_or_404
+
+from core.audit import log_event
+from core.changelog import changes_since
+from customers.models import Customer
+from customers.utils import anonymous_customer_id, search_customers
+from products.models import Product
+from products.utils import (add_product_to_cart, cart_total, current_branch, get_cart, product_for_code,
+                            revalidate_cart_prices, save_cart, set_cart_quantity)
+from sales.models import InstallmentPlan, Sale
+from sales.utils import create_sale_from_cart, ingest_sales, record_installment_payment
+from .utils import ApiError, api_view, json_body, json_response, paginate, select_fields, serialize
+
+
+PRODUCT_FIELDS = {
+    name: (lambda obj, name=name: getattr(obj, name))
+    for name in ('id', 'name', 'barcode', 'brand', 'size', 'type', 'price', 'stock_quantity', 'description', 'created_at')
+}
+PRODUCT_DEFAULT = ('id', 'name', 'barcode', 'brand', 'size', 'type', 'price', 'stock_quantity')
+
+CUSTOMER_FIELDS = {
+    name: (lambda obj, name=name: getattr(obj, name))
+    for name in ('id', 'name', 'phone', 'email', 'address', 'balance', 'lifetime_value', 'sale_count',
+                 'last_purchase_at', 'created_at')
+}
+CUSTOMER_DEFAULT = ('id', 'name', 'phone', 'balance')
+
+SALE_ITEM_FIELDS = ('product_id', 'quantity', 'unit_price', 'subtotal')
+SALE_FIELDS = {
+    'id': lambda s: s.id,
+    'date': lambda s: s.date,
+    'customer_id': lambda s: s.customer_id,
+    'customer_name': lambda s: s.customer.name,
+    'branch_id': lambda s: s.branch_id,
+    'payment_type': lambda s: s.payment_type,
+    'total_amount': lambda s: s.total_amount,
+    'is_completed': lambda s: s.is_completed,
+    'created_by': lambda s: s.created_by.username,
+    'items': lambda s: [{f: getattr(i, f) for f in SALE_ITEM_FIELDS} for i in s.items.all()],
+}
+SALE_DEFAULT = ('id', 'date', 'customer_id', 'customer_name', 'payment_type', 'total_amount')
+
+PLAN_FIELDS = {
+    'id': lambda p: p.id,
+    'sale_id': lambda p: p.sale_id,
+    'customer_id': lambda p: p.sale.customer_id,
+    'customer_name': lambda p: p.sale.customer.name,
+    'status': lambda p: p.status,
+    'total_installments': lambda p: p.total_installments,
+    'installment_amount': lambda p: p.installment_amount,
+    'first_due_date': lambda p: p.first_due_date,
+    'total_due': lambda p: p.sale.total_amount,
+    'paid': lambda p: p.paid or Decimal('0'),
+}
+PLAN_DEFAULT = ('id', 'sale_id', 'customer_id', 'status', 'total_due', 'paid')
+
+SYNC_MODELS = {
+    'product': (Product, PRODUCT_DEFAULT),
+    'customer': (Customer, CUSTOMER_DEFAULT),
+}
+INGEST_MAX_SALES = 500
+
+SYNC_DEFAULT_LIMIT = 500
+SYNC_MAX_LIMIT = 5000
+
+
+def _list(request, qs, available, default):
+    fields = select_fields(request, available, default)
+    rows, next_cursor = paginate(request, qs)
+    return json_response(request, {
+        'results': [serialize(obj, fields, available) for obj in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+def _sales_qs(fields):
+    qs = Sale.objects.all()
+    if 'customer_name' in fields:
+        qs = qs.select_related('customer')
+    if 'created_by' in fields:
+        qs = qs.select_related('created_by')
+    if 'items' in fields:
+        qs = qs.prefetch_related('items')
+    return qs
+
+
+def _plans_qs(fields):
+    qs = InstallmentPlan.objects.select_related('sale')
+    if 'customer_name' in fields:
+        qs = qs.select_related('sale__customer')
+    if 'paid' in fields:
+        qs = qs.annotate(paid=Sum('payments__amount_paid'))
+    return qs
+
+
+def _cart_payload(cart):
+    return {'items': list(cart.values()), 'total': cart_total(cart), 'count': len(cart)}
+
+
+def _int(data, key, default=None):
+    value = data.get(key, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f'{key} must be an integer.')
+
+
+@api_view()
+def product_list(request):
+    fields = select_fields(request, PRODUCT_FIELDS, PRODUCT_DEFAULT)
+    qs = Product.objects.only(*set(fields) | {'id'})
+    return _list(request, qs, PRODUCT_FIELDS, PRODUCT_DEFAULT)
+
+
+@api_view()
+def product_detail(request, pk):
+    fields = select_fields(request, PRODUCT_FIELDS, PRODUCT_DEFAULT)
+    product = get_object_or_404(Product.objects.only(*set(fields) | {'id'}), pk=pk)
+    return json_response(request, serialize(product, fields, PRODUCT_FIELDS))
+
+
+@api_view()
+def customer_list(request):
+    fields = select_fields(request, CUSTOMER_FIELDS, CUSTOMER_DEFAULT)
+    q = request.GET.get('q', '').strip()
+    if q:
+        # Typeahead results are capped, not paged
+        results = search_customers(q).only(*set(fields) | {'id'})
+        return json_response(request, {
+            'results': [serialize(c, fields, CUSTOMER_FIELDS) for c in results],
+            'next_cursor': None,
+        })
+    return _list(request, Customer.objects.only(*set(fields) | {'id'}), CUSTOMER_FIELDS, CUSTOMER_DEFAULT)
+
+
+@api_view()
+def customer_detail(request, pk):
+    fields = select_fields(request, CUSTOMER_FIELDS, CUSTOMER_DEFAULT)
+    customer = get_object_or_404(Customer, pk=pk)
+    return json_response(request, serialize(customer, fields, CUSTOMER_FIELDS))
+
+
+@api_view(methods=('GET', 'POST', 'DELETE'))
+def cart(request):
+    cart = get_cart(request)
+    if request.method == 'POST':
+        data = json_body(request)
+        qty = _int(data, 'quantity', 1)
+        if qty <= 0:
+            raise ApiError('quantity must be positive.')
+        if data.get('code'):
+            product = product_for_code(data['code'])
+            if product is None:
+                raise ApiError(f'No product with code "{data["code"]}".', status=404)
+        else:
+            product = get_object_or_404(Product, pk=_int(data, 'product_id'))
+        add_product_to_cart(cart, product, qty)
+        save_cart(request, cart)
+    elif request.method == 'DELETE':
+        cart = {}
+        save_cart(request, cart)
+    return json_response(request, _cart_payload(cart))
+
+
+@api_view(methods=('PUT', 'DELETE'))
+def cart_item(request, product_id):
+    cart = get_cart(request)
+    key = str(product_id)
+    if key not in cart:
+        raise ApiError('Item not in cart.', status=404)
+    qty = 0 if request.method == 'DELETE' else _int(json_body(request), 'quantity')
+    set_cart_quantity(cart, key, qty)
+    save_cart(request, cart)
+    return json_response(request, _cart_payload(cart))
+
+
+@api_view(methods=('POST',))
+def checkout(request):
+    cart = get_cart(request)
+    if not cart:
+        raise ApiError('Your cart is empty.')
+    price_changes = revalidate_cart_prices(cart)
+    if price_changes:
+        # The cart now holds current prices; the terminal shows them and checks out again
+        save_cart(request, cart)
+        raise ApiError('Prices changed since the items were added to the cart.', status=409, price_changes=[
+            {'name': name, 'old_price': str(old_price), 'new_price': str(new_price)}
+            for name, old_price, new_price in price_changes
+        ], cart=_cart_payload(cart))
+    data = json_body(request)
+    customer_id = data.get('customer_id')
+    if customer_id in (None, '', 'anonymous'):
+        customer_id = anonymous_customer_id()
+    payment_type = data.get('payment_type', 'FULL')
+    if payment_type not in dict(Sale.PAYMENT_TYPE_CHOICES):
+        raise ApiError('payment_type must be FULL or INSTALLMENT.')
+    installment_data = None
+    if payment_type == 'INSTALLMENT':
+        installment_data = {
+            'total_installments': _int(data, 'total_installments', 1),
+            'first_due_date': data.get('first_due_date'),
+        }
+    try:
+        sale = create_sale_from_cart(
+            user=request.user,
+            customer_id=customer_id,
+            cart=cart,
+            payment_type=payment_type,
+            installment_data=installment_data,
+            branch=current_branch(request),
+        )
+    except ValueError as e:
+        raise ApiError(str(e), status=409)
+    save_cart(request, {})
+    log_event(request.user, 'create', 'sale', sale.id, f'{sale.get_payment_type_display()} sale of Rs {sale.total_amount} (API)')
+    sale = _sales_qs(SALE_FIELDS).get(pk=sale.pk)
+    return json_response(request, serialize(sale, list(SALE_FIELDS), SALE_FIELDS), status=201)
+
+
+@api_view()
+def sale_list(request):
+    fields = select_fields(request, SALE_FIELDS, SALE_DEFAULT)
+    qs = _sales_qs(fields)
+    if request.GET.get('customer'):
+        qs = qs.filter(customer_id=_int(request.GET, 'customer'))
+    return _list(request, qs, SALE_FIELDS, SALE_DEFAULT)
+
+
+@api_view(methods=('POST',))
+def sale_batch(request):
+    """Ingest queued offline sales: ``{"sales": [...]}`` (see sales.utils.ingest_sales).
+
+    Always answers 200 with per-sale results; replaying the same batch is harmless.
+    """
+    entries = json_body(request).get('sales')
+    if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+        raise ApiError('"sales" must be a list of objects.')
+    if len(entries) > INGEST_MAX_SALES:
+        raise ApiError(f'At most {INGEST_MAX_SALES} sales per batch.', status=413)
+    results = ingest_sales(request.user, entries, default_customer_id=anonymous_customer_id(),
+                           branch=current_branch(request))
+    for result in results:
+        if result['status'] == 'created':
+            log_event(request.user, 'create', 'sale', result['sale_id'], f"Offline sale {result['client_ref']}")
+    summary = {status: sum(1 for r in results if r['status'] == status) for status in ('created', 'duplicate', 'error')}
+    return json_response(request, {'results': results, **summary})
+
+
+@api_view()
+def sale_detail(request, pk):
+    fields = select_fields(request, SALE_FIELDS, list(SALE_FIELDS))
+    sale = get_object_or_404(_sales_qs(fields), pk=pk)
+    return json_response(request, serialize(sale, fields, SALE_FIELDS))
+
+
+@api_view()
+def installment_list(request):
+    fields = select_fields(request, PLAN_FIELDS, PLAN_DEFAULT)
+    qs = _plans_qs(fields)
+    status = request.GET.get('status')
+    if status:
+        qs = qs.filter(status=status.upper())
+    if request.GET.get('customer'):
+        qs = qs.filter(sale__customer_id=_int(request.GET, 'customer'))
+    return _list(request, qs, PLAN_FIELDS, PLAN_DEFAULT)
+
+
+@api_view(methods=('POST',))
+def installment_payment(request, plan_id):
+    plan = get_object_or_404(InstallmentPlan.objects.select_related('sale'), pk=plan_id)
+    try:
+        amount = Decimal(str(json_body(request).get('amount')))
+    except InvalidOperation:
+        raise ApiError('Invalid amount.')
+    if not amount.is_finite() or amount <= 0:
+        raise ApiError('Invalid amount.')
+    payment = record_installment_payment(plan, amount, received_by=request.user)
+    log_event(request.user, 'create', 'payment', payment.pk, f'Rs {amount} on sale #{plan.sale_id} (API)')
+    plan = _plans_qs(PLAN_FIELDS).get(pk=plan.pk)
+    return json_response(request, {
+        'payment_id': payment.id,
+        'plan': serialize(plan, list(PLAN_FIELDS), PLAN_FIELDS),
+    }, status=201)
+
+
+@api_view()
+def sync(request):
+    """Delta catalog sync: records changed after ``?since=<seq>`` in batches of ``?limit=``.
+
+    Response: ``{seq, more, product: {fields, rows, deleted}, customer: {...}}``. ``rows``
+    are positional arrays in ``fields`` order to keep payloads small. Clients store ``seq``
+    and call again while ``more`` is true.
+    """
+    since = _int(request.GET, 'since', 0)
+    limit = min(max(_int(request.GET, 'limit', SYNC_DEFAULT_LIMIT), 1), SYNC_MAX_LIMIT)
+    seq, more, changes = changes_since(since, limit)
+
+    payload = {'seq': seq, 'more': more}
+    for label, (model, fields) in SYNC_MODELS.items():
+        changed = changes.get(label, {})
+        live_ids = [object_id for object_id, deleted in changed.items() if not deleted]
+        rows = list(model.objects.filter(id__in=live_ids).order_by('id').values_list(*fields)) if live_ids else []
+        found = {row[0] for row in rows}
+        payload[label] = {
+            'fields': fields,
+            'rows': rows,
+            # Deleted explicitly, or saved and then deleted after this batch was read
+            'deleted': sorted(object_id for object_id in changed if object_id not in found),
+        }
+    return json_response(request, payload)
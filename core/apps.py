@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        if settings.PRECOMPILE_TEMPLATES:
+            from .warmup import compile_templates
+
+            _, errors = compile_templates()
+            if errors:
+                raise ImproperlyConfigured('Templates failed to compile:\n' + '\n'.join(errors))
@@ -0,0 +1,104 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .db import retry_on_lock
+from .models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+
+class _Buffer:
+    """This process's audit events waiting to be written, and the thread that writes them.
+
+    ``log_event`` only appends under a lock, so a request never waits on the database. The
+    writer wakes every AUDIT_FLUSH_SECONDS, or as soon as AUDIT_BATCH_SIZE events are queued,
+    and inserts whatever is queued with one bulk_create.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.events = []
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def add(self, event):
+        with self.lock:
+            self.events.append(event)
+            full = len(self.events) >= settings.AUDIT_BATCH_SIZE
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='audit-writer', daemon=True)
+                self.thread.start()
+        if full:
+            self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait(settings.AUDIT_FLUSH_SECONDS)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            events, self.events = self.events, []
+        if not events:
+            return 0
+        try:
+            _write(events)
+        except DatabaseError:
+            logger.exception('Could not write %d audit events; keeping them for the next flush', len(events))
+            with self.lock:
+                # A database that stays down must not grow the buffer without bound
+                self.events[:0] = events[-settings.AUDIT_MAX_BUFFERED:]
+            return 0
+        return len(events)
+
+
+@retry_on_lock('audit')
+def _write(events):
+    AuditEvent.objects.bulk_create(events, batch_size=500)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def _current():
+    global _buffer
+    # A forked worker gets its own buffer and thread; the parent's thread does not survive the fork
+    if _buffer is None or _buffer.pid != os.getpid():
+        with _buffer_lock:
+            if _buffer is None or _buffer.pid != os.getpid():
+                _buffer = _Buffer()
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def log_event(user, action, model, object_id=None, summary=''):
+    """Queue an audit event for ``user`` (a User, or None for the system).
+
+    With AUDIT_FLUSH_SECONDS = 0 the event is written straight away instead.
+    """
+    event = AuditEvent(
+        user_id=getattr(user, 'pk', None),
+        action=action,
+        model=model,
+        object_id=object_id,
+        summary=summary[:255],
+        created_at=timezone.now(),
+    )
+    if not settings.AUDIT_FLUSH_SECONDS:
+        _write([event])
+        return
+    _current().add(event)
+
+
+def flush():
+    """Write this process's queued events now. Returns how many were written."""
+    return _current().flush()
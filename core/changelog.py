@@ -0,0 +1,48 @@
+from django.db.models import Max
+
+from .models import ChangeLog
+
+
+def record_change(model, object_ids, deleted=False):
+    """Append one change-log entry per object id (``model`` is 'product' or 'customer').
+
+    Call this for writes that bypass model signals (QuerySet.update, bulk_update).
+    """
+    if isinstance(object_ids, int):
+        object_ids = [object_ids]
+    ChangeLog.objects.bulk_create([
+        ChangeLog(model=model, object_id=object_id, deleted=deleted) for object_id in object_ids
+    ])
+
+
+def current_sequence():
+    return ChangeLog.objects.aggregate(m=Max('id'))['m'] or 0
+
+
+def changes_since(since, limit):
+    """Next batch of changes after sequence ``since``.
+
+    Returns ``(last_seq, more, {model: {object_id: deleted}})`` with only the latest entry
+    per object kept, so a busy product appears once per batch.
+    """
+    entries = list(
+        ChangeLog.objects.filter(id__gt=since).order_by('id').values_list('id', 'model', 'object_id', 'deleted')[:limit + 1]
+    )
+    more = len(entries) > limit
+    entries = entries[:limit]
+    latest = {}
+    for _, model, object_id, deleted in entries:
+        latest.setdefault(model, {})[object_id] = deleted
+    last_seq = entries[-1][0] if entries else since
+    return last_seq, more, latest
+
+
+def compact_changelog():
+    """Drop entries superseded by a newer entry for the same object. Returns rows deleted.
+
+    The newest entry per object (including delete tombstones) is always kept, so clients at
+    any sequence still converge.
+    """
+    latest_ids = ChangeLog.objects.values('model', 'object_id').annotate(last=Max('id')).values('last')
+    deleted, _ = ChangeLog.objects.exclude(id__in=latest_ids).delete()
+    return deleted
@@ -0,0 +1,31 @@
+import time
+from functools import wraps
+
+from django.db import OperationalError, connection
+
+from .metrics import LOCK_RETRIES
+
+LOCK_RETRY_ATTEMPTS = 3
+LOCK_RETRY_DELAY = 0.05
+
+
+def retry_on_lock(operation):
+    """Retry a function that runs its own transaction when SQLite reports the database locked.
+
+    With several worker processes a writer can outlast SQLite's busy timeout. Only an
+    outermost call is retried: inside an enclosing atomic block the whole transaction is
+    already lost, so the error propagates. Retries are counted per ``operation``.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(LOCK_RETRY_ATTEMPTS):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as exc:
+                    if 'locked' not in str(exc) or connection.in_atomic_block or attempt == LOCK_RETRY_ATTEMPTS - 1:
+                        raise
+                    LOCK_RETRIES.labels(operation).inc()
+                    time.sleep(LOCK_RETRY_DELAY * 2 ** attempt)
+        return wrapper
+    return decorator
@@ -0,0 +1,121 @@
+import logging
+import os
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+from .replica import reporting_reads
+
+
+logger = logging.getLogger(__name__)
+
+JobType = namedtuple('JobType', 'func reads_from_reporting')
+
+# kind -> JobType, filled by @register_job in each app's jobs module (imported from ready()).
+JOB_TYPES = {}
+
+
+def register_job(kind, reads_from_reporting=False):
+    """Register ``func(params, out, progress)`` as the handler for jobs of ``kind``.
+
+    ``out`` is a text file opened for the result; ``progress(done, total)`` records how far
+    the job has got.
+    """
+    def decorator(func):
+        JOB_TYPES[kind] = JobType(func, reads_from_reporting)
+        return func
+    return decorator
+
+
+def enqueue(kind, user, params, filename):
+    if kind not in JOB_TYPES:
+        raise ValueError(f'Unknown job kind: {kind}')
+    return Job.objects.create(kind=kind, params=params, filename=filename, created_by=user)
+
+
+def claim_jobs(limit):
+    """Mark up to ``limit`` queued jobs as running and return their ids, oldest first.
+
+    The claim is a conditional UPDATE, so several workers can poll the same queue.
+    """
+    claimed = []
+    for job_id in Job.objects.filter(status=Job.QUEUED).order_by('id').values_list('id', flat=True)[:limit * 2]:
+        now = timezone.now()
+        if Job.objects.filter(pk=job_id, status=Job.QUEUED).update(status=Job.RUNNING, started_at=now, heartbeat_at=now):
+            claimed.append(job_id)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def touch_jobs(job_ids):
+    """Record that the jobs in ``job_ids`` are still being run by this worker."""
+    if not job_ids:
+        return 0
+    return Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+
+
+def requeue_stale_jobs(now=None):
+    """Put jobs left RUNNING by a crashed or killed worker back in the queue. Returns the count.
+
+    ``run_jobs`` touches the jobs it runs every JOB_HEARTBEAT_SECONDS, so a job however long
+    it runs stays its own; one untouched for JOB_STALE_AFTER_MINUTES lost its worker. Its
+    partial result file is removed when it runs again.
+    """
+    cutoff = (now or timezone.now()) - timedelta(minutes=settings.JOB_STALE_AFTER_MINUTES)
+    return Job.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff), status=Job.RUNNING,
+    ).update(status=Job.QUEUED, started_at=None, heartbeat_at=None, progress=0)
+
+
+def fail_job(job_id, error):
+    """Mark a running job FAILED with ``error`` when it could not report for itself."""
+    return Job.objects.filter(pk=job_id, status=Job.RUNNING).update(
+        status=Job.FAILED, error=error, finished_at=timezone.now())
+
+
+def _progress_recorder(job_id):
+    last = [-1]
+
+    def progress(done, total):
+        percent = min(int(done * 100 / total), 99) if total else 0
+        if percent != last[0]:
+            Job.objects.filter(pk=job_id).update(progress=percent)
+            last[0] = percent
+    return progress
+
+
+def run_job(job_id):
+    """Run a claimed job, writing its result under JOB_RESULTS_DIR. Returns the final status."""
+    job = Job.objects.get(pk=job_id)
+    job_type = JOB_TYPES[job.kind]
+    path = job.result_path
+    partial = path.with_name(path.name + '.part')
+    os.makedirs(path.parent, exist_ok=True)
+    try:
+        with open(partial, 'w', newline='', encoding='utf-8') as out:
+            with reporting_reads() if job_type.reads_from_reporting else nullcontext():
+                job_type.func(job.params, out, _progress_recorder(job_id))
+        os.replace(partial, path)
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed', job_id, job.kind)
+        partial.unlink(missing_ok=True)
+        Job.objects.filter(pk=job_id).update(status=Job.FAILED, error=str(exc), finished_at=timezone.now())
+        return Job.FAILED
+    Job.objects.filter(pk=job_id).update(status=Job.DONE, progress=100, finished_at=timezone.now())
+    return Job.DONE
+
+
+def purge_expired_jobs(now=None):
+    """Delete finished jobs older than JOB_RESULT_RETENTION_HOURS with their files. Returns the count."""
+    cutoff = (now or timezone.now()) - timedelta(hours=settings.JOB_RESULT_RETENTION_HOURS)
+    expired = list(Job.objects.filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff))
+    for job in expired:
+        job.result_path.unlink(missing_ok=True)
+    Job.objects.filter(pk__in=[job.pk for job in expired]).delete()
+    return len(expired)
@@ -0,0 +1,106 @@
+import glob
+import os
+import sqlite3
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from .replica import copy_database
+
+AUTO_VACUUM_MODES = {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}
+
+
+def _plan_queries():
+    """Hot queries whose plans are compared around ANALYZE: label -> queryset."""
+    from customers.models import Customer
+    from products.models import Product
+    from sales.models import DailyProductSales, InstallmentPlan, Sale
+
+    today = timezone.localdate()
+    return {
+        'sale list': Sale.objects.select_related('customer').order_by('-date')[:25],
+        'customer sales': Sale.objects.filter(customer_id=1).order_by('-date')[:25],
+        # Two usable indexes: only the statistics tell that a cashier has far more sales than a customer
+        'cashier and customer sales': Sale.objects.filter(created_by_id=1, customer_id=1).order_by('-date')[:25],
+        'due installments': InstallmentPlan.objects.filter(status='PENDING', first_due_date__lte=today),
+        'daily sales window': DailyProductSales.objects.filter(product_id=1, day__gte=today - timedelta(days=30)),
+        'customer search': Customer.objects.filter(name_normalized__gte='a', name_normalized__lt='a\uffff').order_by('name_normalized')[:10],
+        'low stock': Product.objects.filter(stock_quantity__lte=10).order_by('stock_quantity'),
+    }
+
+
+def query_plans(alias=DEFAULT_DB_ALIAS):
+    """``EXPLAIN QUERY PLAN`` of each hot query, as one line per plan step."""
+    plans = {}
+    with connections[alias].cursor() as cursor:
+        for label, qs in _plan_queries().items():
+            sql, params = qs.using(alias).query.sql_with_params()
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plans[label] = [row[-1] for row in cursor.fetchall()]
+    return plans
+
+
+def page_stats(alias=DEFAULT_DB_ALIAS):
+    with connections[alias].cursor() as cursor:
+        stats = {}
+        for pragma in ('page_count', 'freelist_count', 'page_size', 'auto_vacuum'):
+            cursor.execute(f'PRAGMA {pragma}')
+            stats[pragma] = cursor.fetchone()[0]
+    stats['auto_vacuum'] = AUTO_VACUUM_MODES.get(stats['auto_vacuum'], stats['auto_vacuum'])
+    return stats
+
+
+def backup_database(directory, alias=DEFAULT_DB_ALIAS, keep=7, pages=256, sleep=0.05):
+    """Snapshot ``alias`` into ``directory`` with the online backup API and rotate old snapshots.
+
+    The copy is integrity-checked before it replaces the ``.part`` name; a corrupt copy is
+    deleted and RuntimeError raised. Only the newest ``keep`` snapshots are kept. Returns the
+    new snapshot's path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{alias}-{timezone.now():%Y%m%d-%H%M%S-%f}.sqlite3')
+    partial = path + '.part'
+    copy_database(partial, source_alias=alias, pages=pages, sleep=sleep)
+
+    check = sqlite3.connect(partial)
+    try:
+        result = [row[0] for row in check.execute('PRAGMA integrity_check')]
+    finally:
+        check.close()
+    if result != ['ok']:
+        os.unlink(partial)
+        raise RuntimeError(f'Backup of {alias} failed the integrity check: {"; ".join(result[:5])}')
+    os.replace(partial, path)
+
+    snapshots = sorted(glob.glob(os.path.join(directory, f'{glob.escape(alias)}-*.sqlite3')))
+    for old in snapshots[:-keep] if keep else []:
+        os.unlink(old)
+    return path
+
+
+def optimize_database(alias=DEFAULT_DB_ALIAS, vacuum_pages=1000, enable_incremental_vacuum=False):
+    """Run ``PRAGMA optimize``, ``ANALYZE`` and an incremental vacuum of up to ``vacuum_pages``.
+
+    Incremental vacuum only frees pages once ``auto_vacuum`` is INCREMENTAL; switching to it
+    takes one full VACUUM (``enable_incremental_vacuum``), which blocks writers while it runs.
+    Returns ``{'before': stats, 'after': stats, 'plan_changes': {label: (before, after)}}``.
+    """
+    before, plans_before = page_stats(alias), query_plans(alias)
+    with connections[alias].cursor() as cursor:
+        if enable_incremental_vacuum and before['auto_vacuum'] != 'INCREMENTAL':
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+        cursor.execute('PRAGMA optimize')
+        cursor.execute('ANALYZE')
+        cursor.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})')
+        cursor.fetchall()
+    after, plans_after = page_stats(alias), query_plans(alias)
+    return {
+        'before': before,
+        'after': after,
+        'plan_changes': {
+            label: (plans_before[label], plans_after[label])
+            for label in plans_after if plans_before.get(label) != plans_after[label]
+        },
+    }
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.changelog import compact_changelog, current_sequence
+
+
+class Command(BaseCommand):
+    help = 'Remove change-log entries superseded by a newer entry for the same product/customer.'
+
+    def handle(self, *args, **options):
+        removed = compact_changelog()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} superseded entries; current sequence is {current_sequence()}.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.replica import refresh_reporting, replica_age, reporting_path
+
+
+class Command(BaseCommand):
+    help = "Refresh the 'reporting' database from 'default' using SQLite's online backup API."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1024, help='Pages copied per backup step')
+        parser.add_argument('--sleep', type=float, default=0.05, help='Seconds to pause between steps')
+
+    def handle(self, *args, **options):
+        before = replica_age()
+        refresh_reporting(pages=options['pages'], sleep=options['sleep'])
+        previous = f'{before.total_seconds():.0f}s old' if before is not None else 'missing'
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {reporting_path()} (was {previous}).'))
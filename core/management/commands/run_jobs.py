@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import claim_jobs, fail_job, purge_expired_jobs, requeue_stale_jobs, run_job, touch_jobs
+
+
+def _init_process():
+    # Spawned workers (Windows, macOS) start without Django; forked ones must not reuse
+    # the parent's SQLite handles.
+    django.setup()
+    connections.close_all()
+
+
+def _work(job_id):
+    try:
+        return run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (exports, reports) on a thread or process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                            help='Threads share one process; processes sidestep the GIL for CPU-heavy reports')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds between queue polls')
+        parser.add_argument('--purge-every', type=float, default=3600, help='Seconds between expired-result purges')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+
+    def _pool(self, options):
+        if options['pool'] == 'process':
+            connections.close_all()
+            return ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_process)
+        return ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='job')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        pool = self._pool(options)
+        running = {}
+        next_purge = next_heartbeat = 0
+        try:
+            while True:
+                broken = False
+                for future in [f for f in running if f.done()]:
+                    job_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as exc:
+                        # The process running it died (BrokenProcessPool) or the job never got to
+                        # record its own failure; the dispatcher carries on
+                        fail_job(job_id, f'Worker crashed: {exc or exc.__class__.__name__}')
+                        status = f'FAILED ({exc.__class__.__name__})'
+                        broken = broken or isinstance(exc, BrokenExecutor)
+                    self.stdout.write(f'Job #{job_id}: {status}')
+                if broken:
+                    # A broken pool takes no more work; jobs still on it fail on a later pass
+                    pool.shutdown(wait=False)
+                    pool = self._pool(options)
+                if time.monotonic() >= next_heartbeat:
+                    touch_jobs(list(running.values()))
+                    requeued = requeue_stale_jobs()
+                    if requeued:
+                        self.stdout.write(f'Requeued {requeued} jobs abandoned by a stopped worker.')
+                    next_heartbeat = time.monotonic() + settings.JOB_HEARTBEAT_SECONDS
+                claimed = claim_jobs(workers - len(running)) if len(running) < workers else []
+                for job_id in claimed:
+                    running[pool.submit(_work, job_id)] = job_id
+                if time.monotonic() >= next_purge:
+                    purged = purge_expired_jobs()
+                    if purged:
+                        self.stdout.write(f'Purged {purged} expired job results.')
+                    next_purge = time.monotonic() + options['purge_every']
+                if options['once'] and not running and not claimed:
+                    return
+                time.sleep(options['poll'] if not claimed else 0.1)
+        finally:
+            pool.shutdown()
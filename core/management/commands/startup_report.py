@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.startup import measure_startup
+
+
+class Command(BaseCommand):
+    help = 'Time a cold start of the WSGI application, broken down by app and by module.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Number of slowest modules to list')
+        parser.add_argument('--check', action='store_true', help='Fail if the start exceeds STARTUP_BUDGET_SECONDS')
+
+    def handle(self, *args, **options):
+        report = measure_startup()
+        budget = settings.STARTUP_BUDGET_SECONDS
+        self.stdout.write(f"Cold start: {report['total'] * 1000:.0f}ms (budget {budget * 1000:.0f}ms)")
+        self.stdout.write('\nImport time by app:')
+        for app, seconds in report['apps'].items():
+            self.stdout.write(f'  {seconds * 1000:8.1f}ms  {app}')
+        self.stdout.write(f"\nSlowest {options['top']} modules (self / cumulative):")
+        for module, own, cumulative in report['modules'][:options['top']]:
+            self.stdout.write(f'  {own * 1000:8.1f}ms {cumulative * 1000:8.1f}ms  {module}')
+        if options['check'] and report['total'] > budget:
+            raise CommandError(f"Cold start took {report['total']:.2f}s, over the {budget:.2f}s budget")
@@ -0,0 +1,357 @@
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process, nothing to compact
+    fcntl = None
+
+INITIAL_SIZE = 64 * 1024
+_HEADER = struct.Struct('q')
+_LENGTH = struct.Struct('i')
+_VALUE = struct.Struct('d')
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+# name -> metric, for HELP/TYPE lines and the bucket layout of histograms
+REGISTRY = {}
+
+
+class _Store:
+    """One process's metric values in a memory-mapped file (or anonymous memory).
+
+    Layout: the used length, then ``[key length][key, padded to 8 bytes][double]`` entries.
+    Only the owning process writes; ``collect()`` reads every process's file. Values only
+    ever grow, so a reader never sees a counter go backwards.
+    """
+
+    def __init__(self, path=None):
+        self.pid = os.getpid()
+        self.directory = os.path.dirname(path) if path else None
+        self.positions = {}
+        self.lock = threading.Lock()
+        if path:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            size = os.fstat(self.fd).st_size
+            if size == 0:
+                os.ftruncate(self.fd, INITIAL_SIZE)
+                size = INITIAL_SIZE
+            self.mm = mmap.mmap(self.fd, size)
+        else:
+            self.fd = None
+            self.mm = mmap.mmap(-1, INITIAL_SIZE)
+        self.used = _HEADER.unpack_from(self.mm, 0)[0] or _HEADER.size
+        for key, _, pos in _entries(self.mm, self.used):
+            self.positions[key] = pos
+
+    def _grow(self, needed):
+        size = len(self.mm)
+        while size < needed:
+            size *= 2
+        if self.fd is not None:
+            os.ftruncate(self.fd, size)
+            self.mm.close()
+            self.mm = mmap.mmap(self.fd, size)
+        else:
+            grown = mmap.mmap(-1, size)
+            grown[:len(self.mm)] = self.mm
+            self.mm = grown
+
+    def _allocate(self, key):
+        encoded = key.encode()
+        padded = encoded + b' ' * (-(_LENGTH.size + len(encoded)) % 8)
+        entry = _LENGTH.pack(len(padded)) + padded + _VALUE.pack(0.0)
+        if self.used + len(entry) > len(self.mm):
+            self._grow(self.used + len(entry))
+        self.mm[self.used:self.used + len(entry)] = entry
+        pos = self.used + len(entry) - _VALUE.size
+        self.used += len(entry)
+        # Published last, so a reader never parses a half-written entry
+        _HEADER.pack_into(self.mm, 0, self.used)
+        self.positions[key] = pos
+        return pos
+
+    def add(self, key, amount):
+        with self.lock:
+            pos = self.positions.get(key)
+            if pos is None:
+                pos = self._allocate(key)
+            _VALUE.pack_into(self.mm, pos, _VALUE.unpack_from(self.mm, pos)[0] + amount)
+
+    def values(self):
+        with self.lock:
+            return [(key, value) for key, value, _ in _entries(self.mm, self.used)]
+
+
+def _entries(buf, used):
+    pos = _HEADER.size
+    while pos < used:
+        length = _LENGTH.unpack_from(buf, pos)[0]
+        key = bytes(buf[pos + _LENGTH.size:pos + _LENGTH.size + length]).decode().rstrip()
+        pos += _LENGTH.size + length
+        yield key, _VALUE.unpack_from(buf, pos)[0], pos
+        pos += _VALUE.size
+
+
+def _read_file(path):
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    if len(data) < _HEADER.size:
+        return []
+    return [(key, value) for key, value, _ in _entries(data, _HEADER.unpack_from(data, 0)[0])]
+
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def _store():
+    global _local
+    directory = settings.METRICS_DIR and str(settings.METRICS_DIR)
+    # A forked worker must not keep writing into its parent's file
+    if _local is None or _local.pid != os.getpid() or _local.directory != directory:
+        with _local_lock:
+            if _local is None or _local.pid != os.getpid() or _local.directory != directory:
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                _local = _Store(os.path.join(directory, f'metrics_{os.getpid()}.db') if directory else None)
+    return _local
+
+
+def _key(name, suffix, labels):
+    return json.dumps([name, suffix, labels], separators=(',', ':'))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        REGISTRY[name] = self
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._child(dict(zip(self.labelnames, map(str, values))))
+        return child
+
+
+class _CounterChild:
+    def __init__(self, name, labels):
+        self.key = _key(name, 'total', labels)
+
+    def inc(self, amount=1):
+        _store().add(self.key, amount)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _child(self, labels):
+        return _CounterChild(self.name, labels)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    def __init__(self, name, labels, bounds):
+        self.bounds = bounds
+        self.bucket_keys = [_key(name, 'bucket', dict(labels, le=_format_bound(b))) for b in bounds]
+        self.sum_key = _key(name, 'sum', labels)
+        self.count_key = _key(name, 'count', labels)
+
+    def observe(self, value):
+        store = _store()
+        store.add(self.bucket_keys[bisect_left(self.bounds, value)], 1)
+        store.add(self.sum_key, value)
+        store.add(self.count_key, 1)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets)) + (float('inf'),)
+
+    def _child(self, labels):
+        return _HistogramChild(self.name, labels, self.bounds)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+REQUEST_SECONDS = Histogram('pos_request_duration_seconds', 'Time spent in the view, by URL name.', ['view'])
+REQUEST_DB_SECONDS = Histogram('pos_request_db_seconds', 'Time spent in database queries per request, by URL name.', ['view'])
+REQUEST_DB_QUERIES = Counter('pos_request_db_queries', 'Database queries run by views, by URL name.', ['view'])
+CHECKOUT_SECONDS = Histogram('pos_checkout_duration_seconds', 'create_sale_from_cart duration, by payment type.', ['payment_type'])
+CHECKOUT_LINES = Histogram('pos_checkout_lines', 'Cart lines per sale created by create_sale_from_cart.',
+                           buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55))
+CACHE_REQUESTS = Counter('pos_cache_requests', 'Lookups in in-process and HTTP caches, by cache and hit/miss.', ['cache', 'result'])
+LOCK_RETRIES = Counter('pos_db_lock_retries', 'Transactions retried after SQLite reported the database locked.', ['operation'])
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+class _QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def instrument(view):
+    """Record latency, DB time and query count of a view under its URL name."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        timer = _QueryTimer()
+        # connection.execute_wrapper() without its context manager overhead
+        wrapped = [connections[alias] for alias in settings.DATABASES]
+        for conn in wrapped:
+            conn.execute_wrappers.append(timer)
+        started = time.perf_counter()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            for conn in wrapped:
+                conn.execute_wrappers.remove(timer)
+            match = request.resolver_match
+            name = match.view_name if match else view.__qualname__
+            REQUEST_SECONDS.labels(name).observe(elapsed)
+            REQUEST_DB_SECONDS.labels(name).observe(timer.seconds)
+            REQUEST_DB_QUERIES.labels(name).inc(timer.count)
+    return wrapper
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _compact(directory):
+    """Fold the files of exited processes into ``metrics_merged.db``.
+
+    Recycled workers would otherwise leave one file each behind.
+    """
+    with open(os.path.join(directory, 'compact.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = []
+        for path in glob.glob(os.path.join(directory, 'metrics_[0-9]*.db')):
+            pid = int(os.path.basename(path)[len('metrics_'):-len('.db')])
+            if pid != os.getpid() and not _pid_alive(pid):
+                dead.append(path)
+        if not dead:
+            return
+        merged = _Store(os.path.join(directory, 'metrics_merged.db'))
+        for path in dead:
+            for key, value in _read_file(path):
+                merged.add(key, value)
+            merged.mm.flush()
+            os.unlink(path)
+        merged.mm.close()
+        os.close(merged.fd)
+
+
+def collect():
+    """Sum every process's values: ``{(name, suffix, labels tuple): value}``."""
+    directory = settings.METRICS_DIR and str(settings.METRICS_DIR)
+    if directory:
+        _store()
+        if fcntl is not None:
+            _compact(directory)
+        values = [pair for path in glob.glob(os.path.join(directory, 'metrics_*.db')) for pair in _read_file(path)]
+    else:
+        values = _store().values()
+    totals = defaultdict(float)
+    for key, value in values:
+        name, suffix, labels = json.loads(key)
+        totals[name, suffix, tuple(labels.items())] += value
+    return totals
+
+
+def _labels_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels) + '}'
+
+
+def _number(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    totals = collect()
+    by_name = defaultdict(list)
+    for (name, suffix, labels), value in totals.items():
+        by_name[name].append((suffix, labels, value))
+
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        samples = by_name.get(name, [])
+        if metric.kind == 'counter':
+            for _, labels, value in sorted(samples):
+                lines.append(f'{name}_total{_labels_text(labels)} {_number(value)}')
+            continue
+        # Buckets are stored per bound; Prometheus wants them cumulative
+        series = defaultdict(dict)
+        for suffix, labels, value in samples:
+            if suffix == 'bucket':
+                le = dict(labels)['le']
+                series[tuple(pair for pair in labels if pair[0] != 'le')][le] = value
+            else:
+                series[labels][suffix] = value
+        for labels, values in sorted(series.items()):
+            running = 0
+            for bound in metric.bounds:
+                running += values.get(_format_bound(bound), 0)
+                lines.append(f'{name}_bucket{_labels_text(labels + (("le", _format_bound(bound)),))} {_number(running)}')
+            lines.append(f'{name}_sum{_labels_text(labels)} {_number(values.get("sum", 0))}')
+            lines.append(f'{name}_count{_labels_text(labels)} {_number(values.get("count", 0))}')
+
+    ratios = defaultdict(lambda: [0, 0])
+    for (name, _, labels), value in totals.items():
+        if name == CACHE_REQUESTS.name:
+            labels = dict(labels)
+            ratios[labels['cache']][labels['result'] == 'hit'] += value
+    lines.append('# HELP pos_cache_hit_ratio Share of cache lookups that were hits, since the counters started.')
+    lines.append('# TYPE pos_cache_hit_ratio gauge')
+    for cache, (misses, hits) in sorted(ratios.items()):
+        lines.append(f'pos_cache_hit_ratio{_labels_text([("cache", cache)])} {hits / (hits + misses):.4f}')
+    return '\n'.join(lines) + '\n'
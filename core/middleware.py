@@ -0,0 +1,82 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# ManifestStaticFilesStorage names: app.<12 hex digits>.js
+FINGERPRINTED = re.compile(r'\.[0-9a-f]{12}\.[^/]+$')
+FAR_FUTURE = 'public, max-age=31536000, immutable'
+SHORT_LIVED = 'public, max-age=300'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def accepted_encodings(header):
+    """``{coding: q}`` from an Accept-Encoding header; ``q=0`` means the coding is refused."""
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+class PrecompressedStaticMiddleware:
+    """Serve collected files from STATIC_ROOT, preferring the .br/.gz copies made by collectstatic.
+
+    Fingerprinted names never change content, so they are cached for a year; the response is
+    a ``FileResponse``, which the WSGI server can send with ``sendfile``. Anything not found in
+    STATIC_ROOT falls through to the rest of the stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and settings.STATIC_ROOT and request.path.startswith(settings.STATIC_URL):
+            response = self.serve(request, request.path[len(settings.STATIC_URL):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            return HttpResponseNotModified()
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding, served = None, path
+        for candidate, suffix in ENCODINGS:
+            if accepted.get(candidate, accepted.get('*', 0)) > 0 and os.path.isfile(path + suffix):
+                encoding, served = candidate, path + suffix
+                break
+
+        content_type, _ = mimetypes.guess_type(path)
+        response = FileResponse(open(served, 'rb'), filename=os.path.basename(path),
+                                content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Last-Modified'] = http_date(stat.st_mtime)
+        response.headers['Cache-Control'] = FAR_FUTURE if FINGERPRINTED.search(name) else SHORT_LIVED
+        return response
@@ -0,0 +1,38 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:40
+
+from django.db import migrations, models
+
+
+def seed_changelog(apps, schema_editor):
+    # Existing rows get one entry each so a client syncing from 0 receives the full catalog
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    for label, model in (('product', apps.get_model('products', 'Product')), ('customer', apps.get_model('customers', 'Customer'))):
+        ids = model.objects.order_by('id').values_list('id', flat=True)
+        ChangeLog.objects.bulk_create([ChangeLog(model=label, object_id=i) for i in ids.iterator()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('customers', '0003_customer_search_keys'),
+        ('products', '0002_product_barcode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('product', 'Product'), ('customer', 'Customer')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'object_id'], name='changelog_object_idx')],
+            },
+        ),
+        migrations.RunPython(seed_changelog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.1.2 on 2026-10-19 04:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('create', 'Created'), ('update', 'Changed'), ('delete', 'Deleted')], max_length=16)),
+                ('model', models.CharField(choices=[('product', 'Product'), ('customer', 'Customer'), ('sale', 'Sale'), ('payment', 'Payment')], max_length=16)),
+                ('object_id', models.BigIntegerField(blank=True, null=True)),
+                ('summary', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-created_at'], name='audit_time_idx'), models.Index(fields=['user', '-created_at'], name='audit_user_idx'), models.Index(fields=['model', 'object_id'], name='audit_object_idx')],
+            },
+        ),
+    ]
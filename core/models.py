@@ -0,0 +1,86 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.db import models
+
+
+class ChangeLog(models.Model):
+    """Append-only log of catalog writes; the row id is the sync sequence number.
+
+    SQLite serializes writers, so ids are handed out in commit order and a client that has
+    seen sequence N has seen every change with id <= N.
+    """
+    MODEL_CHOICES = [('product', 'Product'), ('customer', 'Customer')]
+    model = models.CharField(max_length=16, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_id'], name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.model}:{self.object_id}{' (deleted)' if self.deleted else ''}"
+
+
+class Job(models.Model):
+    """A background task run by `manage.py run_jobs`; see core.jobs."""
+    QUEUED, RUNNING, DONE, FAILED = 'QUEUED', 'RUNNING', 'DONE', 'FAILED'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+    kind = models.CharField(max_length=64)
+    params = models.JSONField(default=dict, blank=True)
+    filename = models.CharField(max_length=255)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched by the run_jobs that claimed the job for as long as it runs (core.jobs.touch_jobs)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='job_status_idx'),
+            models.Index(fields=['created_by', '-created_at'], name='job_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.id} {self.kind} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def result_path(self):
+        return Path(settings.JOB_RESULTS_DIR) / f'{self.id}-{self.filename}'
+
+
+class AuditEvent(models.Model):
+    """Who created, changed or deleted what; queued in memory and written in batches by core.audit."""
+    CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+    ACTION_CHOICES = [(CREATE, 'Created'), (UPDATE, 'Changed'), (DELETE, 'Deleted')]
+    MODEL_CHOICES = [('product', 'Product'), ('customer', 'Customer'), ('sale', 'Sale'), ('payment', 'Payment')]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='audit_events')
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
+    model = models.CharField(max_length=16, choices=MODEL_CHOICES)
+    # Blank for actions on many objects at once (bulk repricing, payment imports)
+    object_id = models.BigIntegerField(null=True, blank=True)
+    summary = models.CharField(max_length=255, blank=True)
+    # When the action happened, not when the batch was written
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='audit_time_idx'),
+            models.Index(fields=['user', '-created_at'], name='audit_user_idx'),
+            models.Index(fields=['model', 'object_id'], name='audit_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M} {self.user_id} {self.action} {self.model}:{self.object_id}"
@@ -0,0 +1,92 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+
+REPORTING_DB = 'reporting'
+
+# Alias that ReportingRouter sends reads to for the view currently running, if any.
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def read_alias():
+    return _read_alias.get()
+
+
+def reporting_path():
+    # The effective settings: under the test runner 'reporting' mirrors the test database,
+    # so no file is found and opted-in views read the primary.
+    return str(connections[REPORTING_DB].settings_dict['NAME'])
+
+
+def copy_database(target_path, source_alias=DEFAULT_DB_ALIAS, pages=1024, sleep=0.05):
+    """Copy a SQLite database with the online backup API while it stays in use.
+
+    ``pages`` are copied per step with ``sleep`` seconds between steps so writers are not
+    starved; SQLite restarts the copy if another connection writes mid-way, so the result
+    is always a consistent snapshot. Must not run inside a transaction on the source: the
+    backup would wait forever on this connection's own write lock.
+    """
+    source = connections[source_alias]
+    if source.in_atomic_block:
+        raise RuntimeError('copy_database() cannot run inside a transaction on the source database.')
+    source.ensure_connection()
+    target = sqlite3.connect(target_path)
+    try:
+        source.connection.backup(target, pages=pages, sleep=sleep)
+    finally:
+        target.close()
+
+
+def refresh_reporting(pages=1024, sleep=0.05):
+    copy_database(reporting_path(), pages=pages, sleep=sleep)
+    connections[REPORTING_DB].close()
+
+
+def replica_age():
+    """Time since the reporting copy was last refreshed, or None if there is none."""
+    try:
+        mtime = os.stat(reporting_path()).st_mtime
+    except OSError:
+        return None
+    return max(timezone.now() - datetime.fromtimestamp(mtime, tz=dt_timezone.utc), timedelta(0))
+
+
+@contextmanager
+def reporting_reads():
+    """Send catalog and sales reads inside the block to the reporting copy when it is fresh.
+
+    Falls back to the primary database when the copy is missing or older than
+    REPORTING_MAX_STALENESS seconds. Yields ``(alias, age)``: the alias actually read and
+    the copy's age (None when there is no copy).
+    """
+    age = replica_age()
+    fresh = age is not None and age <= timedelta(seconds=settings.REPORTING_MAX_STALENESS)
+    token = _read_alias.set(REPORTING_DB if fresh else None)
+    try:
+        yield (REPORTING_DB if fresh else DEFAULT_DB_ALIAS), age
+    finally:
+        _read_alias.reset(token)
+
+
+def reads_from_reporting(view):
+    """Run ``view`` inside ``reporting_reads()``.
+
+    Sets ``request.read_db``, ``request.replica_age`` and ``request.replica_refreshed_at``
+    so templates can say how current the figures are.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with reporting_reads() as (alias, age):
+            request.read_db = alias
+            request.replica_age = age
+            request.replica_refreshed_at = timezone.now() - age if age is not None else None
+            return view(request, *args, **kwargs)
+    return wrapper
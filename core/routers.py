@@ -0,0 +1,37 @@
+from django.db import DEFAULT_DB_ALIAS
+
+from .replica import REPORTING_DB, read_alias
+
+
+# Business data only: sessions, users and messages always come from the primary.
+REPLICATED_APPS = {'core', 'products', 'customers', 'sales'}
+
+
+class ReportingRouter:
+    """Sends reads inside views wrapped with ``reads_from_reporting`` to the reporting copy."""
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias()
+        if alias is None or model._meta.app_label not in REPLICATED_APPS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (None, DEFAULT_DB_ALIAS, REPORTING_DB):
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == REPORTING_DB:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPORTING_DB}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The reporting database is a byte-for-byte copy of 'default', never migrated itself.
+        if db == REPORTING_DB:
+            return False
+        return None
@@ -0,0 +1,59 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from django.apps import apps
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# What a fresh worker does before its first request.
+STARTUP_SCRIPT = '''
+import time
+started = time.perf_counter()
+from shopproject.wsgi import application
+print(time.perf_counter() - started)
+'''
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def _owner(module, app_modules):
+    for name in app_modules:
+        if module == name or module.startswith(name + '.'):
+            return name
+    return 'django' if module.split('.')[0] == 'django' else 'other'
+
+
+def measure_startup(settings_module=None):
+    """Start the WSGI application in a fresh interpreter under ``python -X importtime``.
+
+    Returns ``{'total': seconds, 'apps': {app: seconds}, 'modules': [(module, self, cumulative)]}``
+    with modules sorted slowest first. Time spent importing a module is charged to the
+    installed app that owns it, else to ``django`` or ``other`` (stdlib and third-party).
+    Template precompilation and ``ready()`` hooks show up as self time of ``shopproject.wsgi``.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module or os.environ['DJANGO_SETTINGS_MODULE'])
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(REPO_ROOT), str(REPO_ROOT / 'shopproject'), env.get('PYTHONPATH')]))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+                            env=env, capture_output=True, text=True, check=True)
+
+    # Longest names first so 'django.contrib.admin' claims its modules before 'django' would.
+    app_modules = sorted([config.name for config in apps.get_app_configs()] + ['shopproject'], key=len, reverse=True)
+    per_app = defaultdict(float)
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, module = int(match[1]) / 1e6, int(match[2]) / 1e6, match[4]
+        modules.append((module, own, cumulative))
+        per_app[_owner(module, app_modules)] += own
+    modules.sort(key=lambda row: row[1], reverse=True)
+    return {
+        'total': float(result.stdout.strip().splitlines()[-1]),
+        'apps': dict(sorted(per_app.items(), key=lambda item: item[1], reverse=True)),
+        'modules': modules,
+    }
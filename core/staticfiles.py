@@ -0,0 +1,47 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # optional: pip install django-pos7[brotli]
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+MIN_COMPRESS_SIZE = 256
+
+
+def _compress_file(path):
+    """Write ``path.gz`` (and ``path.br`` when brotli is installed) next to ``path``.
+
+    A variant that would not be smaller is not written. Returns the suffixes written.
+    """
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as fh:
+                fh.write(compressed)
+            written.append(suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Fingerprint static files on collectstatic and write gzip/brotli copies of the results.
+
+    The copies are served by ``core.middleware.PrecompressedStaticMiddleware``.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                _compress_file(self.path(name))
@@ -0,0 +1,15 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Writes audit events as they happen: a background writer would race the test transactions."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.audit_settings = override_settings(AUDIT_FLUSH_SECONDS=0)
+        self.audit_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.audit_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,428 @@
+import gzip
+import io
+import os
+import signal
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures.thread import BrokenThreadPool
+from decimal import Decimal
+from datetime import timedelta
+from unittest import mock
+from urllib.request import urlopen
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils import timezone
+
+import main
+from customers.models import Customer
+from products.models import Product
+from sales.models import Sale
+from sales.utils import create_sale_from_cart
+from . import audit, metrics
+from .jobs import claim_jobs, purge_expired_jobs, requeue_stale_jobs, run_job, touch_jobs
+from .maintenance import backup_database, optimize_database
+from .models import AuditEvent, Job
+from .replica import REPORTING_DB, copy_database
+from .warmup import warm_up
+
+
+class ReportingReplicaTests(TransactionTestCase):
+    # Reads on the mirrored 'reporting' connection cannot see rows behind the default
+    # connection's open test transaction, and the backup API cannot copy it.
+    databases = {'default', REPORTING_DB}
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester', password='pass1234')
+        self.client.login(username='tester', password='pass1234')
+        self.product = Product.objects.create(name='Tyre', price=Decimal('1000.00'), stock_quantity=5)
+
+    def test_copy_database_snapshots_primary(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, 'reporting.sqlite3')
+            copy_database(target, pages=1, sleep=0)
+            copy = sqlite3.connect(target)
+            self.assertEqual(copy.execute('SELECT name FROM products_product').fetchall(), [('Tyre',)])
+            copy.close()
+
+    def test_opted_in_views_use_fresh_replica_and_fall_back_when_stale(self):
+        with mock.patch('core.replica.replica_age', return_value=timedelta(seconds=30)):
+            resp = self.client.get(reverse('dashboard:dashboard_view'))
+            self.assertEqual(resp.wsgi_request.read_db, REPORTING_DB)
+            self.assertContains(resp, 'Figures from the reporting copy')
+            # Views that did not opt in keep reading the primary.
+            resp = self.client.get(reverse('products:product_list'))
+            self.assertFalse(hasattr(resp.wsgi_request, 'read_db'))
+
+        with mock.patch('core.replica.replica_age', return_value=timedelta(hours=2)):
+            resp = self.client.get(reverse('sales:aging_report'))
+            self.assertEqual(resp.wsgi_request.read_db, 'default')
+            self.assertNotContains(resp, 'Figures from the reporting copy')
+
+    def test_rows_read_from_replica_are_written_to_primary(self):
+        product = Product.objects.using(REPORTING_DB).get(pk=self.product.pk)
+        product.stock_quantity = 7
+        product.save()
+        self.assertEqual(product._state.db, 'default')
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 7)
+
+
+class BackgroundJobTests(TransactionTestCase):
+    # run_jobs hands jobs to worker threads with their own connections, which cannot see
+    # rows inside a TestCase transaction.
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester', password='pass1234')
+        self.other = User.objects.create_user(username='other', password='pass1234')
+        self.client.login(username='tester', password='pass1234')
+        customer = Customer.objects.create(name='Ali')
+        product = Product.objects.create(name='Tyre', price=Decimal('1000.00'), stock_quantity=50)
+        cart = {str(product.id): {'product_id': product.id, 'name': 'Tyre', 'price': '1000.00', 'quantity': 1, 'subtotal': '1000.00'}}
+        create_sale_from_cart(self.user, customer.id, cart, payment_type='FULL')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = override_settings(JOB_RESULTS_DIR=self.tmp.name, JOB_RESULT_RETENTION_HOURS=1)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_export_is_queued_and_run_by_worker(self):
+        resp = self.client.get(reverse('sales:export_csv'), {'filter': 'today'})
+        job = Job.objects.get()
+        self.assertRedirects(resp, reverse('core:job_detail', args=[job.id]))
+        self.assertEqual((job.status, job.created_by, job.params), (Job.QUEUED, self.user, {'filter': 'today'}))
+        status = self.client.get(reverse('core:job_detail', args=[job.id]), HTTP_ACCEPT='application/json').json()
+        self.assertEqual((status['status'], status['download_url']), ('QUEUED', None))
+        self.assertEqual(self.client.get(reverse('core:job_download', args=[job.id])).status_code, 404)
+
+        call_command('run_jobs', once=True, poll=0, stdout=open(os.devnull, 'w'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (Job.DONE, 100))
+        status = self.client.get(reverse('core:job_detail', args=[job.id]), HTTP_ACCEPT='application/json').json()
+        resp = self.client.get(status['download_url'])
+        self.assertIn('attachment', resp['Content-Disposition'])
+        self.assertEqual(len(b''.join(resp.streaming_content).decode().strip().splitlines()), 2)
+        resp.close()
+
+        self.client.login(username='other', password='pass1234')
+        self.assertEqual(self.client.get(reverse('core:job_download', args=[job.id])).status_code, 404)
+
+    def test_failed_jobs_and_retention(self):
+        job = Job.objects.create(kind='sales_analytics', params={'group': 'nope'}, filename='x.csv', created_by=self.user)
+        self.assertEqual(claim_jobs(5), [job.id])
+        self.assertEqual(claim_jobs(5), [])
+        self.assertEqual(run_job(job.id), Job.FAILED)
+        job.refresh_from_db()
+        self.assertIn('nope', job.error)
+        self.assertFalse(os.listdir(self.tmp.name))
+
+        self.assertEqual(purge_expired_jobs(), 0)
+        self.assertEqual(purge_expired_jobs(now=timezone.now() + timedelta(hours=2)), 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_only_jobs_whose_worker_stopped_are_requeued(self):
+        Job.objects.all().delete()
+        job = Job.objects.create(kind='sales_export', params={}, filename='sales.csv', created_by=self.user)
+        long_running = Job.objects.create(kind='sales_export', params={}, filename='sales.csv', created_by=self.user)
+        self.assertEqual(claim_jobs(2), [job.id, long_running.id])
+        # Both started hours ago, but only the second is still being touched by its worker
+        Job.objects.update(started_at=timezone.now() - timedelta(hours=3), heartbeat_at=timezone.now() - timedelta(hours=3))
+        self.assertEqual(touch_jobs([long_running.id]), 1)
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(dict(Job.objects.values_list('pk', 'status')), {job.pk: Job.QUEUED, long_running.pk: Job.RUNNING})
+
+        Job.objects.filter(pk=long_running.pk).update(heartbeat_at=timezone.now() - timedelta(hours=3))
+        call_command('run_jobs', once=True, poll=0, stdout=open(os.devnull, 'w'))
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {Job.DONE})
+
+    def test_a_crashed_worker_fails_its_job_and_the_dispatcher_goes_on(self):
+        Job.objects.all().delete()
+        crashed = Job.objects.create(kind='sales_export', params={}, filename='sales.csv', created_by=self.user)
+        after = Job.objects.create(kind='sales_export', params={}, filename='sales.csv', created_by=self.user)
+
+        def work(job_id):
+            if job_id == crashed.id:
+                raise BrokenThreadPool('worker died')
+            return run_job(job_id)
+
+        out = io.StringIO()
+        with mock.patch('core.management.commands.run_jobs._work', side_effect=work):
+            call_command('run_jobs', once=True, poll=0, workers=1, stdout=out)
+        crashed.refresh_from_db()
+        self.assertEqual((crashed.status, crashed.error), (Job.FAILED, 'Worker crashed: worker died'))
+        self.assertEqual(Job.objects.get(pk=after.pk).status, Job.DONE)
+        self.assertIn(f'Job #{crashed.id}: FAILED (BrokenThreadPool)', out.getvalue())
+
+
+class WarmUpTests(TestCase):
+    def test_loads_urls_and_compiles_every_template(self):
+        report = warm_up()
+        self.assertEqual(report['template_errors'], [])
+        self.assertGreater(report['urls'][0], 50)
+        self.assertGreater(report['templates'][0], 20)
+        self.assertEqual(report['db'][0], 1)
+
+
+class PreforkServerTests(SimpleTestCase):
+    def setUp(self):
+        # The master closes database connections before forking
+        for patcher in (mock.patch('main.log'), mock.patch.object(connections, 'close_all')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _master(self, workers=2, env=None):
+        options = main.parse_args(['--workers', str(workers), '--max-requests', '10', '--max-requests-jitter', '0'])
+        with mock.patch.dict(os.environ, env or {}):
+            master = main.Master(mock.Mock(), None, options)
+        self.addCleanup(os.close, master.ready_r)
+        self.addCleanup(os.close, master.ready_w)
+        return master
+
+    def test_worker_recycles_after_max_requests(self):
+        sock = main.listening_socket('127.0.0.1:0', 8)
+        self.addCleanup(sock.close)
+        url = 'http://127.0.0.1:%d/' % sock.getsockname()[1]
+        bodies = []
+        client = threading.Thread(target=lambda: bodies.extend(urlopen(url, timeout=5).read() for _ in range(3)))
+        ready_r, ready_w = os.pipe()
+        self.addCleanup(os.close, ready_r)
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [threading.current_thread().name.encode()]
+
+        client.start()
+        with mock.patch('main.warm_up', return_value=''), mock.patch('main.signal.signal'), \
+                mock.patch('main.RequestHandler.log_message'), mock.patch.object(audit, 'flush') as flush:
+            main.run_worker(sock, app, 3, ready_w, threads=2)
+        client.join(5)
+        self.assertEqual(os.read(ready_r, 1), b'.')
+        flush.assert_called_once_with()
+        self.assertEqual(len(bodies), 3)
+        self.assertTrue(all(body.startswith(b'request') for body in bodies))
+
+    def test_dead_and_recycled_workers_are_replaced(self):
+        master = self._master()
+        # Nothing has exited on the first pass; then worker 101 exits (recycled or crashed)
+        exits = iter([(0, 0), (101, 0), (0, 0)])
+        with mock.patch('main.os.fork', side_effect=[101, 102, 103]) as fork, \
+                mock.patch('main.os.waitpid', side_effect=lambda *args: next(exits)):
+            self.assertTrue(master.tick())
+            self.assertEqual(master.workers, {101, 102})
+            self.assertTrue(master.tick())
+        self.assertEqual(master.workers, {102, 103})
+        self.assertEqual(fork.call_count, 3)
+
+    def test_reload_retires_old_workers_once_new_ones_are_warm(self):
+        master = self._master(env={main.OLD_WORKERS_ENV: '11,12'})
+        self.assertEqual(master.retiring, {11, 12})
+        with mock.patch('main.os.fork', side_effect=[101, 102]), \
+                mock.patch('main.os.waitpid', side_effect=ChildProcessError), \
+                mock.patch('main.os.kill') as kill:
+            master.tick()
+            os.write(master.ready_w, b'.')
+            master.tick()
+            kill.assert_not_called()
+            os.write(master.ready_w, b'.')
+            master.tick()
+        self.assertEqual(sorted(kill.call_args_list), [mock.call(11, signal.SIGTERM), mock.call(12, signal.SIGTERM)])
+        self.assertEqual((master.workers, master.retiring), ({101, 102}, set()))
+
+        master.reloading = True
+        master.sock.fileno.return_value = 7
+        with mock.patch.dict(os.environ), mock.patch('main.os.set_inheritable'), \
+                mock.patch('main.os.waitpid', side_effect=ChildProcessError), \
+                mock.patch('main.os.execv', side_effect=SystemExit) as execv:
+            with self.assertRaises(SystemExit):
+                master.tick()
+            self.assertEqual(os.environ[main.LISTEN_FD_ENV], '7')
+            self.assertEqual(set(os.environ[main.OLD_WORKERS_ENV].split(',')), {'101', '102'})
+        self.assertIn('main.py', execv.call_args[0][1][1])
+
+
+class StartupTests(TestCase):
+    def test_broken_template_stops_startup(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with open(os.path.join(tmp.name, 'broken.html'), 'w') as fh:
+            fh.write('{% if %}')
+        templates = [dict(settings.TEMPLATES[0], DIRS=[tmp.name])]
+        with override_settings(TEMPLATES=templates, PRECOMPILE_TEMPLATES=True):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'broken.html'):
+                apps.get_app_config('core').ready()
+
+
+class PrecompressedStaticTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        source = os.path.join(tmp.name, 'src')
+        os.makedirs(os.path.join(source, 'js'))
+        self.script = ('console.log("till");\n' * 40).encode()
+        with open(os.path.join(source, 'js', 'till.js'), 'wb') as fh:
+            fh.write(self.script)
+        storages = dict(settings.STORAGES, staticfiles={'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage'})
+        static_settings = override_settings(
+            STATIC_ROOT=os.path.join(tmp.name, 'root'), STATICFILES_DIRS=[source], STORAGES=storages,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        static_settings.enable()
+        self.addCleanup(static_settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_serves_fingerprinted_gzip_copy_with_far_future_cache(self):
+        url = static('js/till.js')
+        self.assertRegex(url, r'^/static/js/till\.[0-9a-f]{12}\.js$')
+
+        resp = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', resp['Cache-Control'])
+        self.assertEqual(resp['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(resp.streaming_content)), self.script)
+        resp.close()
+
+        resp = self.client.get(url)
+        self.assertNotIn('Content-Encoding', resp)
+        self.assertEqual(b''.join(resp.streaming_content), self.script)
+        resp.close()
+        for refused in ('gzip;q=0', 'identity, gzip;q=0', 'gzip; q=0.0, br;q=0'):
+            resp = self.client.get(url, HTTP_ACCEPT_ENCODING=refused)
+            self.assertNotIn('Content-Encoding', resp, refused)
+            resp.close()
+        resp = self.client.get(url, HTTP_ACCEPT_ENCODING='identity;q=0.5, *')
+        self.assertIn(resp['Content-Encoding'], ('br', 'gzip'))
+        resp.close()
+
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified']).status_code, 304)
+        self.assertIn('max-age=300', self.client.get('/static/js/till.js')['Cache-Control'])
+
+
+class MetricsTests(TransactionTestCase):
+    # Lock retries only happen outside an enclosing transaction.
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        metrics_settings = override_settings(METRICS_DIR=self.dir, METRICS_TOKEN='scrape')
+        metrics_settings.enable()
+        self.addCleanup(metrics_settings.disable)
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester', password='pass1234', is_staff=True)
+        self.customer = Customer.objects.create(name='Ali')
+        self.product = Product.objects.create(name='Tyre', price=Decimal('1000.00'), stock_quantity=50)
+        self.cart = {str(self.product.id): {'product_id': self.product.id, 'name': 'Tyre', 'price': '1000.00', 'quantity': 1, 'subtotal': '1000.00'}}
+
+    def scrape(self):
+        resp = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(resp.status_code, 200)
+        return resp.content.decode()
+
+    def test_views_and_checkout_summed_across_processes(self):
+        self.client.login(username='tester', password='pass1234')
+        self.client.get(reverse('products:product_list'))
+        create_sale_from_cart(self.user, self.customer.id, self.cart, payment_type='FULL')
+        # A worker that has since exited left its own file behind
+        dead = metrics._Store(os.path.join(self.dir, 'metrics_999999999.db'))
+        dead.add(metrics.REQUEST_SECONDS.labels('products:product_list').count_key, 2)
+
+        body = self.scrape()
+        self.assertIn('pos_request_duration_seconds_count{view="products:product_list"} 3', body)
+        self.assertIn('pos_checkout_duration_seconds_count{payment_type="FULL"} 1', body)
+        self.assertIn('pos_checkout_lines_bucket{le="1.0"} 1', body)
+        self.assertRegex(body, r'pos_request_db_queries_total\{view="products:product_list"\} [1-9]')
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'metrics_999999999.db')))
+        self.assertIn('pos_request_duration_seconds_count{view="products:product_list"} 3', self.scrape())
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_checkout_retried_when_database_locked(self):
+        with mock.patch('sales.utils.record_sale', side_effect=[OperationalError('database is locked'), None]), \
+                mock.patch('core.db.time.sleep'):
+            create_sale_from_cart(self.user, self.customer.id, self.cart, payment_type='FULL')
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 49)
+        self.assertIn('pos_db_lock_retries_total{operation="checkout"} 1', self.scrape())
+
+
+class MaintenanceTests(TransactionTestCase):
+    # The online backup cannot run inside a transaction on the source database.
+
+    def test_backups_are_checked_and_rotated(self):
+        Product.objects.create(name='Tyre', price=Decimal('1000.00'), stock_quantity=5)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        paths = [backup_database(tmp.name, keep=2, pages=1, sleep=0) for _ in range(3)]
+        self.assertEqual(sorted(os.listdir(tmp.name)), sorted(os.path.basename(p) for p in paths[1:]))
+        snapshot = sqlite3.connect(paths[-1])
+        self.addCleanup(snapshot.close)
+        self.assertEqual(snapshot.execute('SELECT name FROM products_product').fetchall(), [('Tyre',)])
+
+    def test_optimize_reports_pages_and_plans(self):
+        # One cashier, many customers: once analyzed, the customer index is the narrower one
+        user = get_user_model().objects.create_user(username='cashier')
+        customers = Customer.objects.bulk_create([Customer(name=f'C{i}') for i in range(200)])
+        Sale.objects.bulk_create([
+            Sale(customer=customers[i % 200], created_by=user, payment_type='FULL', total_amount=Decimal('1.00'))
+            for i in range(2000)
+        ])
+        report = optimize_database(vacuum_pages=10)
+        self.assertGreater(report['after']['page_count'], 0)
+        self.assertIn(report['after']['auto_vacuum'], ('NONE', 'FULL', 'INCREMENTAL'))
+        before, after = report['plan_changes']['cashier and customer sales']
+        self.assertIn('sale_cashier_date_idx', ' '.join(before))
+        self.assertIn('sale_customer_date_idx', ' '.join(after))
+
+
+class AuditLogTests(TestCase):
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='u', password='p', is_staff=True)
+        self.client.login(username='u', password='p')
+
+    def test_views_record_who_changed_what(self):
+        self.client.post(reverse('products:product_create'), {'name': 'Soap', 'price': '10', 'stock_quantity': '5'})
+        product = Product.objects.get(name='Soap')
+        self.client.post(reverse('products:product_update', args=[product.pk]), {'name': 'Soap', 'price': '12'})
+        customer = Customer.objects.create(name='Ali')
+        self.client.post(reverse('customers:customer_delete', args=[customer.pk]))
+        buyer = Customer.objects.create(name='Sara')
+        cart = {str(product.pk): {'product_id': product.pk, 'name': 'Soap', 'price': Decimal('12'), 'quantity': 1, 'subtotal': Decimal('12')}}
+        sale = create_sale_from_cart(self.user, buyer.pk, cart, payment_type='INSTALLMENT', installment_data={
+            'total_installments': 2, 'first_due_date': timezone.localdate().isoformat()})
+        self.client.post(reverse('sales:installment_payment_create', args=[sale.installment_plan.pk]), {'amount': '5'})
+
+        self.assertEqual(list(AuditEvent.objects.order_by('id').values_list('user', 'action', 'model', 'summary')), [
+            (self.user.pk, 'create', 'product', 'Soap'),
+            (self.user.pk, 'update', 'product', 'Soap: price 10.00 -> 12.00'),
+            (self.user.pk, 'delete', 'customer', 'Ali'),
+            (self.user.pk, 'create', 'payment', f'Rs 5 on sale #{sale.pk}'),
+        ])
+        resp = self.client.get(reverse('audit_log'), {'model': 'product', 'object': product.pk})
+        self.assertEqual([e.action for e in resp.context['page_obj']], ['update', 'create'])
+        resp = self.client.get(reverse('audit_log'), {'action': 'delete', 'user': self.user.pk})
+        self.assertEqual([e.summary for e in resp.context['page_obj']], ['Ali'])
+
+        get_user_model().objects.create_user(username='cashier', password='p')
+        self.client.login(username='cashier', password='p')
+        self.assertEqual(self.client.get(reverse('audit_log')).status_code, 403)
+
+    def test_events_are_buffered_until_flushed(self):
+        with override_settings(AUDIT_FLUSH_SECONDS=3600, AUDIT_BATCH_SIZE=100):
+            for pk in range(3):
+                audit.log_event(self.user, 'update', 'customer', pk)
+            self.assertFalse(AuditEvent.objects.exists())
+            self.assertEqual(audit.flush(), 3)
+        self.assertEqual(sorted(AuditEvent.objects.values_list('object_id', flat=True)), [0, 1, 2])
+        self.assertEqual(audit.flush(), 0)
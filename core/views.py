@@ -0,0 +1,117 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import metrics
+from .models import AuditEvent, Job
+
+
+def _jobs_for(user):
+    return Job.objects.all() if user.is_staff else Job.objects.filter(created_by=user)
+
+
+@login_required
+def job_list(request):
+    jobs = _jobs_for(request.user).select_related('created_by').order_by('-created_at')
+    page_obj = Paginator(jobs, 20).get_page(request.GET.get('page'))
+    return render(request, 'core/job_list.html', {'page_obj': page_obj})
+
+
+@login_required
+def job_detail(request, pk):
+    job = get_object_or_404(_jobs_for(request.user), pk=pk)
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({
+            'id': job.id,
+            'status': job.status,
+            'progress': job.progress,
+            'error': job.error,
+            'download_url': reverse('core:job_download', args=[job.id]) if job.status == Job.DONE else None,
+        })
+    return render(request, 'core/job_detail.html', {'job': job})
+
+
+@login_required
+def job_download(request, pk):
+    job = get_object_or_404(_jobs_for(request.user), pk=pk, status=Job.DONE)
+    try:
+        result = open(job.result_path, 'rb')
+    except FileNotFoundError:
+        raise Http404('The result file has expired.')
+    return FileResponse(result, as_attachment=True, filename=job.filename)
+
+
+AUDIT_PAGE_SIZE = 50
+
+
+def _audit_filters(params):
+    """Cleaned filters from the audit form: user id, action, model, object id and a date range."""
+    filters = {key: params.get(key, '').strip() for key in ('user', 'action', 'model', 'object', 'start', 'end')}
+    for key in ('user', 'object'):
+        if not filters[key].isdigit():
+            filters[key] = ''
+    if filters['action'] not in dict(AuditEvent.ACTION_CHOICES):
+        filters['action'] = ''
+    if filters['model'] not in dict(AuditEvent.MODEL_CHOICES):
+        filters['model'] = ''
+    for key in ('start', 'end'):
+        try:
+            filters[key] = parse_date(filters[key]) or ''
+        except ValueError:
+            filters[key] = ''
+    return filters
+
+
+@login_required
+def audit_log(request):
+    """Who created, changed or deleted products, customers, sales and payments; staff only.
+
+    Every filter maps onto an index of AuditEvent: time, user and time, or model and object.
+    """
+    if not request.user.is_staff:
+        raise PermissionDenied
+    filters = _audit_filters(request.GET)
+    events = AuditEvent.objects.select_related('user').order_by('-created_at', '-id')
+    if filters['user']:
+        events = events.filter(user_id=filters['user'])
+    if filters['action']:
+        events = events.filter(action=filters['action'])
+    if filters['model']:
+        events = events.filter(model=filters['model'])
+    if filters['object']:
+        events = events.filter(object_id=filters['object'])
+    tz = timezone.get_current_timezone()
+    if filters['start']:
+        events = events.filter(created_at__gte=timezone.make_aware(datetime.combine(filters['start'], time.min), tz))
+    if filters['end']:
+        events = events.filter(created_at__lt=timezone.make_aware(
+            datetime.combine(filters['end'] + timedelta(days=1), time.min), tz))
+
+    page_obj = Paginator(events, AUDIT_PAGE_SIZE).get_page(request.GET.get('page'))
+    query = request.GET.copy()
+    query.pop('page', None)
+    return render(request, 'core/audit_log.html', {
+        'page_obj': page_obj,
+        'filters': filters,
+        'query': query.urlencode(),
+        'users': get_user_model().objects.order_by('username'),
+        'actions': AuditEvent.ACTION_CHOICES,
+        'models': AuditEvent.MODEL_CHOICES,
+    })
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint: staff sessions, or ``Authorization: Bearer <METRICS_TOKEN>``."""
+    token = settings.METRICS_TOKEN
+    if not request.user.is_staff and not (token and request.headers.get('Authorization') == f'Bearer {token}'):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
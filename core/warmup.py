@@ -0,0 +1,62 @@
+import os
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+from django.urls import URLResolver, get_resolver
+
+
+def _template_names(dirs):
+    for base in dirs:
+        for root, _, files in os.walk(base):
+            for name in files:
+                if name.endswith(('.html', '.txt')):
+                    yield os.path.relpath(os.path.join(root, name), base).replace(os.sep, '/')
+
+
+def _load_patterns(resolver):
+    # Touching reverse_dict populates the reverse lookup tables of nested resolvers too.
+    resolver.reverse_dict
+    return sum(_load_patterns(p) if isinstance(p, URLResolver) else 1 for p in resolver.url_patterns)
+
+
+def compile_templates():
+    """Load every project and app template through each engine, filling the cached loader.
+
+    Returns ``(compiled, errors)`` where errors are ``'name: message'`` strings.
+    """
+    compiled, errors = 0, []
+    for engine in engines.all():
+        dirs = list(getattr(engine, 'dirs', [])) + list(get_app_template_dirs('templates'))
+        for name in sorted(set(_template_names(dirs))):
+            try:
+                engine.get_template(name)
+                compiled += 1
+            except Exception as exc:
+                errors.append(f'{name}: {exc}')
+    return compiled, errors
+
+
+def warm_up(db_aliases=(DEFAULT_DB_ALIAS,)):
+    """Do the work a worker would otherwise do on its first requests.
+
+    Imports every URLconf (and with it every view module) and builds the reverse lookup
+    table, compiles every project and app template into the cached template loader, and
+    opens the database connections. Returns ``{step: (count, seconds)}``; templates that fail
+    to compile are reported under ``'template_errors'``.
+    """
+    report = {}
+
+    started = time.perf_counter()
+    report['urls'] = (_load_patterns(get_resolver()), time.perf_counter() - started)
+
+    started = time.perf_counter()
+    compiled, report['template_errors'] = compile_templates()
+    report['templates'] = (compiled, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for alias in db_aliases:
+        connections[alias].ensure_connection()
+    report['db'] = (len(db_aliases), time.perf_counter() - started)
+    return report
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from customers.utils import rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = 'Verify denormalized customer totals (balance, lifetime value, sale count) against sales; --fix rewrites mismatches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite mismatching customers with recomputed values')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            mismatches = rebuild_customer_stats(fix=options['fix'], batch_size=options['batch_size'])
+
+        for customer, diff in mismatches:
+            details = ', '.join(f'{field}: {stored} -> {expected}' for field, (stored, expected) in diff.items())
+            self.stdout.write(f'Customer #{customer.id} {customer.name}: {details}')
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All customer totals are consistent.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} customer(s).'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(mismatches)} customer(s) out of sync; rerun with --fix.'))
@@ -0,0 +1,71 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:34
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+
+def backfill_totals(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+    Sale = apps.get_model('sales', 'Sale')
+    InstallmentPayment = apps.get_model('sales', 'InstallmentPayment')
+    paid = dict(
+        InstallmentPayment.objects.values_list('plan__sale__customer').annotate(s=Sum('amount_paid'))
+    )
+    stats = Sale.objects.values('customer').annotate(
+        ltv=Sum('total_amount'),
+        owed=Sum('total_amount', filter=Q(payment_type='INSTALLMENT')),
+        n=Count('id'),
+        last=Max('date'),
+    )
+    for row in stats.iterator():
+        Customer.objects.filter(pk=row['customer']).update(
+            lifetime_value=row['ltv'] or Decimal('0'),
+            balance=(row['owed'] or Decimal('0')) - (paid.get(row['customer']) or Decimal('0')),
+            sale_count=row['n'],
+            last_purchase_at=row['last'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_purchase_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_value',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='sale_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['balance'], name='customer_balance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['lifetime_value'], name='customer_ltv_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['last_purchase_at'], name='customer_last_purchase_idx'),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:35
+
+import re
+
+from django.db import migrations, models
+
+
+def populate_search_keys(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+    batch = []
+    for customer in Customer.objects.only('id', 'name', 'phone').iterator():
+        customer.name_normalized = ' '.join((customer.name or '').lower().split())
+        customer.phone_normalized = re.sub(r'\D', '', customer.phone or '')
+        batch.append(customer)
+    Customer.objects.bulk_update(batch, ['name_normalized', 'phone_normalized'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_customer_sales_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='name_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['name_normalized'], name='customer_name_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['phone_normalized'], name='customer_phone_norm_idx'),
+        ),
+        migrations.RunPython(populate_search_keys, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,18 @@
+import re
+from decimal import Decimal
 from django.db import models
 
+
+def normalize_name(value):
+    """Lowercase and collapse whitespace so name prefixes can be matched with an index range scan."""
+    return ' '.join((value or '').lower().split())
+
+
+def normalize_phone(value):
+    """Keep digits only ('0300-123 4567' -> '03001234567')."""
+    return re.sub(r'\D', '', value or '')
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=255)
     phone = models.CharField(max_length=32, blank=True, null=True)
@@ -7,5 +20,32 @@ class Customer(models.Model):
     address = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized sales totals, maintained by sales.utils (see customers.utils.rebuild_customer_stats)
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    last_purchase_at = models.DateTimeField(blank=True, null=True)
+    sale_count = models.PositiveIntegerField(default=0)
+
+    # Search keys kept in sync by save(); used for prefix lookups at checkout
+    name_normalized = models.CharField(max_length=255, blank=True, default='', editable=False)
+    phone_normalized = models.CharField(max_length=32, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['balance'], name='customer_balance_idx'),
+            models.Index(fields=['lifetime_value'], name='customer_ltv_idx'),
+            models.Index(fields=['last_purchase_at'], name='customer_last_purchase_idx'),
+            models.Index(fields=['name_normalized'], name='customer_name_norm_idx'),
+            models.Index(fields=['phone_normalized'], name='customer_phone_norm_idx'),
+        ]
+
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        self.name_normalized = normalize_name(self.name)
+        self.phone_normalized = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'name_normalized', 'phone_normalized'}
+        super().save(*args, **kwargs)
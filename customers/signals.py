@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.changelog import record_change
+from .models import Customer
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance, **kwargs):
+    record_change('customer', instance.id)
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    record_change('customer', instance.id, deleted=True)
@@ -0,0 +1,64 @@
+from decimal import Decimal
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from products.models import Product
+from sales.utils import create_sale_from_cart
+from .models import Customer
+from .utils import rebuild_customer_stats
+
+
+class CustomerTotalsTests(TestCase):
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester', password='pass1234')
+        self.client.login(username='tester', password='pass1234')
+        self.customer = Customer.objects.create(name='Ali', phone='123')
+        self.product = Product.objects.create(name='Tyre', price=Decimal('1000.00'), stock_quantity=50)
+
+    def _cart(self, qty):
+        subtotal = Decimal('1000.00') * qty
+        return {str(self.product.id): {'product_id': self.product.id, 'name': 'Tyre', 'price': '1000.00', 'quantity': qty, 'subtotal': str(subtotal)}}
+
+    def test_sales_and_payments_maintain_totals(self):
+        create_sale_from_cart(self.user, self.customer.id, self._cart(1), payment_type='FULL')
+        sale = create_sale_from_cart(self.user, self.customer.id, self._cart(3), payment_type='INSTALLMENT',
+                                     installment_data={'total_installments': 3})
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.sale_count, 2)
+        self.assertEqual(self.customer.lifetime_value, Decimal('4000.00'))
+        self.assertEqual(self.customer.balance, Decimal('3000.00'))
+        self.assertEqual(self.customer.last_purchase_at, sale.date)
+
+        resp = self.client.post(reverse('sales:installment_payment_create', args=[sale.installment_plan.id]), {'amount': '1200.00'})
+        self.assertEqual(resp.status_code, 302)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.balance, Decimal('1800.00'))
+        self.assertEqual(rebuild_customer_stats(), [])
+
+    def test_rebuild_fixes_drift(self):
+        create_sale_from_cart(self.user, self.customer.id, self._cart(2), payment_type='INSTALLMENT',
+                              installment_data={'total_installments': 2})
+        Customer.objects.filter(pk=self.customer.pk).update(balance=Decimal('0'), sale_count=0)
+        mismatches = rebuild_customer_stats(fix=True)
+        self.assertEqual(len(mismatches), 1)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.balance, Decimal('2000.00'))
+        self.assertEqual(self.customer.sale_count, 1)
+        self.assertEqual(rebuild_customer_stats(), [])
+
+    def test_customer_list_sort_and_history(self):
+        other = Customer.objects.create(name='Sara', balance=Decimal('500.00'), lifetime_value=Decimal('9000.00'))
+        Customer.objects.filter(pk=self.customer.pk).update(balance=Decimal('2500.00'), lifetime_value=Decimal('100.00'))
+        resp = self.client.get(reverse('customers:customer_list') + '?sort=value')
+        self.assertEqual(resp.context['page_obj'].object_list[0], other)
+        resp = self.client.get(reverse('customers:customer_list') + '?sort=balance&owing=1')
+        self.assertEqual([c.name for c in resp.context['page_obj'].object_list], ['Ali', 'Sara'])
+
+        create_sale_from_cart(self.user, self.customer.id, self._cart(1), payment_type='FULL')
+        resp = self.client.get(reverse('customers:customer_history', args=[self.customer.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['page_obj'].object_list), 1)
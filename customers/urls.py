@@ -5,7 +5,9 @@ app_name = 'customers'
 
 urlpatterns = [
     path('', views.customer_list, name='customer_list'),
+    path('search/', views.customer_search, name='customer_search'),
     path('create/', views.customer_create, name='customer_create'),
+    path('<int:pk>/history/', views.customer_history, name='customer_history'),
     path('<int:pk>/edit/', views.customer_update, name='customer_update'),
     path('<int:pk>/delete/', views.customer_delete, name='customer_delete'),
 ]
@@ -0,0 +1,138 @@
+from decimal import Decimal
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from core.changelog import record_change
+from .models import Customer, normalize_name, normalize_phone
+
+
+STAT_FIELDS = ('balance', 'lifetime_value', 'last_purchase_at', 'sale_count')
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+ANONYMOUS_NAME = 'Anonymous'
+
+def anonymous_customer_id():
+    """Id of the walk-in 'Anonymous' customer, created on first use.
+
+    Looked up on every call (one indexed query) rather than cached in the process: under the
+    pre-forked server another worker may delete or recreate that customer.
+    """
+    customer = Customer.objects.filter(name_normalized=normalize_name(ANONYMOUS_NAME), name=ANONYMOUS_NAME).order_by('pk').first()
+    if customer is None:
+        customer = Customer.objects.create(name=ANONYMOUS_NAME)
+    return customer.id
+
+
+def _prefix_range(field, prefix):
+    # A half-open range instead of LIKE 'x%': SQLite's LIKE is case-insensitive and
+    # cannot use a plain B-tree index, a range comparison always can.
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix + '\uffff'}
+
+
+def search_customers(query, limit=10):
+    """Prefix search on normalized phone (when the query has no letters) or name."""
+    query = (query or '').strip()
+    digits = normalize_phone(query)
+    if digits and not any(ch.isalpha() for ch in query):
+        lookup = _prefix_range('phone_normalized', digits)
+        order = 'phone_normalized'
+    else:
+        name = normalize_name(query)
+        if not name:
+            return Customer.objects.none()
+        lookup = _prefix_range('name_normalized', name)
+        order = 'name_normalized'
+    return Customer.objects.filter(**lookup).order_by(order).only('id', 'name', 'phone', 'balance')[:limit]
+
+
+def record_sale(sale):
+    """Fold a newly created sale into its customer's denormalized totals.
+
+    Must be called inside the transaction that created the sale. Uses F() expressions so
+    concurrent checkouts for the same customer never lose an update.
+    """
+    owed = sale.total_amount if sale.payment_type == 'INSTALLMENT' else Decimal('0')
+    Customer.objects.filter(pk=sale.customer_id).update(
+        balance=F('balance') + owed,
+        lifetime_value=F('lifetime_value') + sale.total_amount,
+        sale_count=F('sale_count') + 1,
+        last_purchase_at=Coalesce(Greatest('last_purchase_at', Value(sale.date)), Value(sale.date)),
+    )
+    record_change('customer', sale.customer_id)
+
+
+def record_payment(customer_id, amount):
+    """Reduce a customer's outstanding balance by an installment payment."""
+    Customer.objects.filter(pk=customer_id).update(balance=F('balance') - amount)
+    record_change('customer', customer_id)
+
+
+def customer_stats_queryset():
+    """Customers annotated with their totals recomputed from Sale/InstallmentPayment rows.
+
+    Annotations are named ``expected_<field>`` for each of STAT_FIELDS.
+    """
+    from sales.models import InstallmentPayment, Sale
+
+    def sales_agg(aggregate, **filters):
+        return Subquery(
+            Sale.objects.filter(customer=OuterRef('pk'), **filters)
+            .values('customer')
+            .annotate(v=aggregate)
+            .values('v')
+        )
+
+    zero = Value(Decimal('0'))
+    paid = Subquery(
+        InstallmentPayment.objects.filter(plan__sale__customer=OuterRef('pk'))
+        .values('plan__sale__customer')
+        .annotate(v=Sum('amount_paid'))
+        .values('v')
+    )
+    return Customer.objects.annotate(
+        expected_lifetime_value=Coalesce(sales_agg(Sum('total_amount')), zero, output_field=MONEY),
+        expected_sale_count=Coalesce(sales_agg(Count('id')), Value(0)),
+        expected_last_purchase_at=sales_agg(Max('date')),
+        expected_balance=(
+            Coalesce(sales_agg(Sum('total_amount'), payment_type='INSTALLMENT'), zero, output_field=MONEY)
+            - Coalesce(paid, zero, output_field=MONEY)
+        ),
+    )
+
+
+def rebuild_customer_stats(fix=False, batch_size=500):
+    """Compare stored customer totals with recomputed ones.
+
+    Returns a list of ``(customer, {field: (stored, expected)})`` for every mismatch. With
+    ``fix=True`` the mismatching rows are rewritten with ``bulk_update``. Sales moved to the
+    archive database still count towards the expected totals.
+    """
+    from sales.archive import archived_customer_totals
+
+    archived = archived_customer_totals()
+    mismatches = []
+    to_update = []
+    for customer in customer_stats_queryset().iterator(chunk_size=batch_size):
+        diff = {}
+        for field in STAT_FIELDS:
+            stored = getattr(customer, field)
+            expected = getattr(customer, f'expected_{field}')
+            if customer.id in archived:
+                extra = archived[customer.id][field]
+                if field == 'last_purchase_at':
+                    expected = max(expected or extra, extra)
+                else:
+                    expected += extra
+            if field in ('balance', 'lifetime_value'):
+                expected = Decimal(expected).quantize(Decimal('0.01'))
+            if stored != expected:
+                diff[field] = (stored, expected)
+                setattr(customer, field, expected)
+        if diff:
+            mismatches.append((customer, diff))
+            to_update.append(customer)
+    if fix and to_update:
+        Customer.objects.bulk_update(to_update, STAT_FIELDS, batch_size=batch_size)
+        record_change('customer', [c.id for c in to_update])
+    return mismatches
@@ -1,14 +1,33 @@
+from decimal import Decimal, InvalidOperation
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.audit import log_event
+from core.metrics import instrument
+
 from .models import Customer
+from .utils import search_customers
+
+
+CUSTOMER_SORTS = {
+    'newest': '-created_at',
+    'name': 'name',
+    'balance': '-balance',
+    'value': '-lifetime_value',
+    'recent': '-last_purchase_at',
+}
 
 
+@instrument
 @login_required
 def customer_list(request):
-    qs = Customer.objects.order_by('-created_at')
+    sort = request.GET.get('sort', 'newest')
+    if sort not in CUSTOMER_SORTS:
+        sort = 'newest'
+    qs = Customer.objects.order_by(CUSTOMER_SORTS[sort], '-id')
     q = request.GET.get('q', '').strip()
     if q:
         from django.db.models import Q
@@ -17,10 +36,47 @@ def customer_list(request):
             Q(phone__icontains=q) |
             Q(email__icontains=q)
         )
+    owing = request.GET.get('owing') == '1'
+    if owing:
+        qs = qs.filter(balance__gt=0)
+    min_value = request.GET.get('min_value', '').strip()
+    if min_value:
+        try:
+            qs = qs.filter(lifetime_value__gte=Decimal(min_value))
+        except InvalidOperation:
+            min_value = ''
     page_obj = Paginator(qs, 10).get_page(request.GET.get('page'))
-    return render(request, 'customers/customer_list.html', {'page_obj': page_obj, 'q': q})
+    return render(request, 'customers/customer_list.html', {
+        'page_obj': page_obj,
+        'q': q,
+        'sort': sort,
+        'owing': owing,
+        'min_value': min_value,
+    })
+
+
+@instrument
+@login_required
+def customer_history(request, pk):
+    customer = get_object_or_404(Customer, pk=pk)
+    # Totals come from the denormalized columns; only the current page of sales is queried
+    sales = customer.sales.select_related('installment_plan').order_by('-date')
+    page_obj = Paginator(sales, 15).get_page(request.GET.get('page'))
+    return render(request, 'customers/customer_history.html', {'customer': customer, 'page_obj': page_obj})
+
+
+@instrument
+@login_required
+def customer_search(request):
+    """JSON typeahead: prefix match on name or phone, at most 10 results."""
+    results = [
+        {'id': c.id, 'name': c.name, 'phone': c.phone or '', 'balance': str(c.balance)}
+        for c in search_customers(request.GET.get('q', ''))
+    ]
+    return JsonResponse({'results': results})
 
 
+@instrument
 @login_required
 def customer_create(request):
     if request.method == 'POST':
@@ -31,12 +87,14 @@ def customer_create(request):
         if not name:
             messages.error(request, 'Name is required.')
         else:
-            Customer.objects.create(name=name, phone=phone, email=email, address=address)
+            customer = Customer.objects.create(name=name, phone=phone, email=email, address=address)
+            log_event(request.user, 'create', 'customer', customer.pk, name)
             messages.success(request, f'Customer "{name}" created.')
             return redirect('customers:customer_list')
     return render(request, 'customers/customer_form.html')
 
 
+@instrument
 @login_required
 def customer_update(request, pk):
     customer = get_object_or_404(Customer, pk=pk)
@@ -46,17 +104,20 @@ def customer_update(request, pk):
         customer.email = request.POST.get('email') or None
         customer.address = request.POST.get('address', '')
         customer.save()
+        log_event(request.user, 'update', 'customer', customer.pk, customer.name)
         messages.success(request, f'Customer "{customer.name}" updated.')
         return redirect('customers:customer_list')
     return render(request, 'customers/customer_form.html', {'customer': customer})
 
 
+@instrument
 @login_required
 def customer_delete(request, pk):
     customer = get_object_or_404(Customer, pk=pk)
     if request.method == 'POST':
         name = customer.name
         customer.delete()
+        log_event(request.user, 'delete', 'customer', pk, name)
         messages.success(request, f'Customer "{name}" deleted.')
         return redirect('customers:customer_list')
     return render(request, 'customers/customer_confirm_delete.html', {'customer': customer})
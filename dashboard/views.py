@@ -5,36 +5,44 @@ from django.db.models import Sum, Count
 from django.shortcuts import render
 from django.utils import timezone
 
+from core.metrics import instrument
+from core.replica import reads_from_reporting
 from products.models import Product
+from products.utils import current_branch, low_stock_count
 from customers.models import Customer
 from sales.models import Sale, InstallmentPlan
 
 
+@instrument
 @login_required
+@reads_from_reporting
 def dashboard_view(request):
     now = timezone.now()
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    
+    # Sales and stock figures are for this session's branch, read through its (branch, ...) indexes
+    branch = current_branch(request)
+    sales = Sale.objects.filter(branch=branch)
+
     # Sales statistics
-    sales_today = Sale.objects.filter(date__gte=today_start).count()
-    sales_today_revenue = Sale.objects.filter(date__gte=today_start).aggregate(s=Sum('total_amount'))['s'] or Decimal('0')
+    sales_today = sales.filter(date__gte=today_start).count()
+    sales_today_revenue = sales.filter(date__gte=today_start).aggregate(s=Sum('total_amount'))['s'] or Decimal('0')
     
     # Week statistics
     week_start = now - timedelta(days=now.weekday())
     week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-    sales_this_week = Sale.objects.filter(date__gte=week_start).count()
-    sales_this_week_revenue = Sale.objects.filter(date__gte=week_start).aggregate(s=Sum('total_amount'))['s'] or Decimal('0')
+    sales_this_week = sales.filter(date__gte=week_start).count()
+    sales_this_week_revenue = sales.filter(date__gte=week_start).aggregate(s=Sum('total_amount'))['s'] or Decimal('0')
     
     # Month statistics
     month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    sales_this_month = Sale.objects.filter(date__gte=month_start).count()
-    sales_this_month_revenue = Sale.objects.filter(date__gte=month_start).aggregate(s=Sum('total_amount'))['s'] or Decimal('0')
+    sales_this_month = sales.filter(date__gte=month_start).count()
+    sales_this_month_revenue = sales.filter(date__gte=month_start).aggregate(s=Sum('total_amount'))['s'] or Decimal('0')
     
     # Overall statistics
-    total_revenue = Sale.objects.filter(is_completed=True).aggregate(s=Sum('total_amount'))['s'] or Decimal('0')
+    total_revenue = sales.filter(is_completed=True).aggregate(s=Sum('total_amount'))['s'] or Decimal('0')
     total_products = Product.objects.count()
     total_customers = Customer.objects.count()
-    low_stock_products = Product.objects.filter(stock_quantity__lte=10).count()
+    low_stock_products = low_stock_count(branch)
 
     # Installment statistics
     plans = InstallmentPlan.objects.all().annotate(paid=Sum('payments__amount_paid'))
@@ -50,7 +58,7 @@ def dashboard_view(request):
                 pending_installments += 1
 
     # Recent sales (last 5)
-    recent_sales = Sale.objects.select_related('customer').order_by('-date')[:5]
+    recent_sales = sales.select_related('customer').order_by('-date')[:5]
 
     ctx = {
         'sales_today': sales_today,
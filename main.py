@@ -1,6 +1,282 @@
-def main():
-    print("Hello from django-pos7!")
+"""Production entry point: a pre-forking WSGI server around ``shopproject.wsgi.application``.
 
+    python main.py --bind 0.0.0.0:8000 --workers 4
 
-if __name__ == "__main__":
+The master imports Django once, warms URL and template caches, opens the listening socket
+and forks the workers, which inherit all of that and only open their own database
+connections before accepting traffic. Signals to the master:
+
+    TERM, INT   finish in-flight requests and exit
+    HUP         graceful reload: re-exec the master with fresh code on the same socket,
+                start and warm new workers, then retire the old ones
+
+Each worker serves up to ``--threads`` requests at once. Workers are recycled after
+``--max-requests`` requests (plus jitter) and replaced if they die. Platforms without
+``fork`` (Windows) get a single warmed-up process instead.
+
+The HTTP layer is the standard library's wsgiref: HTTP/1.0, one request per connection,
+no TLS. Run it behind a reverse proxy (nginx, a load balancer) that terminates TLS, keeps
+client connections alive and buffers slow clients.
+"""
+import argparse
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+REPO_ROOT = Path(__file__).resolve().parent
+for path in (REPO_ROOT, REPO_ROOT / 'shopproject'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+# Handed across a graceful reload: the inherited listening socket and the workers to retire.
+LISTEN_FD_ENV = 'POS_LISTEN_FD'
+OLD_WORKERS_ENV = 'POS_OLD_WORKERS'
+
+
+def log(message):
+    print(f'[{os.getpid()}] {message}', file=sys.stderr, flush=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the POS with pre-forked worker processes.')
+    parser.add_argument('--bind', default=os.environ.get('BIND', '127.0.0.1:8000'), help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 2 * (os.cpu_count() or 1) + 1)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 4)),
+                        help='Requests each worker serves at once')
+    parser.add_argument('--max-requests', type=int, default=1000, help='Recycle a worker after this many requests (0: never)')
+    parser.add_argument('--max-requests-jitter', type=int, default=100, help='Random extra requests so workers do not recycle together')
+    parser.add_argument('--graceful-timeout', type=float, default=30, help='Seconds workers get to finish before being killed')
+    parser.add_argument('--backlog', type=int, default=128)
+    return parser.parse_args(argv)
+
+
+def load_application():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shopproject.settings')
+    from shopproject.wsgi import application
+    return application
+
+
+def listening_socket(bind, backlog):
+    if os.environ.get(LISTEN_FD_ENV):
+        sock = socket.socket(fileno=int(os.environ.pop(LISTEN_FD_ENV)))
+    else:
+        host, _, port = bind.rpartition(':')
+        sock = socket.create_server((host or '0.0.0.0', int(port)), backlog=backlog, reuse_port=False)
+    # A worker that loses the accept() race times out and goes back to waiting, and the
+    # timeout bounds how long a stop request waits for the next connection.
+    sock.settimeout(1.0)
+    return sock
+
+
+class RequestHandler(WSGIRequestHandler):
+    def address_string(self):
+        return self.client_address[0]
+
+
+class WorkerServer(WSGIServer):
+    """wsgiref server on a socket that the master already bound.
+
+    Accepted connections are served on a pool of ``threads`` threads; accepting waits for a
+    free thread, so a busy worker leaves new connections in the socket backlog for the others.
+    """
+
+    def __init__(self, sock, app, threads=1):
+        super().__init__(sock.getsockname()[:2], RequestHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        host, port = sock.getsockname()[:2]
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+        self.setup_environ()
+        self.set_app(app)
+        self.handled = 0
+        self.slots = threading.BoundedSemaphore(threads)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+
+    def handle_request(self):
+        # Only take a connection off the socket when a thread is free to serve it
+        with self.slots:
+            pass
+        super().handle_request()
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        self.handled += 1
+        self.pool.submit(self.serve_request, request, client_address)
+
+    def serve_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        # Let in-flight requests finish; the listening socket stays open for the other workers
+        self.pool.shutdown(wait=True)
+
+
+def warm_up(db=True):
+    from core.warmup import warm_up as run_warm_up
+
+    report = run_warm_up(db_aliases=('default',) if db else ())
+    for error in report.pop('template_errors'):
+        log(f'template failed to compile: {error}')
+    return ', '.join(f'{step} {count} in {seconds * 1000:.0f}ms' for step, (count, seconds) in report.items())
+
+
+def run_worker(sock, app, max_requests, ready_fd, threads=1):
+    from core import audit
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    log(f'worker warmed up ({warm_up()})')
+    server = WorkerServer(sock, app, threads)
+    os.write(ready_fd, b'.')
+    os.close(ready_fd)
+    try:
+        while not stopping and (not max_requests or server.handled < max_requests):
+            server.handle_request()
+    finally:
+        server.server_close()
+        # The worker leaves through os._exit, which skips the atexit flush of queued audit events
+        audit.flush()
+    if not stopping:
+        log(f'worker recycling after {server.handled} requests')
+
+
+class Master:
+    def __init__(self, sock, app, options):
+        self.sock = sock
+        self.app = app
+        self.options = options
+        self.workers = set()
+        self.retiring = {int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, '').split(',') if pid}
+        self.ready_r, self.ready_w = os.pipe()
+        os.set_blocking(self.ready_r, False)
+        self.ready = 0
+        self.stopping = False
+        self.reloading = False
+
+    def spawn(self):
+        from django.db import connections
+
+        connections.close_all()
+        max_requests = self.options.max_requests
+        if max_requests:
+            max_requests += random.randint(0, self.options.max_requests_jitter)
+        pid = os.fork()
+        if pid:
+            self.workers.add(pid)
+            return
+        code = 0
+        try:
+            os.close(self.ready_r)
+            run_worker(self.sock, self.app, max_requests, self.ready_w, self.options.threads)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            code = os.waitstatus_to_exitcode(status)
+            if pid in self.workers and code != 0 and not self.stopping:
+                log(f'worker {pid} exited with {code}')
+            self.workers.discard(pid)
+            self.retiring.discard(pid)
+
+    def drain_ready(self):
+        try:
+            self.ready += len(os.read(self.ready_r, 1024))
+        except BlockingIOError:
+            pass
+
+    def signal_all(self, pids, signum):
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def reexec(self):
+        log('reloading: re-executing master')
+        os.set_inheritable(self.sock.fileno(), True)
+        os.environ[LISTEN_FD_ENV] = str(self.sock.fileno())
+        os.environ[OLD_WORKERS_ENV] = ','.join(str(pid) for pid in self.workers | self.retiring)
+        os.execv(sys.executable, [sys.executable, os.path.abspath(__file__)] + sys.argv[1:])
+
+    def shutdown(self):
+        log('shutting down')
+        self.signal_all(self.workers | self.retiring, signal.SIGTERM)
+        deadline = time.monotonic() + self.options.graceful_timeout
+        while (self.workers or self.retiring) and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        self.signal_all(self.workers | self.retiring, signal.SIGKILL)
+        self.reap()
+
+    def tick(self):
+        """One pass of the master loop. Returns False once the master has shut down."""
+        self.reap()
+        if self.stopping:
+            self.shutdown()
+            return False
+        if self.reloading:
+            self.reexec()
+        while len(self.workers) < self.options.workers:
+            self.spawn()
+        self.drain_ready()
+        # Old workers keep serving until every new one has warmed up.
+        if self.retiring and self.ready >= self.options.workers:
+            log(f'retiring {len(self.retiring)} old workers')
+            self.signal_all(self.retiring, signal.SIGTERM)
+            self.retiring = set()
+        return True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'stopping', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, 'stopping', True))
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, 'reloading', True))
+        host, port = self.sock.getsockname()[:2]
+        log(f'listening on {host}:{port} with {self.options.workers} workers of {self.options.threads} threads')
+        while self.tick():
+            time.sleep(0.2)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    app = load_application()
+    log(f'warmed up ({warm_up(db=False)})')
+    sock = listening_socket(options.bind, options.backlog)
+    if not hasattr(os, 'fork'):
+        log('os.fork is not available; serving from a single process')
+        server = WorkerServer(sock, app, options.threads)
+        warm_up()
+        server.serve_forever()
+        return
+    Master(sock, app, options).run()
+
+
+if __name__ == '__main__':
     main()
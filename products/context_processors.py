@@ -0,0 +1,8 @@
+from .utils import active_branches, current_branch
+
+
+def branches(request):
+    """``branches`` and ``current_branch`` for the branch picker in the header."""
+    if not getattr(request, 'user', None) or not request.user.is_authenticated:
+        return {}
+    return {'branches': active_branches(request), 'current_branch': current_branch(request)}
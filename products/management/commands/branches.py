@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.models import Branch
+
+
+class Command(BaseCommand):
+    help = 'List branches, add one, or close or reopen one (closed branches leave the header picker).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--add', metavar='NAME', help='Open a new branch (it starts with no stock)')
+        parser.add_argument('--close', metavar='NAME')
+        parser.add_argument('--reopen', metavar='NAME')
+
+    def handle(self, *args, **options):
+        if options['add']:
+            branch, created = Branch.objects.get_or_create(name=options['add'].strip())
+            if not created:
+                raise CommandError(f'Branch "{branch.name}" already exists.')
+            self.stdout.write(self.style.SUCCESS(f'Opened {branch.name}.'))
+        for option, active in (('close', False), ('reopen', True)):
+            if options[option]:
+                if not Branch.objects.filter(name=options[option]).update(is_active=active):
+                    raise CommandError(f'No branch named "{options[option]}".')
+                self.stdout.write(self.style.SUCCESS(f'{options[option]} {"reopened" if active else "closed"}.'))
+        for branch in Branch.objects.all():
+            self.stdout.write(f'{branch.pk:>4}  {branch.name}{"" if branch.is_active else "  (closed)"}')
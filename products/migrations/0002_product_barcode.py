@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='barcode',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Barcode / SKU'),
+        ),
+    ]
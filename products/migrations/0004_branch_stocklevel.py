@@ -0,0 +1,52 @@
+# Generated by Django 6.1.2 on 2026-10-19 04:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_main_branch(apps, schema_editor):
+    # The existing shop becomes the first branch and keeps all current stock
+    Branch = apps.get_model('products', 'Branch')
+    Product = apps.get_model('products', 'Product')
+    StockLevel = apps.get_model('products', 'StockLevel')
+    main = Branch.objects.create(name='Main')
+    stock = Product.objects.filter(stock_quantity__gt=0).order_by('id').values_list('id', 'stock_quantity')
+    StockLevel.objects.bulk_create(
+        (StockLevel(branch=main, product_id=pk, quantity=quantity) for pk, quantity in stock.iterator()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_pricechange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'branches',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_levels', to='products.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['branch', 'quantity'], name='stock_branch_quantity_idx')],
+                'constraints': [models.UniqueConstraint(fields=('branch', 'product'), name='stock_branch_product_uniq')],
+            },
+        ),
+        migrations.RunPython(seed_main_branch, migrations.RunPython.noop),
+    ]
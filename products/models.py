@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.db import models
 
 class Product(models.Model):
+    """A catalog item. ``stock_quantity`` is the total over all branches (see StockLevel)."""
     name = models.CharField(max_length=255)
+    barcode = models.CharField('Barcode / SKU', max_length=64, unique=True, blank=True, null=True)
     brand = models.CharField(max_length=255, blank=True, null=True)
     size = models.CharField(max_length=64, blank=True, null=True)
     type = models.CharField(max_length=128, blank=True, null=True)
@@ -12,3 +15,56 @@ class Product(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class PriceChange(models.Model):
+    """One price edit of one product, from the product form or a bulk repricing (products.pricing)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_changes')
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='price_changes')
+    # What triggered the change, e.g. "Brand Michelin +5%"; blank for single edits
+    reason = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-changed_at'], name='price_change_product_idx'),
+        ]
+
+
+class Branch(models.Model):
+    """A shop outlet. Stock is held per branch and every sale is rung up at one."""
+    name = models.CharField(max_length=128, unique=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'branches'
+
+    def __str__(self):
+        return self.name
+
+
+class StockLevel(models.Model):
+    """Units of one product on hand at one branch; a missing row means none.
+
+    Keyed by ``(branch, product)`` so a branch's lookups and low-stock counts read only its
+    own rows. Stock a product is created with lands at the default branch (products.signals).
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='stock_levels')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_levels')
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'product'], name='stock_branch_product_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['branch', 'quantity'], name='stock_branch_quantity_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.branch_id}: {self.quantity}"
@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Round
+
+from core.changelog import record_change
+from core.db import retry_on_lock
+from .models import PriceChange, Product
+
+REPRICE_FILTERS = ('brand', 'type', 'size')
+REPRICE_MODES = {'percent': 'Percent', 'amount': 'Amount (Rs)'}
+PRICE = DecimalField(max_digits=10, decimal_places=2)
+PREVIEW_LIMIT = 50
+
+
+def repricing_queryset(filters):
+    """Products matching every non-blank value of ``filters`` (keys from REPRICE_FILTERS).
+
+    At least one filter is required, so a blank form never reprices the whole catalog.
+    """
+    lookups = {key: filters[key] for key in REPRICE_FILTERS if filters.get(key)}
+    if not lookups:
+        raise ValueError('Choose a brand, type or size to reprice.')
+    return Product.objects.filter(**lookups)
+
+
+def new_price_expression(mode, amount):
+    """SQL expression for the repriced value: ``price * (1 + amount/100)`` or ``price + amount``."""
+    if mode == 'percent':
+        factor = (Decimal('100') + amount) / Decimal('100')
+        return Round(F('price') * Value(factor, output_field=PRICE), 2, output_field=PRICE)
+    if mode == 'amount':
+        return F('price') + Value(amount, output_field=PRICE)
+    raise ValueError(f'Unknown repricing mode "{mode}".')
+
+
+def preview_repricing(filters, mode, amount):
+    """Products that would change, annotated with ``new_price``, as ``(count, first rows)``.
+
+    Raises ValueError when no filter is given or a price would drop below zero.
+    """
+    products = repricing_queryset(filters).annotate(new_price=new_price_expression(mode, amount))
+    if products.filter(new_price__lt=0).exists():
+        raise ValueError('This change would make some prices negative.')
+    return products.count(), list(products.order_by('brand', 'name')[:PREVIEW_LIMIT])
+
+
+def describe_repricing(filters, mode, amount):
+    scope = ', '.join(f'{key.title()} {filters[key]}' for key in REPRICE_FILTERS if filters.get(key))
+    change = f'{amount:+}%' if mode == 'percent' else f'{amount:+} Rs'
+    return f'{scope} {change}'
+
+
+@retry_on_lock('reprice')
+def apply_repricing(filters, mode, amount, user=None):
+    """Reprice every matching product with one UPDATE and record a PriceChange for each.
+
+    Old and new prices are read with the same expression the UPDATE uses, so the history
+    matches what was written. Returns the number of products repriced.
+    """
+    products = repricing_queryset(filters)
+    expression = new_price_expression(mode, amount)
+    reason = describe_repricing(filters, mode, amount)
+    with transaction.atomic():
+        changes = list(products.annotate(new_price=expression).exclude(new_price=F('price'))
+                       .values_list('pk', 'price', 'new_price'))
+        if any(new_price < 0 for _, _, new_price in changes):
+            raise ValueError('This change would make some prices negative.')
+        if not changes:
+            return 0
+        PriceChange.objects.bulk_create([
+            PriceChange(product_id=pk, old_price=old, new_price=new, changed_by=user, reason=reason)
+            for pk, old, new in changes
+        ], batch_size=500)
+        products.update(price=expression)
+        record_change('product', [pk for pk, _, _ in changes])
+    return len(changes)
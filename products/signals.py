@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.changelog import record_change
+from .models import Product, StockLevel
+from .utils import default_branch
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created=False, raw=False, **kwargs):
+    record_change('product', instance.id)
+    if created and instance.stock_quantity and not raw:
+        # Stock given with a new product (API, admin, imports) is held at the default branch
+        StockLevel.objects.create(branch=default_branch(), product=instance, quantity=instance.stock_quantity)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    record_change('product', instance.id, deleted=True)
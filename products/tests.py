@@ -3,7 +3,13 @@ from django.test import TestCase, RequestFactory
 from django.contrib.auth.models import User
 from django.urls import reverse
 
-from .models import Product
+from core.models import ChangeLog
+from customers.models import Customer
+from customers.utils import anonymous_customer_id
+from sales.utils import create_sale_from_cart
+from .models import Branch, PriceChange, Product, StockLevel
+from .pricing import apply_repricing, preview_repricing
+from .utils import default_branch, product_for_code, set_branch_stock
 
 
 class CartTests(TestCase):
@@ -26,3 +32,183 @@ class CartTests(TestCase):
         self.assertEqual(resp.status_code, 302)
         cart = self.client.session.get('cart', {})
         self.assertNotIn(str(self.product.id), cart)
+
+
+class CheckoutCustomerLookupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.product = Product.objects.create(name='Item', price=Decimal('10.00'), stock_quantity=5)
+        self.ali = Customer.objects.create(name='Ali  Raza', phone='0300-123 4567')
+        Customer.objects.create(name='Alina', phone='0321 7654321')
+        Customer.objects.create(name='Bilal', phone='0300 9999999')
+
+    def test_search_by_name_and_phone_prefix(self):
+        url = reverse('customers:customer_search')
+        names = [r['name'] for r in self.client.get(url, {'q': 'ali'}).json()['results']]
+        self.assertEqual(names, ['Ali  Raza', 'Alina'])
+        names = [r['name'] for r in self.client.get(url, {'q': 'ali r'}).json()['results']]
+        self.assertEqual(names, ['Ali  Raza'])
+        names = [r['name'] for r in self.client.get(url, {'q': '0300'}).json()['results']]
+        self.assertEqual(names, ['Ali  Raza', 'Bilal'])
+        names = [r['name'] for r in self.client.get(url, {'q': '0300-12'}).json()['results']]
+        self.assertEqual(names, ['Ali  Raza'])
+
+    def test_normalized_keys_follow_edits(self):
+        self.ali.phone = '+92 301 0000000'
+        self.ali.save()
+        self.assertEqual(Customer.objects.get(pk=self.ali.pk).phone_normalized, '923010000000')
+
+    def test_checkout_reuses_anonymous_customer(self):
+        self.client.post(reverse('products:add_to_cart', args=[self.product.id]), {'quantity': 1})
+        resp = self.client.get(reverse('products:checkout'))
+        self.assertNotIn('customers', resp.context)
+        self.client.post(reverse('products:checkout'), {'customer_id': 'anonymous', 'payment_type': 'FULL'})
+        self.client.post(reverse('products:add_to_cart', args=[self.product.id]), {'quantity': 1})
+        with self.assertNumQueries(1):
+            anonymous_id = anonymous_customer_id()
+        self.client.post(reverse('products:checkout'), {'customer_id': 'anonymous', 'payment_type': 'FULL'})
+        self.assertEqual(Customer.objects.filter(name='Anonymous').count(), 1)
+        self.assertEqual(Customer.objects.get(pk=anonymous_id).sale_count, 2)
+
+        # Not cached in the process, so a change made by another worker is seen at once
+        Customer.objects.filter(pk=anonymous_id).update(name='Walk-in')
+        self.assertNotEqual(anonymous_customer_id(), anonymous_id)
+
+
+class ScanToCartTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.product = Product.objects.create(name='Tyre 195/65R15', barcode='8901234567890', price=Decimal('9500.00'), stock_quantity=5)
+
+    def test_scan_adds_to_cart(self):
+        url = reverse('products:scan_to_cart')
+        resp = self.client.post(url, {'code': ' 8901234567890 '}, HTTP_ACCEPT='application/json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['item']['quantity'], 1)
+        self.client.post(url, {'code': '8901234567890', 'quantity': 2})
+        self.assertEqual(self.client.session['cart'][str(self.product.id)]['quantity'], 3)
+
+    def test_unknown_code_never_falls_back_to_text_search(self):
+        resp = self.client.post(reverse('products:scan_to_cart'), {'code': 'Tyre'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(self.client.session.get('cart', {}), {})
+
+    def test_lookup_follows_product_edits(self):
+        self.assertEqual(product_for_code('8901234567890'), self.product)
+        self.product.barcode = 'NEW-CODE'
+        self.product.save()
+        self.assertIsNone(product_for_code('8901234567890'))
+        with self.assertNumQueries(1):
+            self.assertEqual(product_for_code(' NEW-CODE '), self.product)
+
+
+class RepricingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.m1 = Product.objects.create(name='M 195', brand='Michelin', type='Car', price=Decimal('99.99'), stock_quantity=5)
+        self.m2 = Product.objects.create(name='M 205', brand='Michelin', type='SUV', price=Decimal('250.00'), stock_quantity=5)
+        self.b1 = Product.objects.create(name='B 195', brand='Bridgestone', type='Car', price=Decimal('150.00'), stock_quantity=5)
+
+    def test_preview_then_apply_in_one_update(self):
+        count, rows = preview_repricing({'brand': 'Michelin'}, 'percent', Decimal('7.5'))
+        self.assertEqual(count, 2)
+        self.assertEqual({p.name: p.new_price for p in rows}, {'M 195': Decimal('107.49'), 'M 205': Decimal('268.75')})
+        self.m1.refresh_from_db()
+        self.assertEqual(self.m1.price, Decimal('99.99'))
+
+        seq = ChangeLog.objects.count()
+        self.assertEqual(apply_repricing({'brand': 'Michelin'}, 'percent', Decimal('7.5'), user=self.user), 2)
+        self.assertEqual(dict(Product.objects.values_list('name', 'price')),
+                         {'M 195': Decimal('107.49'), 'M 205': Decimal('268.75'), 'B 195': Decimal('150.00')})
+        change = PriceChange.objects.get(product=self.m1)
+        self.assertEqual((change.old_price, change.new_price, change.changed_by, change.reason),
+                         (Decimal('99.99'), Decimal('107.49'), self.user, 'Brand Michelin +7.5%'))
+        self.assertEqual(ChangeLog.objects.count(), seq + 2)
+
+        self.assertEqual(apply_repricing({'type': 'Car'}, 'amount', Decimal('-50')), 2)
+        self.assertEqual(Product.objects.get(pk=self.b1.pk).price, Decimal('100.00'))
+        with self.assertRaises(ValueError):
+            apply_repricing({'type': 'Car'}, 'amount', Decimal('-100'))
+        with self.assertRaises(ValueError):
+            preview_repricing({}, 'percent', Decimal('5'))
+
+    def test_reprice_view_and_single_edit_history(self):
+        resp = self.client.get(reverse('products:reprice'), {'type': 'Car', 'mode': 'amount', 'amount': '10'})
+        self.assertEqual(resp.context['count'], 2)
+        self.client.post(reverse('products:reprice'), {'type': 'Car', 'mode': 'amount', 'amount': '10'})
+        self.assertEqual(Product.objects.get(pk=self.b1.pk).price, Decimal('160.00'))
+
+        self.client.post(reverse('products:product_update', args=[self.b1.pk]), {'name': 'B 195', 'price': '165.00'})
+        resp = self.client.get(reverse('products:product_update', args=[self.b1.pk]))
+        self.assertEqual([(c.old_price, c.new_price) for c in resp.context['price_changes']],
+                         [(Decimal('160.00'), Decimal('165.00')), (Decimal('150.00'), Decimal('160.00'))])
+
+    def test_checkout_revalidates_cart_prices(self):
+        self.client.post(reverse('products:add_to_cart', args=[self.b1.id]), {'quantity': 2})
+        apply_repricing({'brand': 'Bridgestone'}, 'amount', Decimal('10'))
+
+        resp = self.client.post(reverse('products:checkout'), {'customer_id': 'anonymous', 'payment_type': 'FULL'})
+        self.assertRedirects(resp, reverse('products:checkout'), fetch_redirect_response=False)
+        resp = self.client.get(reverse('products:checkout'))
+        self.assertContains(resp, 'The price of B 195 changed from Rs 150.00 to Rs 160.00.')
+        self.assertEqual(resp.context['total'], Decimal('320.00'))
+
+        resp = self.client.post(reverse('products:checkout'), {'customer_id': 'anonymous', 'payment_type': 'FULL'})
+        self.assertEqual(self.user.created_sales.get().total_amount, Decimal('320.00'))
+
+
+class BranchStockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.customer = Customer.objects.create(name='Ali')
+        self.main = default_branch()
+        self.north = Branch.objects.create(name='North')
+        self.tyre = Product.objects.create(name='Tyre', price=Decimal('100.00'), stock_quantity=20)
+        set_branch_stock(self.tyre, self.north, 3)
+
+    def _sell(self, qty, branch):
+        cart = {str(self.tyre.id): {'product_id': self.tyre.id, 'name': 'Tyre', 'price': '100.00',
+                                    'quantity': qty, 'subtotal': str(100 * qty)}}
+        return create_sale_from_cart(self.user, self.customer.id, cart, payment_type='FULL', branch=branch)
+
+    def test_sales_take_stock_from_their_branch(self):
+        self.assertEqual(self.tyre.stock_quantity, 23)
+        with self.assertRaisesMessage(ValueError, 'Insufficient stock for Tyre at North'):
+            self._sell(4, self.north)
+        sale = self._sell(2, self.north)
+        self.assertEqual(sale.branch, self.north)
+        self.assertEqual(dict(StockLevel.objects.values_list('branch__name', 'quantity')), {'Main': 20, 'North': 1})
+        self.assertEqual(Product.objects.get(pk=self.tyre.pk).stock_quantity, 21)
+        self.assertTrue(ChangeLog.objects.filter(model='product', object_id=self.tyre.pk).exists())
+
+    def test_pages_are_scoped_to_the_chosen_branch(self):
+        Product.objects.create(name='Valve', price=Decimal('5.00'), stock_quantity=50)
+        self._sell(1, self.main)
+        resp = self.client.post(reverse('products:switch_branch'), {'branch': self.north.pk, 'next': '/dashboard/'})
+        self.assertRedirects(resp, '/dashboard/', fetch_redirect_response=False)
+
+        resp = self.client.get(reverse('products:product_list'), {'sort': 'name'})
+        self.assertEqual([(p.name, p.branch_stock) for p in resp.context['page_obj']], [('Tyre', 3), ('Valve', 0)])
+        resp = self.client.get(reverse('products:low_stock'))
+        self.assertEqual({p.name for p in resp.context['page_obj']}, {'Tyre', 'Valve'})
+        resp = self.client.get(reverse('dashboard:dashboard_view'))
+        self.assertEqual((resp.context['low_stock_products'], resp.context['sales_today']), (2, 0))
+
+        self.client.post(reverse('products:product_update', args=[self.tyre.pk]), {'name': 'Tyre', 'stock_quantity': '12'})
+        self.assertEqual(StockLevel.objects.get(branch=self.north, product=self.tyre).quantity, 12)
+        self.assertEqual(Product.objects.get(pk=self.tyre.pk).stock_quantity, 31)
+        resp = self.client.get(reverse('dashboard:dashboard_view'))
+        self.assertEqual(resp.context['low_stock_products'], 1)
+
+    def test_duplicate_barcode_keeps_the_branch_stock_on_the_form(self):
+        Product.objects.create(name='Valve', barcode='V-1', price=Decimal('5.00'), stock_quantity=50)
+        resp = self.client.post(reverse('products:product_update', args=[self.tyre.pk]),
+                                {'name': 'Tyre', 'barcode': 'V-1', 'stock_quantity': '20'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['branch_stock'], 20)
+        self.assertContains(resp, 'name="stock_quantity" min="0" value="20"')
+        self.assertEqual(StockLevel.objects.get(branch=self.main, product=self.tyre).quantity, 20)
@@ -0,0 +1,149 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.changelog import record_change
+from .models import Branch, Product, StockLevel
+
+
+LOW_STOCK_QUANTITY = 10
+# Name of the branch a fresh install starts with
+MAIN_BRANCH = 'Main'
+
+
+def normalize_code(code):
+    return (code or '').strip()
+
+
+def product_for_code(code):
+    """Resolve a scanned barcode/SKU to a Product, or None.
+
+    Exact code match only, never a text search: one lookup on the unique barcode index.
+    """
+    code = normalize_code(code)
+    if not code:
+        return None
+    return Product.objects.filter(barcode=code).first()
+
+
+def default_branch():
+    """The oldest branch, which sales and stock fall back to; created on first use if none exists."""
+    branch = Branch.objects.order_by('pk').first()
+    if branch is None:
+        branch, _ = Branch.objects.get_or_create(name=MAIN_BRANCH)
+    return branch
+
+
+def active_branches(request):
+    """Active branches by name, loaded once per request."""
+    if not hasattr(request, '_branches'):
+        request._branches = list(Branch.objects.filter(is_active=True))
+    return request._branches
+
+
+def current_branch(request):
+    """The branch this session sells from (picked in the header), else the oldest active one."""
+    branches = active_branches(request)
+    branch_id = request.session.get('branch_id')
+    for branch in branches:
+        if branch.pk == branch_id:
+            return branch
+    return min(branches, key=lambda branch: branch.pk) if branches else default_branch()
+
+
+def with_branch_stock(products, branch):
+    """Annotate ``branch_stock``: units on hand at ``branch``, by one (branch, product) index probe per row."""
+    level = StockLevel.objects.filter(branch=branch, product=OuterRef('pk')).values('quantity')
+    return products.annotate(branch_stock=Coalesce(Subquery(level), 0))
+
+
+def well_stocked(branch):
+    """Ids of products with more than LOW_STOCK_QUANTITY at ``branch``, read from its (branch, quantity) index."""
+    return StockLevel.objects.filter(branch=branch, quantity__gt=LOW_STOCK_QUANTITY).values('product_id')
+
+
+def low_stock_count(branch):
+    """Products at or below LOW_STOCK_QUANTITY at ``branch``, counting those it has never stocked."""
+    return Product.objects.count() - well_stocked(branch).count()
+
+
+def set_branch_stock(product, branch, quantity):
+    """Set ``product``'s units at ``branch`` and move its shop-wide total by the difference."""
+    with transaction.atomic():
+        level, _ = StockLevel.objects.select_for_update().get_or_create(branch=branch, product=product)
+        delta = quantity - level.quantity
+        if not delta:
+            return
+        level.quantity = quantity
+        level.save(update_fields=['quantity'])
+        Product.objects.filter(pk=product.pk).update(stock_quantity=F('stock_quantity') + delta)
+        record_change('product', product.pk)
+    product.stock_quantity += delta
+
+
+def get_cart(request):
+    cart = request.session.get('cart', {})
+    request.session.setdefault('cart', cart)
+    return cart
+
+
+def save_cart(request, cart):
+    request.session['cart'] = cart
+    request.session.modified = True
+
+
+def add_product_to_cart(cart, product, qty):
+    """Add ``qty`` of ``product`` to a session cart dict and return the cart line."""
+    key = str(product.id)
+    if key in cart:
+        cart[key]['quantity'] += qty
+    else:
+        cart[key] = {
+            'product_id': product.id,
+            'name': product.name,
+            'price': str(product.price),
+            'quantity': qty,
+            'subtotal': str((Decimal(str(product.price)) * qty).quantize(Decimal('0.01'))),
+        }
+    # Recompute subtotal (store as string for JSON-serializable session)
+    cart[key]['subtotal'] = str((Decimal(cart[key]['price']) * int(cart[key]['quantity'])).quantize(Decimal('0.01')))
+    return cart[key]
+
+
+def set_cart_quantity(cart, key, qty):
+    """Set a cart line's quantity; zero or less removes the line."""
+    if key not in cart:
+        return
+    if qty <= 0:
+        del cart[key]
+        return
+    item = cart[key]
+    item['quantity'] = qty
+    item['subtotal'] = str((Decimal(item['price']) * qty).quantize(Decimal('0.01')))
+
+
+def cart_total(cart):
+    return sum((Decimal(item['subtotal']) for item in cart.values()), Decimal('0'))
+
+
+def revalidate_cart_prices(cart):
+    """Bring cart lines up to current catalog prices with one query.
+
+    Prices are copied into the cart when a product is added, so a repricing since then would
+    otherwise be charged at the old price. Returns ``[(name, old_price, new_price)]`` for the
+    lines that changed; lines whose product no longer exists are left for checkout to reject.
+    """
+    prices = dict(Product.objects.filter(pk__in=[int(item['product_id']) for item in cart.values()])
+                  .values_list('pk', 'price'))
+    changes = []
+    for item in cart.values():
+        price = prices.get(int(item['product_id']))
+        old_price = Decimal(str(item['price']))
+        if price is None or price == old_price:
+            continue
+        changes.append((item['name'], old_price, price))
+        item['price'] = str(price)
+        item['subtotal'] = str((price * int(item['quantity'])).quantize(Decimal('0.01')))
+    return changes
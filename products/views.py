@@ -1,32 +1,49 @@
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import F, Q
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 
-from .models import Product
-from customers.models import Customer
-from sales.utils import create_sale_from_cart
+from core.audit import log_event
+from core.metrics import instrument
 
+from .models import Branch, PriceChange, Product, StockLevel
+from .pricing import REPRICE_FILTERS, REPRICE_MODES, apply_repricing, describe_repricing, preview_repricing
+from .utils import add_product_to_cart, cart_total, get_cart, revalidate_cart_prices, save_cart, set_cart_quantity
+from .utils import normalize_code, product_for_code
+from .utils import current_branch, set_branch_stock, well_stocked, with_branch_stock
+from customers.utils import anonymous_customer_id
+from sales.forecast import branch_rates
+from sales.utils import create_sale_from_cart
 
-def _get_cart(request):
-    cart = request.session.get('cart', {})
-    request.session.setdefault('cart', cart)
-    return cart
 
+# Days until stockout reads the stored ProductVelocity row (sales.forecast); products that
+# have not sold in 90 days have no forecast and go last.
+STOCKOUT_ORDER = (F('velocity__days_of_cover').asc(nulls_last=True), 'branch_stock')
 
-def _save_cart(request, cart):
-    request.session['cart'] = cart
-    request.session.modified = True
+PRODUCT_SORTS = {
+    'newest': ('-created_at',),
+    'stockout': STOCKOUT_ORDER,
+    'name': ('name',),
+}
 
 
+@instrument
 @login_required
 def product_list_view(request):
-    products_qs = Product.objects.order_by('-created_at')
+    sort = request.GET.get('sort', 'newest')
+    if sort not in PRODUCT_SORTS:
+        sort = 'newest'
+    branch = current_branch(request)
+    products_qs = with_branch_stock(Product.objects.select_related('velocity'), branch).order_by(*PRODUCT_SORTS[sort])
     q = request.GET.get('q', '').strip()
     if q:
         # Basic icontains across name, brand, type, size
-        from django.db.models import Q
         products_qs = products_qs.filter(
             Q(name__icontains=q) |
             Q(brand__icontains=q) |
@@ -35,9 +52,31 @@ def product_list_view(request):
         )
     paginator = Paginator(products_qs, 10)
     page_obj = paginator.get_page(request.GET.get('page'))
-    return render(request, 'products/product_list.html', {'page_obj': page_obj, 'q': q})
+    return render(request, 'products/product_list.html', {'page_obj': page_obj, 'q': q, 'sort': sort})
 
 
+@instrument
+@login_required
+def low_stock_view(request):
+    try:
+        days = max(int(request.GET.get('days', 30)), 1)
+    except ValueError:
+        days = 30
+    branch = current_branch(request)
+    products_qs = with_branch_stock(Product.objects.select_related('velocity'), branch).filter(
+        ~Q(pk__in=well_stocked(branch)) | Q(velocity__days_of_cover__lte=days)
+    ).order_by(*STOCKOUT_ORDER)
+    paginator = Paginator(products_qs, 25)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    rates = branch_rates([product.pk for product in page_obj.object_list], branch)
+    for product in page_obj.object_list:
+        rate = rates.get(product.pk)
+        # Units to order so this branch's stock lasts ``days`` at this branch's rate.
+        product.reorder_quantity = max(int(rate * days + Decimal('0.999')) - product.branch_stock, 0) if rate else 0
+    return render(request, 'products/low_stock.html', {'page_obj': page_obj, 'days': days})
+
+
+@instrument
 @login_required
 def product_create_view(request):
     if request.method == 'POST':
@@ -48,55 +87,130 @@ def product_create_view(request):
         size = request.POST.get('size')
         type_ = request.POST.get('type')
         description = request.POST.get('description', '')
+        barcode = normalize_code(request.POST.get('barcode'))
         if not name or not price:
             messages.error(request, 'Name and price are required.')
+        elif barcode and Product.objects.filter(barcode=barcode).exists():
+            messages.error(request, f'Barcode "{barcode}" is already assigned to another product.')
         else:
-            product = Product.objects.create(
-                name=name,
-                price=Decimal(price),
-                stock_quantity=int(stock_quantity or 0),
-                brand=brand or None,
-                size=size or None,
-                type=type_ or None,
-                description=description,
-            )
+            with transaction.atomic():
+                product = Product.objects.create(
+                    name=name,
+                    barcode=barcode or None,
+                    price=Decimal(price),
+                    brand=brand or None,
+                    size=size or None,
+                    type=type_ or None,
+                    description=description,
+                )
+                set_branch_stock(product, current_branch(request), int(stock_quantity or 0))
+            log_event(request.user, 'create', 'product', product.pk, product.name)
             messages.success(request, f'Product "{product.name}" created.')
             return redirect('products:product_list')
     return render(request, 'products/product_form.html')
 
 
+def _product_form_context(product, branch):
+    return {
+        'product': product,
+        'branch_stock': StockLevel.objects.filter(branch=branch, product=product).values_list('quantity', flat=True).first() or 0,
+        'price_changes': product.price_changes.select_related('changed_by').order_by('-changed_at')[:10],
+    }
+
+
+@instrument
 @login_required
 def product_update_view(request, pk):
     product = get_object_or_404(Product, pk=pk)
+    branch = current_branch(request)
     if request.method == 'POST':
         product.name = request.POST.get('name') or product.name
+        old_price = product.price
         price = request.POST.get('price')
         if price:
             product.price = Decimal(price)
-        stock_quantity = request.POST.get('stock_quantity')
-        if stock_quantity is not None and stock_quantity != '':
-            product.stock_quantity = int(stock_quantity)
         product.brand = request.POST.get('brand') or None
         product.size = request.POST.get('size') or None
         product.type = request.POST.get('type') or None
         product.description = request.POST.get('description', '')
-        product.save()
+        product.barcode = normalize_code(request.POST.get('barcode')) or None
+        if product.barcode and Product.objects.filter(barcode=product.barcode).exclude(pk=product.pk).exists():
+            messages.error(request, f'Barcode "{product.barcode}" is already assigned to another product.')
+            return render(request, 'products/product_form.html', _product_form_context(product, branch))
+        stock_quantity = request.POST.get('stock_quantity')
+        with transaction.atomic():
+            # The shop-wide total moves only through set_branch_stock()
+            product.save(update_fields=['name', 'price', 'brand', 'size', 'type', 'description', 'barcode'])
+            if stock_quantity is not None and stock_quantity != '':
+                set_branch_stock(product, branch, int(stock_quantity))
+            if product.price != old_price:
+                PriceChange.objects.create(product=product, old_price=old_price, new_price=product.price,
+                                           changed_by=request.user)
+        log_event(request.user, 'update', 'product', product.pk,
+                  product.name if product.price == old_price else f'{product.name}: price {old_price} -> {product.price:.2f}')
         messages.success(request, f'Product "{product.name}" updated.')
         return redirect('products:product_list')
-    return render(request, 'products/product_form.html', {'product': product})
+    return render(request, 'products/product_form.html', _product_form_context(product, branch))
+
+
+def _reprice_params(data):
+    filters = {key: data.get(key, '').strip() for key in REPRICE_FILTERS}
+    mode = data.get('mode') if data.get('mode') in REPRICE_MODES else 'percent'
+    try:
+        amount = Decimal(data.get('amount', ''))
+    except InvalidOperation:
+        amount = None
+    if amount is not None and not amount.is_finite():
+        amount = None
+    return filters, mode, amount
+
+
+@instrument
+@login_required
+def reprice_view(request):
+    """Preview (GET) and apply (POST) a percentage or absolute price change to a brand/type/size."""
+    data = request.POST if request.method == 'POST' else request.GET
+    filters, mode, amount = _reprice_params(data)
+    context = {
+        'filters': filters,
+        'mode': mode,
+        'modes': REPRICE_MODES,
+        'amount': data.get('amount', ''),
+        # (field, distinct values, selected value) for each filter dropdown
+        'choices': [(key, Product.objects.exclude(**{f'{key}__isnull': True}).exclude(**{key: ''})
+                     .order_by(key).values_list(key, flat=True).distinct(), filters[key]) for key in REPRICE_FILTERS],
+    }
+    if amount is None:
+        if data.get('amount'):
+            messages.error(request, 'Enter a valid amount.')
+        return render(request, 'products/reprice.html', context)
+
+    try:
+        if request.method == 'POST':
+            count = apply_repricing(filters, mode, amount, user=request.user)
+            log_event(request.user, 'update', 'product', summary=f'Repriced {count}: {describe_repricing(filters, mode, amount)}')
+            messages.success(request, f'Repriced {count} product{"" if count == 1 else "s"}.')
+            return redirect('products:reprice')
+        context['count'], context['preview'] = preview_repricing(filters, mode, amount)
+    except ValueError as exc:
+        messages.error(request, str(exc))
+    return render(request, 'products/reprice.html', context)
 
 
+@instrument
 @login_required
 def product_delete_view(request, pk):
     product = get_object_or_404(Product, pk=pk)
     if request.method == 'POST':
         name = product.name
         product.delete()
+        log_event(request.user, 'delete', 'product', pk, name)
         messages.success(request, f'Product "{name}" deleted.')
         return redirect('products:product_list')
     return render(request, 'products/product_confirm_delete.html', {'product': product})
 
 
+@instrument
 @login_required
 def add_to_cart_view(request, product_id):
     product = get_object_or_404(Product, pk=product_id)
@@ -108,42 +222,65 @@ def add_to_cart_view(request, product_id):
         messages.error(request, 'Quantity must be positive.')
         return redirect('products:product_list')
 
-    cart = _get_cart(request)
-    key = str(product.id)
-    if key in cart:
-        cart[key]['quantity'] += qty
-    else:
-        cart[key] = {
-            'product_id': product.id,
-            'name': product.name,
-            'price': str(product.price),
-            'quantity': qty,
-            'subtotal': str((Decimal(str(product.price)) * qty).quantize(Decimal('0.01'))),
-        }
-    # Recompute subtotal (store as string for JSON-serializable session)
-    cart[key]['subtotal'] = str((Decimal(cart[key]['price']) * int(cart[key]['quantity'])).quantize(Decimal('0.01')))
-    _save_cart(request, cart)
+    cart = get_cart(request)
+    add_product_to_cart(cart, product, qty)
+    save_cart(request, cart)
+    messages.success(request, f'Added {qty} x {product.name} to cart.')
+    return redirect('products:cart_view')
+
+
+@instrument
+@login_required
+@require_POST
+def scan_to_cart_view(request):
+    """Resolve a scanned barcode/SKU and add it to the cart in one request.
+
+    Answers JSON when called from the scanner script (Accept: application/json),
+    otherwise redirects back to the cart like add_to_cart_view.
+    """
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+    code = request.POST.get('code', '')
+    try:
+        qty = int(request.POST.get('quantity', '1'))
+    except ValueError:
+        qty = 0
+    product = product_for_code(code) if qty > 0 else None
+
+    if product is None:
+        error = 'Quantity must be positive.' if qty <= 0 else f'No product with code "{code.strip()}".'
+        if wants_json:
+            return JsonResponse({'ok': False, 'error': error}, status=400 if qty <= 0 else 404)
+        messages.error(request, error)
+        return redirect('products:cart_view')
+
+    cart = get_cart(request)
+    item = add_product_to_cart(cart, product, qty)
+    save_cart(request, cart)
+    if wants_json:
+        return JsonResponse({'ok': True, 'item': item, 'cart_total': str(cart_total(cart)), 'cart_count': len(cart)})
     messages.success(request, f'Added {qty} x {product.name} to cart.')
     return redirect('products:cart_view')
 
 
+@instrument
 @login_required
 def remove_from_cart_view(request, product_id):
-    cart = _get_cart(request)
+    cart = get_cart(request)
     key = str(product_id)
     if key in cart:
         del cart[key]
-        _save_cart(request, cart)
+        save_cart(request, cart)
         messages.success(request, 'Item removed from cart.')
     else:
         messages.error(request, 'Item not in cart.')
     return redirect('products:cart_view')
 
 
+@instrument
 @login_required
 def update_cart_view(request):
     if request.method == 'POST':
-        cart = _get_cart(request)
+        cart = get_cart(request)
         for key, item in list(cart.items()):
             qty_str = request.POST.get(f'qty_{key}', None)
             if qty_str is None:
@@ -152,31 +289,36 @@ def update_cart_view(request):
                 qty = int(qty_str)
             except ValueError:
                 qty = item['quantity']
-            if qty <= 0:
-                del cart[key]
-            else:
-                item['quantity'] = qty
-                item['subtotal'] = str((Decimal(item['price']) * qty).quantize(Decimal('0.01')))
-        _save_cart(request, cart)
+            set_cart_quantity(cart, key, qty)
+        save_cart(request, cart)
         messages.success(request, 'Cart updated.')
     return redirect('products:cart_view')
 
 
+@instrument
 @login_required
 def cart_view(request):
-    cart = _get_cart(request)
-    total = sum(Decimal(item['subtotal']) for item in cart.values()) if cart else Decimal('0')
+    cart = get_cart(request)
+    total = cart_total(cart)
     return render(request, 'products/cart.html', {'cart': cart, 'total': total})
 
 
+@instrument
 @login_required
 def checkout_view(request):
-    cart = _get_cart(request)
+    cart = get_cart(request)
     if not cart:
         messages.error(request, 'Your cart is empty.')
         return redirect('products:cart_view')
 
-    customers = Customer.objects.all().order_by('name')
+    price_changes = revalidate_cart_prices(cart)
+    if price_changes:
+        save_cart(request, cart)
+        for name, old_price, new_price in price_changes:
+            messages.warning(request, f'The price of {name} changed from Rs {old_price} to Rs {new_price}.')
+        if request.method == 'POST':
+            # Never charge a total the cashier has not seen
+            return redirect('products:checkout')
 
     if request.method == 'POST':
         customer_id = request.POST.get('customer_id')
@@ -184,8 +326,7 @@ def checkout_view(request):
 
         # Allow Anonymous option
         if customer_id == 'anonymous' or not customer_id:
-            customer, _ = Customer.objects.get_or_create(name='Anonymous')
-            customer_id = customer.id
+            customer_id = anonymous_customer_id()
 
         installment_data = None
         if payment_type == 'INSTALLMENT':
@@ -203,6 +344,7 @@ def checkout_view(request):
                 cart=cart,
                 payment_type=payment_type,
                 installment_data=installment_data,
+                branch=current_branch(request),
             )
         except ValueError as e:
             messages.error(request, str(e))
@@ -211,6 +353,7 @@ def checkout_view(request):
         # Clear cart
         request.session['cart'] = {}
         request.session.modified = True
+        log_event(request.user, 'create', 'sale', sale.id, f'{sale.get_payment_type_display()} sale of Rs {sale.total_amount}')
         messages.success(request, f'Sale #{sale.id} created successfully.')
         return redirect('sales:receipt', sale_id=sale.id)
 
@@ -218,5 +361,18 @@ def checkout_view(request):
     return render(request, 'products/checkout.html', {
         'cart': cart,
         'total': total,
-        'customers': customers,
     })
+
+
+@instrument
+@login_required
+@require_POST
+def switch_branch_view(request):
+    """Sell from another branch for the rest of this session."""
+    branch = get_object_or_404(Branch, pk=request.POST.get('branch'), is_active=True)
+    request.session['branch_id'] = branch.pk
+    messages.success(request, f'Now selling from {branch.name}.')
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('products:product_list')
@@ -0,0 +1,121 @@
+from itertools import chain
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.http import Http404
+
+from .models import InstallmentPayment, InstallmentPlan, Sale, SaleItem
+from .routers import ARCHIVE_DB
+
+
+_archive_ready = False
+
+
+def archive_enabled():
+    """True once the archive database exists and has been migrated (`migrate --database archive`)."""
+    global _archive_ready
+    if not _archive_ready and ARCHIVE_DB in settings.DATABASES:
+        _archive_ready = Sale._meta.db_table in connections[ARCHIVE_DB].introspection.table_names()
+    return _archive_ready
+
+
+def sales_databases():
+    """Aliases holding sales rows, live first."""
+    return [DEFAULT_DB_ALIAS, ARCHIVE_DB] if archive_enabled() else [DEFAULT_DB_ALIAS]
+
+
+def archivable_sales(before):
+    """Fully paid sales dated before ``before``: full payments and settled installment plans."""
+    return Sale.objects.filter(date__lt=before).filter(
+        Q(payment_type='FULL') | Q(payment_type='INSTALLMENT', installment_plan__status='PAID')
+    )
+
+
+def _copy(rows):
+    # raw=True writes the stored values as-is (like loaddata), so auto_now_add dates and
+    # primary keys survive the move.
+    for row in rows:
+        row.save_base(raw=True, force_insert=True, using=ARCHIVE_DB)
+
+
+def archive_sales(before, chunk_size=200):
+    """Move archivable sales with their items, plans and payments to the archive database.
+
+    Each chunk is copied and deleted inside one transaction per database; the archive
+    commits first, so an interrupted run leaves rows in both places (reads prefer 'default')
+    and the next run deletes them without copying twice. Returns the number of sales moved.
+    """
+    moved = 0
+    last_id = 0
+    while True:
+        ids = list(
+            archivable_sales(before).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return moved
+        last_id = ids[-1]
+        with transaction.atomic(using=DEFAULT_DB_ALIAS), transaction.atomic(using=ARCHIVE_DB):
+            copied = set(Sale.objects.using(ARCHIVE_DB).filter(id__in=ids).values_list('id', flat=True))
+            pending = [sale_id for sale_id in ids if sale_id not in copied]
+            _copy(Sale.objects.filter(id__in=pending).order_by('id'))
+            _copy(SaleItem.objects.filter(sale_id__in=pending).order_by('id'))
+            _copy(InstallmentPlan.objects.filter(sale_id__in=pending).order_by('id'))
+            _copy(InstallmentPayment.objects.filter(plan__sale_id__in=pending).order_by('id'))
+            Sale.objects.filter(id__in=ids).delete()
+        moved += len(ids)
+
+
+def from_archive(queryset, *prefetch):
+    """``queryset`` pointed at the archive, or an empty queryset when there is no archive.
+
+    Joins to customers/products/users cannot cross databases, so select_related is dropped;
+    pass those relations in ``prefetch`` instead.
+    """
+    if not archive_enabled():
+        return queryset.none()
+    return queryset.using(ARCHIVE_DB).select_related(None).prefetch_related(*prefetch)
+
+
+def with_archive(queryset, *prefetch):
+    """Live rows of ``queryset`` followed by archived ones."""
+    return chain(queryset, from_archive(queryset, *prefetch))
+
+
+def get_sale_or_404(queryset, **lookup):
+    """get_object_or_404 for sales that falls back to the archive for moved ids."""
+    try:
+        return queryset.get(**lookup)
+    except Sale.DoesNotExist:
+        if not archive_enabled():
+            raise Http404('No Sale matches the given query.')
+    try:
+        return from_archive(queryset, 'customer').get(**lookup)
+    except Sale.DoesNotExist:
+        raise Http404('No Sale matches the given query.')
+
+
+def archived_customer_totals():
+    """Per-customer contribution of archived sales to the fields in customers.utils.STAT_FIELDS."""
+    if not archive_enabled():
+        return {}
+    totals = {}
+    sales = Sale.objects.using(ARCHIVE_DB).values('customer_id').annotate(
+        lifetime_value=Sum('total_amount'),
+        sale_count=Count('id'),
+        last_purchase_at=Max('date'),
+        owed=Sum('total_amount', filter=Q(payment_type='INSTALLMENT')),
+    ).order_by()
+    for row in sales:
+        totals[row['customer_id']] = {
+            'balance': row['owed'] or 0,
+            'lifetime_value': row['lifetime_value'],
+            'sale_count': row['sale_count'],
+            'last_purchase_at': row['last_purchase_at'],
+        }
+    payments = InstallmentPayment.objects.using(ARCHIVE_DB).values('plan__sale__customer_id').annotate(
+        paid=Sum('amount_paid'),
+    ).order_by()
+    for row in payments:
+        totals[row['plan__sale__customer_id']]['balance'] -= row['paid']
+    return totals
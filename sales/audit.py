@@ -0,0 +1,153 @@
+import csv
+import os
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+
+import django
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import DecimalField, F, Max, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+from products.models import Product, StockLevel
+from .archive import sales_databases
+from .models import DailyProductSales, InstallmentPlan, Sale, SaleItem
+
+Mismatch = namedtuple('Mismatch', 'check database object_id expected actual')
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Value(Decimal('0'), output_field=MONEY)
+CENT = Decimal('0.01')
+
+
+def _cents(expression):
+    # SQLite sums decimals as floats (0.1 + 0.2 != 0.3); compare both sides rounded to cents
+    return Round(expression, 2, output_field=MONEY)
+
+
+def check_sale_totals(alias, lo, hi, chunk_size):
+    """Sale.total_amount equals the sum of its items' subtotals."""
+    sales = (Sale.objects.using(alias).filter(pk__range=(lo, hi))
+             .annotate(items_total=_cents(Coalesce(Sum('items__subtotal'), ZERO)))
+             .exclude(items_total=_cents(F('total_amount')))
+             .values_list('pk', 'items_total', 'total_amount').order_by())
+    for pk, items_total, total in sales.iterator(chunk_size=chunk_size):
+        yield Mismatch('sale_total', alias, pk, items_total.quantize(CENT), total)
+
+
+def check_installment_plans(alias, lo, hi, chunk_size):
+    """A PENDING plan is not yet fully paid (let alone overpaid); a PAID plan is."""
+    plans = (InstallmentPlan.objects.using(alias).filter(sale_id__gte=lo, sale_id__lte=hi)
+             .annotate(paid=_cents(Coalesce(Sum('payments__amount_paid'), ZERO)), total=_cents(F('sale__total_amount')))
+             .filter(Q(status='PENDING', paid__gte=F('total')) | Q(status='PAID', paid__lt=F('total')))
+             .values_list('pk', 'status', 'paid', 'total').order_by())
+    for pk, status, paid, total in plans.iterator(chunk_size=chunk_size):
+        if status == 'PENDING' and paid > total:
+            yield Mismatch('installment_overpaid', alias, pk, f'paid <= {total}', paid)
+        else:
+            yield Mismatch('plan_status', alias, pk, 'PENDING' if status == 'PAID' else 'PAID', status)
+
+
+def check_stock(alias, lo, hi, chunk_size):
+    """The daily rollup matches the sale lines that moved stock, archived ones included.
+
+    Sale lines are the only stock movements recorded; non-negative stock is a CHECK constraint.
+    """
+    moved = defaultdict(lambda: [0, Decimal('0')])
+    for db in sales_databases():
+        rows = (SaleItem.objects.using(db).filter(product_id__gte=lo, product_id__lte=hi).values('product_id')
+                .annotate(q=Sum('quantity'), r=Sum('subtotal')).order_by())
+        for row in rows.iterator(chunk_size=chunk_size):
+            moved[row['product_id']][0] += row['q']
+            moved[row['product_id']][1] += row['r']
+    rolled = (DailyProductSales.objects.filter(product_id__gte=lo, product_id__lte=hi).values('product_id')
+              .annotate(q=Sum('quantity'), r=Sum('revenue')).order_by())
+    for row in rolled.iterator(chunk_size=chunk_size):
+        quantity, revenue = moved.pop(row['product_id'], (0, Decimal('0')))
+        if (row['q'], row['r']) != (quantity, revenue):
+            yield Mismatch('rollup', alias, row['product_id'], f'{quantity} / {revenue.quantize(CENT)}',
+                           f"{row['q']} / {row['r'].quantize(CENT)}")
+    for product_id, (quantity, revenue) in moved.items():
+        yield Mismatch('rollup', alias, product_id, f'{quantity} / {revenue.quantize(CENT)}', 'no rollup rows')
+
+
+def check_stock_totals(alias, lo, hi, chunk_size):
+    """Product.stock_quantity is the sum of its StockLevel rows (products.utils.set_branch_stock)."""
+    levels = (StockLevel.objects.using(alias).filter(product=OuterRef('pk')).values('product')
+              .annotate(total=Sum('quantity')).values('total'))
+    products = (Product.objects.using(alias).filter(pk__range=(lo, hi))
+                .annotate(branch_total=Coalesce(Subquery(levels), 0))
+                .exclude(stock_quantity=F('branch_total'))
+                .values_list('pk', 'branch_total', 'stock_quantity').order_by())
+    for pk, branch_total, stock_quantity in products.iterator(chunk_size=chunk_size):
+        yield Mismatch('stock_total', alias, pk, branch_total, stock_quantity)
+
+
+# name -> (function, model whose ids are split into ranges, per sales database?)
+CHECKS = {
+    'sale_total': (check_sale_totals, Sale, True),
+    'installments': (check_installment_plans, Sale, True),
+    'stock': (check_stock, Product, False),
+    'stock_total': (check_stock_totals, Product, False),
+}
+
+
+def id_ranges(model, alias, range_size):
+    bounds = model.objects.using(alias).aggregate(lo=Min('pk'), hi=Max('pk'))
+    if bounds['lo'] is None:
+        return []
+    return [(lo, min(lo + range_size - 1, bounds['hi'])) for lo in range(bounds['lo'], bounds['hi'] + 1, range_size)]
+
+
+def plan_audit(checks=None, range_size=50000):
+    """Tasks ``(check, alias, lo, hi)`` covering every id of every check."""
+    tasks = []
+    for name in checks or CHECKS:
+        _, model, per_database = CHECKS[name]
+        for alias in (sales_databases() if per_database else [DEFAULT_DB_ALIAS]):
+            tasks.extend((name, alias, lo, hi) for lo, hi in id_ranges(model, alias, range_size))
+    return tasks
+
+
+def run_task(name, alias, lo, hi, chunk_size=2000):
+    try:
+        return list(CHECKS[name][0](alias, lo, hi, chunk_size))
+    finally:
+        connections.close_all()
+
+
+def _init_worker():
+    # Spawned workers start without Django; forked ones must not reuse the parent's SQLite handles.
+    django.setup()
+    connections.close_all()
+
+
+def run_audit(output, checks=None, workers=1, range_size=50000, chunk_size=2000, progress=None):
+    """Run the checks over id ranges, in a process pool when ``workers`` > 1.
+
+    Mismatches are written to the CSV file ``output`` as they arrive. Returns a Counter of
+    mismatches per check.
+    """
+    tasks = plan_audit(checks, range_size)
+    found = Counter()
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        writer.writerow(Mismatch._fields)
+
+        def record(rows, done):
+            writer.writerows(rows)
+            found.update(row.check for row in rows)
+            if progress:
+                progress(done, len(tasks))
+
+        if workers <= 1:
+            for done, task in enumerate(tasks, 1):
+                record(list(CHECKS[task[0]][0](*task[1:], chunk_size)), done)
+            return found
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(run_task, *task, chunk_size) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                record(future.result(), done)
+    return found
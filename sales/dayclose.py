@@ -0,0 +1,109 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DayClose, InstallmentPayment, Sale
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+CENT = Decimal('0.01')
+# Columns of each cashier row, in SELECT order after the cashier id
+TOTAL_COLUMNS = ('full_count', 'full_total', 'installment_count', 'installment_total', 'payment_count', 'payments_total')
+COUNT_COLUMNS = ('full_count', 'installment_count', 'payment_count')
+
+
+def _day_bounds(day):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+
+
+def _count_if(**condition):
+    return Case(When(then=Value(1), **condition), default=Value(0), output_field=IntegerField())
+
+
+def _sum_if(field, **condition):
+    return Case(When(then=F(field), **condition), default=Value(Decimal('0')), output_field=MONEY)
+
+
+def _columns(cashier, *values):
+    """``{c0: cashier, c1: ..., c6: ...}`` for ``.values()``, so both halves of the UNION line up."""
+    return {f'c{i}': expression for i, expression in enumerate((cashier, *values))}
+
+
+def cashier_totals(day, using=DEFAULT_DB_ALIAS):
+    """Per-cashier totals for ``day`` (a local date) in one grouped query.
+
+    Sales are split into full and installment sales by ``Sale.created_by``; installment
+    payments taken that day count for the cashier who received them (the sale's cashier for
+    payments recorded before that was tracked). Sales and payments are stacked with UNION ALL
+    and grouped once. Returns ``{cashier_id: {column: value}}``.
+    """
+    start, end = _day_bounds(day)
+    zero_count, zero_money = Value(0), Value(Decimal('0'), output_field=MONEY)
+    sales = Sale.objects.using(using).filter(date__gte=start, date__lt=end).values(**_columns(
+        F('created_by_id'),
+        _count_if(payment_type='FULL'), _sum_if('total_amount', payment_type='FULL'),
+        _count_if(payment_type='INSTALLMENT'), _sum_if('total_amount', payment_type='INSTALLMENT'),
+        zero_count, zero_money,
+    )).order_by()
+    payments = InstallmentPayment.objects.using(using).filter(payment_date=day).values(**_columns(
+        Coalesce('received_by_id', 'plan__sale__created_by_id'),
+        zero_count, zero_money, zero_count, zero_money,
+        Value(1), F('amount_paid'),
+    )).order_by()
+
+    sales_sql, sales_params = sales.query.sql_with_params()
+    payments_sql, payments_params = payments.query.sql_with_params()
+    sums = ', '.join(f'SUM(c{i})' for i in range(1, len(TOTAL_COLUMNS) + 1))
+    sql = f'SELECT c0, {sums} FROM ({sales_sql} UNION ALL {payments_sql}) AS movements GROUP BY c0 ORDER BY c0'
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, sales_params + payments_params)
+        rows = cursor.fetchall()
+
+    totals = {}
+    for cashier_id, *values in rows:
+        totals[cashier_id] = {
+            column: int(value) if column in COUNT_COLUMNS else Decimal(str(value)).quantize(CENT)
+            for column, value in zip(TOTAL_COLUMNS, values)
+        }
+    return totals
+
+
+def cashier_rows(day, using=DEFAULT_DB_ALIAS):
+    """cashier_totals() as a list of dicts with ``cashier_id`` and ``cashier`` (username), by name."""
+    totals = cashier_totals(day, using=using)
+    names = dict(get_user_model().objects.filter(pk__in=[pk for pk in totals if pk]).values_list('pk', 'username'))
+    rows = [{'cashier_id': pk, 'cashier': names.get(pk, '(deleted user)'), **row} for pk, row in totals.items()]
+    return sorted(rows, key=lambda row: row['cashier'])
+
+
+def close_day(day, user, using=DEFAULT_DB_ALIAS):
+    """Freeze ``day``'s per-cashier totals into a DayClose row and return it.
+
+    A day can be closed once, and only after it has ended: sales rung up after closing the
+    current day would be in no Z-report. Raises ValueError otherwise.
+    """
+    if day >= timezone.localdate():
+        raise ValueError(f'{day} is still open; it can be closed once it has ended.')
+    if DayClose.objects.filter(day=day).exists():
+        raise ValueError(f'{day} is already closed.')
+
+    cashiers = cashier_rows(day, using=using)
+    try:
+        with transaction.atomic():
+            return DayClose.objects.create(
+                day=day,
+                closed_by=user,
+                sale_count=sum(row['full_count'] + row['installment_count'] for row in cashiers),
+                full_total=sum((row['full_total'] for row in cashiers), Decimal('0')),
+                installment_total=sum((row['installment_total'] for row in cashiers), Decimal('0')),
+                payments_total=sum((row['payments_total'] for row in cashiers), Decimal('0')),
+                cashiers=cashiers,
+            )
+    except IntegrityError:
+        raise ValueError(f'{day} is already closed.')
@@ -0,0 +1,57 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Sale
+from .reports import parse_date, period_start
+
+# ?filter= windows: since local midnight, the local Monday or the 1st of the local month
+SALE_PERIODS = ('all', 'today', 'week', 'month')
+# Keys of a cleaned filter dict besides the period; ids are kept as strings so the dict can be
+# urlencoded for links and stored as a job's params unchanged
+SALE_FILTER_KEYS = ('start', 'end', 'payment_type', 'customer', 'cashier', 'branch')
+
+
+def clean_sale_filters(params):
+    """Sale list and export filters from a QueryDict (or job params), invalid values blanked."""
+    filters = {'filter': params.get('filter') or 'all'}
+    if filters['filter'] not in SALE_PERIODS:
+        filters['filter'] = 'all'
+    for key in SALE_FILTER_KEYS:
+        filters[key] = str(params.get(key) or '').strip()
+    for key in ('start', 'end'):
+        if not parse_date(filters[key]):
+            filters[key] = ''
+    if filters['payment_type'] not in dict(Sale.PAYMENT_TYPE_CHOICES):
+        filters['payment_type'] = ''
+    for key in ('customer', 'cashier', 'branch'):
+        if not filters[key].isdigit():
+            filters[key] = ''
+    return filters
+
+
+def filter_sales(qs, filters, now=None):
+    """Apply clean_sale_filters() output to a Sale queryset.
+
+    Each filter is an equality on one column plus a date range, so it is served by one of the
+    ``(column, -date)`` indexes on Sale; dates are local days, ``end`` inclusive.
+    """
+    tz = timezone.get_current_timezone()
+    # Periods are local calendar days, like ``start`` and ``end``
+    start = period_start(filters.get('filter'), timezone.localdate(now))
+    if start:
+        qs = qs.filter(date__gte=timezone.make_aware(datetime.combine(start, time.min), tz))
+    if filters.get('start'):
+        qs = qs.filter(date__gte=timezone.make_aware(datetime.combine(parse_date(filters['start']), time.min), tz))
+    if filters.get('end'):
+        end = parse_date(filters['end']) + timedelta(days=1)
+        qs = qs.filter(date__lt=timezone.make_aware(datetime.combine(end, time.min), tz))
+    if filters.get('payment_type'):
+        qs = qs.filter(payment_type=filters['payment_type'])
+    if filters.get('customer'):
+        qs = qs.filter(customer_id=filters['customer'])
+    if filters.get('cashier'):
+        qs = qs.filter(created_by_id=filters['cashier'])
+    if filters.get('branch'):
+        qs = qs.filter(branch_id=filters['branch'])
+    return qs
@@ -0,0 +1,120 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from core.models import ChangeLog
+from products.models import Product
+from .models import DailyProductSales, ProductVelocity, SaleItem, VelocityWatermark
+
+
+WINDOWS = (7, 30, 90)
+
+RATE = Decimal('0.001')
+COVER = Decimal('0.1')
+
+
+def _days_of_cover(stock, avg_30, avg_90):
+    # The 30-day rate reacts to the season, the 90-day rate keeps slow movers from
+    # dropping out of the forecast during a quiet month.
+    rate = avg_30 or avg_90
+    if not rate:
+        return None
+    return (Decimal(stock) / rate).quantize(COVER)
+
+
+def _recompute(product_ids, today):
+    """Velocity rows for ``product_ids`` as of ``today``, read from the daily rollup."""
+    sums = DailyProductSales.objects.filter(
+        product_id__in=product_ids, day__gt=today - timedelta(days=max(WINDOWS)), day__lte=today,
+    ).values('product_id').annotate(**{
+        f'q{w}': Sum('quantity', filter=Q(day__gt=today - timedelta(days=w))) for w in WINDOWS
+    }).order_by()
+    by_product = {row['product_id']: row for row in sums}
+
+    rows = []
+    for product_id, stock in Product.objects.filter(id__in=product_ids).values_list('id', 'stock_quantity'):
+        row = by_product.get(product_id, {})
+        avg = {w: (Decimal(row.get(f'q{w}') or 0) / w).quantize(RATE) for w in WINDOWS}
+        rows.append(ProductVelocity(
+            product_id=product_id,
+            avg_7=avg[7], avg_30=avg[30], avg_90=avg[90],
+            days_of_cover=Decimal('0') if stock <= 0 else _days_of_cover(stock, avg[30], avg[90]),
+            computed_on=today,
+        ))
+    return rows
+
+
+def _affected_products(mark, today, last_item_id, last_change_id):
+    """Products whose averages or stock may have changed since the previous run."""
+    affected = set(
+        SaleItem.objects.filter(id__gt=mark.last_sale_item_id, id__lte=last_item_id)
+        .values_list('product_id', flat=True).distinct()
+    )
+    affected.update(
+        ChangeLog.objects.filter(model='product', id__gt=mark.last_change_id, id__lte=last_change_id)
+        .values_list('object_id', flat=True).distinct()
+    )
+    if mark.last_run_on < today:
+        # Days that slid out of a window since the last run lower that window's average.
+        expired = Q()
+        for w in WINDOWS:
+            expired |= Q(day__gt=mark.last_run_on - timedelta(days=w), day__lte=today - timedelta(days=w))
+        affected.update(DailyProductSales.objects.filter(expired).values_list('product_id', flat=True).distinct())
+    return affected
+
+
+def update_sales_velocity(today=None, full=False, batch_size=500):
+    """Bring ProductVelocity up to date and return the number of products recomputed.
+
+    Only products with new SaleItem rows, change-log entries (restocks, edits) or sales
+    leaving a window since the stored watermark are recomputed. ``full=True``, a first run
+    or a gap longer than the widest window recomputes every product.
+    """
+    today = today or timezone.localdate()
+    last_item_id = SaleItem.objects.aggregate(m=Max('id'))['m'] or 0
+    last_change_id = ChangeLog.objects.aggregate(m=Max('id'))['m'] or 0
+
+    with transaction.atomic():
+        mark, _ = VelocityWatermark.objects.select_for_update().get_or_create(pk=1)
+        if full or mark.last_run_on is None or (today - mark.last_run_on).days > max(WINDOWS):
+            product_ids = list(Product.objects.values_list('id', flat=True))
+        else:
+            product_ids = sorted(_affected_products(mark, today, last_item_id, last_change_id))
+
+        for i in range(0, len(product_ids), batch_size):
+            ProductVelocity.objects.bulk_create(
+                _recompute(product_ids[i:i + batch_size], today),
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=['avg_7', 'avg_30', 'avg_90', 'days_of_cover', 'computed_on'],
+            )
+
+        mark.last_sale_item_id = last_item_id
+        mark.last_change_id = last_change_id
+        mark.last_run_on = today
+        mark.save()
+    return len(product_ids)
+
+
+def branch_rates(product_ids, branch, today=None):
+    """Units a day each of ``product_ids`` sells at ``branch``, by the same 30-then-90-day rule.
+
+    ProductVelocity is shop-wide; this reads the branch's own sale lines, so keep
+    ``product_ids`` to a page of products.
+    """
+    today = today or timezone.localdate()
+    tz = timezone.get_current_timezone()
+    start = {w: timezone.make_aware(datetime.combine(today - timedelta(days=w - 1), time.min), tz) for w in (30, 90)}
+    rows = SaleItem.objects.filter(
+        product_id__in=product_ids, sale__branch=branch, sale__date__gte=start[90],
+        sale__date__lt=timezone.make_aware(datetime.combine(today + timedelta(days=1), time.min), tz),
+    ).values('product_id').annotate(
+        q30=Sum('quantity', filter=Q(sale__date__gte=start[30])), q90=Sum('quantity'),
+    ).order_by()
+    return {
+        row['product_id']: (Decimal(row['q30'] or 0) / 30).quantize(RATE) or (Decimal(row['q90']) / 90).quantize(RATE)
+        for row in rows
+    }
@@ -0,0 +1,99 @@
+import csv
+import os
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from core.jobs import register_job
+from .archive import from_archive, with_archive
+from .filters import clean_sale_filters, filter_sales
+from .models import Sale
+from .payment_import import import_payments
+from .reports import parse_date, receivables_aging, write_aging_csv
+from .rollups import ANALYTICS_GROUPS, sales_analytics
+
+
+@register_job('sales_export', reads_from_reporting=True)
+def sales_export(params, out, progress):
+    qs = Sale.objects.select_related('customer', 'created_by').prefetch_related('items__product').order_by('-date')
+    qs = filter_sales(qs, clean_sale_filters(params))
+
+    total = qs.count() + from_archive(qs).count()
+
+    writer = csv.writer(out)
+    writer.writerow([
+        'Sale ID',
+        'Date',
+        'Time',
+        'Customer Name',
+        'Customer Phone',
+        'Customer Email',
+        'Payment Type',
+        'Total Amount (Rs)',
+        'Status',
+        'Processed By',
+        'Items Count',
+        'Items Details'
+    ])
+
+    # Sales moved to the archive database follow the live ones
+    for done, sale in enumerate(with_archive(qs, 'customer', 'created_by'), 1):
+        items_details = '; '.join([
+            f"{item.product.name} (Qty: {item.quantity}, Price: Rs {item.unit_price})"
+            for item in sale.items.all()
+        ])
+        writer.writerow([
+            sale.id,
+            sale.date.strftime('%Y-%m-%d'),
+            sale.date.strftime('%H:%M:%S'),
+            sale.customer.name,
+            sale.customer.phone or '',
+            sale.customer.email or '',
+            sale.get_payment_type_display(),
+            str(sale.total_amount),
+            'Completed' if sale.is_completed else 'Pending',
+            sale.created_by.username,
+            sale.items.count(),
+            items_details
+        ])
+        if done % 100 == 0:
+            progress(done, total)
+
+
+@register_job('aging_report', reads_from_reporting=True)
+def aging_report(params, out, progress):
+    rows = list(receivables_aging(
+        as_of=parse_date(params.get('as_of')) or timezone.localdate(),
+        customer_id=params.get('customer_id'),
+        start_date=parse_date(params.get('start')),
+        end_date=parse_date(params.get('end')),
+    ))
+    progress(1, 2)
+    write_aging_csv(rows, out)
+
+
+@register_job('sales_analytics', reads_from_reporting=True)
+def sales_analytics_report(params, out, progress):
+    group, per_month = params['group'], params.get('per_month', False)
+    rows = sales_analytics(group=group, start=parse_date(params.get('start')), end=parse_date(params.get('end')),
+                           per_month=per_month, limit=params.get('limit'))
+    label_key = ANALYTICS_GROUPS[group][-1]
+    writer = csv.writer(out)
+    writer.writerow((['Month'] if per_month else []) + [group.title(), 'Quantity', 'Revenue (Rs)'])
+    for row in rows:
+        writer.writerow(([row['month'].strftime('%Y-%m')] if per_month else [])
+                        + [row[label_key] or '(none)', row['quantity'], str(row['revenue'])])
+
+
+@register_job('payment_import')
+def payment_import(params, out, progress):
+    """Import an uploaded payment file; the result is the report of unmatched lines."""
+    path = params['path']
+    user = get_user_model().objects.filter(pk=params.get('user_id')).first()
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as fh:
+            total = max(sum(1 for _ in fh) - 1, 1)
+            fh.seek(0)
+            import_payments(fh, out, user=user, progress=lambda done: progress(done, total))
+    finally:
+        os.unlink(path)
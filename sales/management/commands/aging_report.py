@@ -0,0 +1,56 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sales.reports import AGING_BUCKETS, aging_totals, parse_date, receivables_aging, write_aging_csv
+
+
+class Command(BaseCommand):
+    help = 'Print installment receivables aging (0-30/31-60/61-90/90+ days) per customer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help='Aging reference date, YYYY-MM-DD (default: today)')
+        parser.add_argument('--customer', type=int, help='Restrict to a single customer id')
+        parser.add_argument('--start', help='Only sales on/after this date, YYYY-MM-DD')
+        parser.add_argument('--end', help='Only sales on/before this date, YYYY-MM-DD')
+        parser.add_argument('--csv', metavar='PATH', help="Write CSV to PATH ('-' for stdout)")
+
+    def handle(self, *args, **options):
+        dates = {}
+        for key in ('as_of', 'start', 'end'):
+            value = options[key]
+            dates[key] = parse_date(value)
+            if value and dates[key] is None:
+                raise CommandError(f'Invalid date for --{key.replace("_", "-")}: {value}')
+        as_of = dates['as_of'] or timezone.localdate()
+
+        rows = list(receivables_aging(
+            as_of=as_of,
+            customer_id=options['customer'],
+            start_date=dates['start'],
+            end_date=dates['end'],
+        ))
+
+        if options['csv']:
+            if options['csv'] == '-':
+                write_aging_csv(rows, sys.stdout)
+            else:
+                with open(options['csv'], 'w', newline='', encoding='utf-8') as fh:
+                    write_aging_csv(rows, fh)
+                self.stdout.write(self.style.SUCCESS(f'Wrote {len(rows)} rows to {options["csv"]}'))
+            return
+
+        labels = [label for _, label in AGING_BUCKETS]
+        self.stdout.write(f'Receivables aging as of {as_of}')
+        self.stdout.write(f'{"Customer":<30}' + ''.join(f'{label:>14}' for label in labels) + f'{"Total":>14}')
+        for row in rows:
+            self.stdout.write(
+                f'{row["customer_name"][:30]:<30}'
+                + ''.join(f'{row[key]:>14}' for key, _ in AGING_BUCKETS)
+                + f'{row["total"]:>14}'
+            )
+        totals = aging_totals(rows)
+        self.stdout.write(
+            f'{"TOTAL":<30}' + ''.join(f'{totals[key]:>14}' for key, _ in AGING_BUCKETS) + f'{totals["total"]:>14}'
+        )
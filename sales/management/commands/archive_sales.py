@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sales.archive import archivable_sales, archive_enabled, archive_sales
+
+
+class Command(BaseCommand):
+    help = 'Move fully paid sales older than SALES_ARCHIVE_AFTER_DAYS to the archive database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SALES_ARCHIVE_AFTER_DAYS,
+                            help='Archive sales older than this many days')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Sales moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the sales that would be moved')
+
+    def handle(self, *args, **options):
+        if not archive_enabled():
+            raise CommandError("The archive database is not set up; run 'manage.py migrate --database archive' first.")
+        before = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            count = archivable_sales(before).count()
+            self.stdout.write(f'{count} sales older than {before:%Y-%m-%d} would be archived.')
+            return
+        moved = archive_sales(before, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} sales older than {before:%Y-%m-%d}.'))
@@ -0,0 +1,32 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sales.audit import CHECKS, run_audit
+
+
+class Command(BaseCommand):
+    help = ('Check sale totals, installment plans and stock against their line items and payments, '
+            'in parallel over id ranges. Mismatches are written to a CSV report.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='append', choices=list(CHECKS), help='Run only these checks (repeatable)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes; 1 runs inline')
+        parser.add_argument('--range-size', type=int, default=50000, help='Ids per task')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per round trip')
+        parser.add_argument('--output', help='Report path (default AUDIT_DIR/audit-<timestamp>.csv)')
+
+    def handle(self, *args, **options):
+        output = options['output'] or os.path.join(settings.AUDIT_DIR, f'audit-{timezone.now():%Y%m%d-%H%M%S}.csv')
+        started = time.monotonic()
+        found = run_audit(output, checks=options['check'], workers=options['workers'],
+                          range_size=options['range_size'], chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+        for check, count in sorted(found.items()):
+            self.stdout.write(f'  {check}: {count}')
+        if found:
+            raise CommandError(f'{sum(found.values())} mismatches in {elapsed:.1f}s; see {output}')
+        self.stdout.write(self.style.SUCCESS(f'No mismatches ({elapsed:.1f}s); report in {output}.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.reports import parse_date
+from sales.rollups import backfill_daily_sales
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyProductSales rollup from SaleItem rows (optionally for a date range).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild, YYYY-MM-DD (default: all history)')
+        parser.add_argument('--end', help='Last day to rebuild, YYYY-MM-DD (default: today)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start, end = parse_date(options['start']), parse_date(options['end'])
+        if (options['start'] and not start) or (options['end'] and not end):
+            raise CommandError('Dates must be YYYY-MM-DD.')
+        written = backfill_daily_sales(start=start, end=end, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily product rollup rows.'))
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.payment_import import import_payments
+
+
+class Command(BaseCommand):
+    help = ('Import installment payments from a CSV file (sale_id or phone, amount, optional reference) '
+            'and write unmatched lines to a reconciliation report.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Payment file')
+        parser.add_argument('--report', help='Report path (default <file>-unmatched.csv next to the file)')
+        parser.add_argument('--user', help='Username recorded as having received the payments')
+        parser.add_argument('--batch-size', type=int, default=500, help='Lines committed per transaction')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'No such file: {path}')
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Unknown user: {options["user"]}')
+        report = Path(options['report'] or path.with_name(f'{path.stem}-unmatched.csv'))
+        with open(path, encoding='utf-8-sig', newline='') as lines, open(report, 'w', newline='', encoding='utf-8') as out:
+            summary = import_payments(lines, out, user=user, batch_size=options['batch_size'])
+        self.stdout.write(
+            f"{summary['lines']} lines: {summary['payments']} payments for Rs {summary['amount']}, "
+            f"{summary['plans_paid']} plans now paid, {summary['unmatched']} unmatched."
+        )
+        if summary['unmatched']:
+            self.stdout.write(self.style.WARNING(f'Unmatched lines written to {report}.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Every line was matched.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from sales.forecast import update_sales_velocity
+
+
+class Command(BaseCommand):
+    help = 'Update 7/30/90-day sales velocity and days of stock cover for products touched since the last run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every product instead of only changed ones')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = update_sales_velocity(full=options['full'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated sales velocity for {updated} products.'))
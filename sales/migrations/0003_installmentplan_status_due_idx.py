@@ -0,0 +1,17 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_installmentplan_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='installmentplan',
+            index=models.Index(fields=['status', 'first_due_date'], name='plan_status_due_idx'),
+        ),
+    ]
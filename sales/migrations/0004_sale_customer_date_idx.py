@@ -0,0 +1,20 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_customer_sales_totals'),
+        ('sales', '0003_installmentplan_status_due_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['customer', '-date'], name='sale_customer_date_idx'),
+        ),
+    ]
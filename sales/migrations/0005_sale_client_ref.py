@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_sale_customer_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='client_ref',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
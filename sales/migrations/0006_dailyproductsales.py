@@ -0,0 +1,47 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill(apps, schema_editor):
+    SaleItem = apps.get_model('sales', 'SaleItem')
+    DailyProductSales = apps.get_model('sales', 'DailyProductSales')
+    db = schema_editor.connection.alias
+    rows = (
+        SaleItem.objects.using(db).annotate(day=TruncDate('sale__date', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'product_id').annotate(q=Sum('quantity'), r=Sum('subtotal')).order_by()
+    )
+    DailyProductSales.objects.using(db).bulk_create(
+        [DailyProductSales(day=r['day'], product_id=r['product_id'], quantity=r['q'], revenue=r['r']) for r in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_barcode'),
+        ('sales', '0005_sale_client_ref'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'day'], name='daily_sales_product_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'product'), name='daily_sales_day_product_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
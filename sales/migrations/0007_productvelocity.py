@@ -0,0 +1,39 @@
+# Generated by Django 6.1.2 on 2026-10-19 03:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_barcode'),
+        ('sales', '0006_dailyproductsales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VelocityWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_sale_item_id', models.BigIntegerField(default=0)),
+                ('last_change_id', models.BigIntegerField(default=0)),
+                ('last_run_on', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductVelocity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('avg_7', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('avg_30', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('avg_90', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('days_of_cover', models.DecimalField(blank=True, decimal_places=1, max_digits=10, null=True)),
+                ('computed_on', models.DateField()),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='velocity', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['days_of_cover'], name='velocity_cover_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.1.2 on 2026-10-19 04:29
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_productvelocity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='installmentpayment',
+            name='received_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='received_payments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='DayClose',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('sale_count', models.PositiveIntegerField(default=0)),
+                ('full_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('installment_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cashiers', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('closed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='day_closes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_dayclose'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='installmentpayment',
+            name='reference',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.1.2 on 2026-10-19 04:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+
+
+def tag_main_branch(apps, schema_editor):
+    # Branches live in 'default' only; sales already archived keep a blank branch
+    if schema_editor.connection.alias != DEFAULT_DB_ALIAS:
+        return
+    main = apps.get_model('products', 'Branch').objects.order_by('id').first()
+    if main is not None:
+        apps.get_model('sales', 'Sale').objects.filter(branch__isnull=True).update(branch=main)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_customer_search_keys'),
+        ('products', '0004_branch_stocklevel'),
+        ('sales', '0009_installmentpayment_reference'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='products.branch'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['branch', '-date'], name='sale_branch_date_idx'),
+        ),
+        migrations.RunPython(tag_main_branch, migrations.RunPython.noop),
+    ]
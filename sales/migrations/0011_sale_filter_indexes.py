@@ -0,0 +1,29 @@
+# Generated by Django 6.1.2 on 2026-10-19 04:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_customer_search_keys'),
+        ('products', '0004_branch_stocklevel'),
+        ('sales', '0010_sale_branch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['-date', 'total_amount'], name='sale_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['created_by', '-date'], name='sale_cashier_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['payment_type', '-date'], name='sale_payment_date_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 
@@ -10,6 +11,21 @@ class Sale(models.Model):
     payment_type = models.CharField(max_length=20, choices=PAYMENT_TYPE_CHOICES)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2)
     is_completed = models.BooleanField(default=False)
+    # Idempotency key supplied by terminals for queued offline sales
+    client_ref = models.CharField(max_length=64, unique=True, blank=True, null=True)
+    # Outlet the sale was rung up at; blank only for sales archived before branches existed
+    branch = models.ForeignKey('products.Branch', on_delete=models.PROTECT, null=True, blank=True, related_name='sales')
+
+    class Meta:
+        indexes = [
+            # The sale list filters (sales.filters): a date range alone or with one column. The
+            # total rides along in the date index so the unfiltered count and sum read only it
+            models.Index(fields=['-date', 'total_amount'], name='sale_date_idx'),
+            models.Index(fields=['customer', '-date'], name='sale_customer_date_idx'),
+            models.Index(fields=['created_by', '-date'], name='sale_cashier_date_idx'),
+            models.Index(fields=['payment_type', '-date'], name='sale_payment_date_idx'),
+            models.Index(fields=['branch', '-date'], name='sale_branch_date_idx'),
+        ]
 
     def __str__(self):
         return f"Sale #{self.id} - {self.customer.name}"
@@ -35,9 +51,88 @@ class InstallmentPlan(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'first_due_date'], name='plan_status_due_idx'),
+        ]
+
 
 class InstallmentPayment(models.Model):
     plan = models.ForeignKey(InstallmentPlan, on_delete=models.CASCADE, related_name='payments')
     payment_date = models.DateField(auto_now_add=True)
     amount_paid = models.DecimalField(max_digits=12, decimal_places=2)
     is_paid = models.BooleanField(default=True)
+    # Cashier who took the money; NULL for payments recorded before this was tracked
+    received_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='received_payments')
+    # Bank transfer reference from an imported payment file; a repeated import skips known ones
+    reference = models.CharField(max_length=64, unique=True, blank=True, null=True)
+
+
+class DailyProductSales(models.Model):
+    """Per-day, per-product sales rollup maintained by create_sale_from_cart (see sales.rollups)."""
+    day = models.DateField()
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='daily_sales_day_product_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'day'], name='daily_sales_product_day_idx'),
+        ]
+
+
+class ProductVelocity(models.Model):
+    """Moving-average units sold per day and days of stock cover, maintained by sales.forecast.
+
+    ``days_of_cover`` is NULL for products with no sales in the last 90 days, so they sort
+    after everything that is actually moving.
+    """
+    product = models.OneToOneField('products.Product', on_delete=models.CASCADE, related_name='velocity')
+    avg_7 = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    avg_30 = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    avg_90 = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    days_of_cover = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True)
+    computed_on = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['days_of_cover'], name='velocity_cover_idx'),
+        ]
+
+
+class VelocityWatermark(models.Model):
+    """Single row recording how far update_sales_velocity has read."""
+    last_sale_item_id = models.BigIntegerField(default=0)
+    last_change_id = models.BigIntegerField(default=0)
+    last_run_on = models.DateField(null=True, blank=True)
+
+
+class DayClose(models.Model):
+    """Frozen end-of-day totals (Z-report) written once by sales.dayclose.close_day.
+
+    ``cashiers`` holds one dict per cashier with sale counts and amounts as strings; the
+    day totals are columns so the close list never has to open the JSON.
+    """
+    day = models.DateField(unique=True)
+    closed_at = models.DateTimeField(auto_now_add=True)
+    closed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='day_closes')
+    sale_count = models.PositiveIntegerField(default=0)
+    full_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    installment_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cashiers = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        ordering = ['-day']
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError(f'The close for {self.day} is final and cannot be changed.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError(f'The close for {self.day} is final and cannot be deleted.')
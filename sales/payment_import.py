@@ -0,0 +1,199 @@
+import csv
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+
+from core.audit import log_event
+from core.changelog import record_change
+from core.db import retry_on_lock
+from customers.models import Customer, normalize_phone
+from .models import InstallmentPayment, InstallmentPlan
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+CENT = Decimal('0.01')
+REPORT_HEADER = ['line', 'sale_id', 'phone', 'amount', 'reference', 'reason']
+# by_phone value for a phone shared by several customers
+SEVERAL = 'several'
+
+
+def _parse(row):
+    """``(sale_id, phone, amount, reference)`` from a CSV row, or ValueError with the reason."""
+    sale_id = (row.get('sale_id') or '').strip()
+    phone = normalize_phone(row.get('phone'))
+    if sale_id and not sale_id.isdigit():
+        raise ValueError('invalid sale id')
+    if not sale_id and not phone:
+        raise ValueError('no sale id or phone')
+    try:
+        amount = Decimal((row.get('amount') or '').replace(',', '').strip())
+    except InvalidOperation:
+        raise ValueError('invalid amount')
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError('invalid amount')
+    return int(sale_id) if sale_id else None, phone, amount.quantize(CENT), (row.get('reference') or '').strip() or None
+
+
+class _Plans:
+    """Open installment plans looked up so far and what is still owed on each.
+
+    Lookups are batched: ``load`` resolves every new sale id and phone of a batch with one
+    query each, plus one for the amounts already paid. Allocations reduce ``outstanding``
+    so later lines of the same file see them.
+    """
+
+    def __init__(self):
+        self.by_sale = {}
+        self.by_phone = {}
+        self.outstanding = {}
+        self.customer = {}
+
+    def load(self, sale_ids, phones):
+        sale_ids = set(sale_ids) - set(self.by_sale)
+        phones = set(phones) - set(self.by_phone)
+        plans = InstallmentPlan.objects.none()
+        single = {}
+        if sale_ids:
+            self.by_sale.update(dict.fromkeys(sale_ids))
+            plans = plans | InstallmentPlan.objects.filter(sale_id__in=sale_ids)
+        if phones:
+            customers = defaultdict(list)
+            for pk, phone in Customer.objects.filter(phone_normalized__in=phones).values_list('pk', 'phone_normalized'):
+                customers[phone].append(pk)
+            for phone in phones:
+                self.by_phone[phone] = SEVERAL if len(customers[phone]) > 1 else []
+            single = {ids[0]: phone for phone, ids in customers.items() if len(ids) == 1}
+            plans = plans | InstallmentPlan.objects.filter(sale__customer_id__in=single, status='PENDING')
+        new = {}
+        for pk, sale_id, customer_id, total, status in plans.order_by('first_due_date', 'pk').values_list(
+                'pk', 'sale_id', 'sale__customer_id', 'sale__total_amount', 'status'):
+            if pk not in self.outstanding:
+                new[pk] = total if status == 'PENDING' else Decimal('0')
+                self.customer[pk] = customer_id
+            if sale_id in sale_ids:
+                self.by_sale[sale_id] = pk
+            if status == 'PENDING' and customer_id in single:
+                self.by_phone[single[customer_id]].append(pk)
+        paid = (InstallmentPayment.objects.filter(plan_id__in=new).values('plan_id')
+                .annotate(s=Sum('amount_paid')).values_list('plan_id', 's').order_by())
+        for pk, amount in paid:
+            new[pk] -= amount
+        self.outstanding.update(new)
+
+    def candidates(self, sale_id, phone):
+        """Plans to allocate a line to, oldest first, or ValueError with the reason."""
+        if sale_id is not None:
+            pk = self.by_sale[sale_id]
+            if pk is None:
+                raise ValueError('no installment plan for this sale')
+            if self.outstanding[pk] <= 0:
+                raise ValueError('installment plan already paid')
+            return [pk]
+        plans = self.by_phone[phone]
+        if plans == SEVERAL:
+            raise ValueError('phone matches several customers')
+        open_plans = [pk for pk in plans if self.outstanding[pk] > 0]
+        if not open_plans:
+            raise ValueError('no customer with an open installment plan for this phone')
+        return open_plans
+
+
+@retry_on_lock('payment_import')
+def _write_batch(payments, customers):
+    """Insert a batch of payments and apply it with set-based updates in one transaction.
+
+    ``customers`` maps each plan to its customer. Customer balances drop in one UPDATE (a
+    CASE per customer) and every touched plan that is now fully paid is marked PAID in one
+    UPDATE against its summed payments.
+    """
+    owed = defaultdict(Decimal)
+    for payment in payments:
+        owed[customers[payment.plan_id]] += payment.amount_paid
+    with transaction.atomic():
+        InstallmentPayment.objects.bulk_create(payments, batch_size=500)
+        Customer.objects.filter(pk__in=owed).update(balance=F('balance') - Case(
+            *[When(pk=pk, then=Value(amount)) for pk, amount in owed.items()], output_field=MONEY))
+        record_change('customer', list(owed))
+        paid = Subquery(InstallmentPayment.objects.filter(plan=OuterRef('pk')).values('plan')
+                        .annotate(s=Sum('amount_paid')).values('s'), output_field=MONEY)
+        # SQLite sums decimals as floats (0.70 + 0.10 < 0.80), so both sides are rounded to cents
+        return (InstallmentPlan.objects.filter(pk__in={payment.plan_id for payment in payments}, status='PENDING')
+                .alias(paid=Round(Coalesce(paid, Value(Decimal('0')), output_field=MONEY), 2, output_field=MONEY))
+                .filter(paid__gte=Round(F('sale__total_amount'), 2, output_field=MONEY))
+                .update(status='PAID'))
+
+
+def import_payments(lines, report, user=None, batch_size=500, progress=None):
+    """Import installment payments from CSV ``lines`` (any iterable of text lines).
+
+    Columns: ``sale_id`` or ``phone``, ``amount`` and an optional bank ``reference``. A sale
+    id pays that sale's plan; a phone pays the customer's open plans, oldest due first. The
+    file is read ``batch_size`` lines at a time, and each batch is committed on its own, so
+    a re-run skips lines whose reference was already imported. Unmatched lines and amounts
+    left over after paying every matched plan are written to the ``report`` file with a
+    reason. Returns a Counter (lines, payments, amount, plans_paid, unmatched).
+    """
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None:
+        return Counter()
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    writer = csv.writer(report)
+    writer.writerow(REPORT_HEADER)
+    plans = _Plans()
+    seen_references = set()
+    summary = Counter()
+    rows = enumerate(reader, 2)  # line numbers as a spreadsheet shows them, after the header
+
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            if summary['payments']:
+                log_event(user, 'create', 'payment', summary=f"Imported {summary['payments']} payments for Rs {summary['amount']}")
+            return summary
+        parsed, unmatched = [], []
+        for line, row in batch:
+            summary['lines'] += 1
+            try:
+                parsed.append((line, row, *_parse(row)))
+            except ValueError as exc:
+                unmatched.append([line, *(row.get(key) or '' for key in REPORT_HEADER[1:-1]), exc])
+        references = {ref for *_, ref in parsed if ref}
+        seen_references.update(InstallmentPayment.objects.filter(reference__in=references).values_list('reference', flat=True))
+        plans.load([sale_id for _, _, sale_id, *_ in parsed if sale_id is not None],
+                   [phone for _, _, sale_id, phone, *_ in parsed if sale_id is None])
+
+        payments = []
+        for line, row, sale_id, phone, amount, reference in parsed:
+            try:
+                if reference in seen_references:
+                    raise ValueError('reference already imported')
+                candidates = plans.candidates(sale_id, phone)
+            except ValueError as exc:
+                unmatched.append([line, sale_id or '', row.get('phone') or '', amount, reference or '', exc])
+                continue
+            if reference:
+                seen_references.add(reference)
+            left = amount
+            for pk in candidates:
+                if not left:
+                    break
+                part = min(left, plans.outstanding[pk])
+                plans.outstanding[pk] -= part
+                left -= part
+                payments.append(InstallmentPayment(plan_id=pk, amount_paid=part, received_by=user, reference=reference))
+                # Only the first part carries the reference, which is unique
+                reference = None
+            summary['amount'] += amount - left
+            if left:
+                unmatched.append([line, sale_id or '', row.get('phone') or '', left, row.get('reference') or '',
+                                  'more than the plans owed; amount shown not allocated'])
+        if payments:
+            summary['payments'] += len(payments)
+            summary['plans_paid'] += _write_batch(payments, plans.customer)
+        summary['unmatched'] += len(unmatched)
+        writer.writerows(sorted(unmatched, key=lambda entry: entry[0]))
+        if progress:
+            progress(summary['lines'])
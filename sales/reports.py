@@ -0,0 +1,137 @@
+import csv
+from decimal import Decimal
+from datetime import date, datetime, timedelta
+from django.db.models import Case, Count, DecimalField, F, Func, OuterRef, Subquery, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, Rank
+
+from .models import InstallmentPlan, InstallmentPayment
+
+
+AGING_BUCKETS = [
+    ('current', '0-30 days'),
+    ('days_31_60', '31-60 days'),
+    ('days_61_90', '61-90 days'),
+    ('days_over_90', '90+ days'),
+]
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+class _SumOver(Func):
+    """SUM() usable over an already-aggregated expression inside a window (SUM(SUM(x)) OVER ())."""
+    function = 'SUM'
+    window_compatible = True
+    output_field = MONEY
+
+
+def _bucket(outstanding, due_before=None, due_from=None):
+    """Conditional SUM of outstanding for plans first due in [due_from, due_before)."""
+    conditions = {}
+    if due_before is not None:
+        conditions['first_due_date__lt'] = due_before
+    if due_from is not None:
+        conditions['first_due_date__gte'] = due_from
+    return Coalesce(
+        Sum(Case(When(then=outstanding, **conditions), default=Value(Decimal('0')), output_field=MONEY)),
+        Value(Decimal('0')),
+        output_field=MONEY,
+    )
+
+
+def receivables_aging(as_of=None, customer_id=None, start_date=None, end_date=None):
+    """Aging buckets per customer for open installment plans, in a single grouped query.
+
+    Age is measured from the plan's first due date to ``as_of``. Plans not yet due land in
+    the 0-30 bucket. ``start_date``/``end_date`` restrict the sale date (inclusive).
+    Returns a queryset of dicts ordered by total outstanding, largest first.
+    """
+    as_of = as_of or date.today()
+    cut_30 = as_of - timedelta(days=30)
+    cut_60 = as_of - timedelta(days=60)
+    cut_90 = as_of - timedelta(days=90)
+
+    paid = (
+        InstallmentPayment.objects.filter(plan=OuterRef('pk'))
+        .values('plan')
+        .annotate(s=Sum('amount_paid'))
+        .values('s')
+    )
+    plans = InstallmentPlan.objects.filter(status='PENDING').annotate(
+        outstanding=F('sale__total_amount') - Coalesce(Subquery(paid, output_field=MONEY), Value(Decimal('0')), output_field=MONEY),
+    ).filter(outstanding__gt=0)
+    if customer_id:
+        plans = plans.filter(sale__customer_id=customer_id)
+    if start_date:
+        plans = plans.filter(sale__date__date__gte=start_date)
+    if end_date:
+        plans = plans.filter(sale__date__date__lte=end_date)
+
+    outstanding = F('outstanding')
+    rows = plans.values(
+        customer_id=F('sale__customer_id'),
+        customer_name=F('sale__customer__name'),
+        customer_phone=F('sale__customer__phone'),
+    ).annotate(
+        plan_count=Count('id'),
+        current=_bucket(outstanding, due_from=cut_30),
+        days_31_60=_bucket(outstanding, due_before=cut_30, due_from=cut_60),
+        days_61_90=_bucket(outstanding, due_before=cut_60, due_from=cut_90),
+        days_over_90=_bucket(outstanding, due_before=cut_90),
+        total=Sum(outstanding, output_field=MONEY),
+    ).annotate(
+        rank=Window(expression=Rank(), order_by=F('total').desc()),
+        grand_total=Window(expression=_SumOver(Sum(outstanding, output_field=MONEY)), output_field=MONEY),
+    ).order_by('-total', 'customer_name')
+    return rows
+
+
+def aging_totals(rows):
+    """Column totals for an aging result set (already materialized rows)."""
+    totals = {key: Decimal('0') for key, _ in AGING_BUCKETS}
+    totals['total'] = Decimal('0')
+    totals['plan_count'] = 0
+    for row in rows:
+        for key in totals:
+            totals[key] += row[key] or 0
+    return totals
+
+
+def write_aging_csv(rows, out):
+    """Write aging rows to a file-like object (HttpResponse or open file)."""
+    writer = csv.writer(out)
+    writer.writerow(['Customer ID', 'Customer Name', 'Customer Phone', 'Open Plans']
+                    + [f'{label} (Rs)' for _, label in AGING_BUCKETS] + ['Total Outstanding (Rs)'])
+    for row in rows:
+        writer.writerow([
+            row['customer_id'],
+            row['customer_name'],
+            row['customer_phone'] or '',
+            row['plan_count'],
+            *[str(row[key]) for key, _ in AGING_BUCKETS],
+            str(row['total']),
+        ])
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD query/CLI value, returning None when blank or invalid."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def period_start(period, today):
+    """First day of the calendar ``period`` (today, week, month, quarter, year) holding ``today``; None for any other."""
+    if period == 'today':
+        return today
+    if period == 'week':
+        return today - timedelta(days=today.weekday())
+    if period == 'month':
+        return today.replace(day=1)
+    if period == 'quarter':
+        return today.replace(month=3 * ((today.month - 1) // 3) + 1, day=1)
+    if period == 'year':
+        return today.replace(month=1, day=1)
+    return None
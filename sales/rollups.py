@@ -0,0 +1,99 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, Sum, Window
+from django.db.models.functions import RowNumber, TruncDate, TruncMonth
+from django.utils import timezone
+
+from .archive import sales_databases
+from .models import DailyProductSales, SaleItem
+
+
+ANALYTICS_GROUPS = {
+    'product': ('product_id', 'product__name'),
+    'brand': ('product__brand',),
+    'size': ('product__size',),
+    'type': ('product__type',),
+}
+
+
+def record_daily_sales(day, items):
+    """Add sale lines (objects with product_id, quantity, subtotal) to the rollup for ``day``.
+
+    Runs inside the caller's transaction: an UPDATE with F() increments per product, and an
+    INSERT for products with no row yet that day (retried as an UPDATE if another
+    transaction created it first).
+    """
+    per_product = defaultdict(lambda: [0, Decimal('0')])
+    for item in items:
+        per_product[item.product_id][0] += item.quantity
+        per_product[item.product_id][1] += item.subtotal
+
+    for product_id, (quantity, revenue) in per_product.items():
+        increment = {'quantity': F('quantity') + quantity, 'revenue': F('revenue') + revenue}
+        rollup = DailyProductSales.objects.filter(day=day, product_id=product_id)
+        if rollup.update(**increment):
+            continue
+        try:
+            with transaction.atomic():
+                DailyProductSales.objects.create(day=day, product_id=product_id, quantity=quantity, revenue=revenue)
+        except IntegrityError:
+            rollup.update(**increment)
+
+
+def backfill_daily_sales(start=None, end=None, batch_size=1000):
+    """Rebuild rollup rows for ``[start, end]`` (local dates, inclusive) from SaleItem rows.
+
+    Items in the archive database are included, so archiving never shrinks the history.
+    Returns the number of rollup rows written.
+    """
+    tz = timezone.get_current_timezone()
+    items = SaleItem.objects.annotate(day=TruncDate('sale__date', tzinfo=tz))
+    existing = DailyProductSales.objects.all()
+    if start:
+        items = items.filter(day__gte=start)
+        existing = existing.filter(day__gte=start)
+    if end:
+        items = items.filter(day__lte=end)
+        existing = existing.filter(day__lte=end)
+
+    totals = defaultdict(lambda: [0, Decimal('0')])
+    for db in sales_databases():
+        rows = items.using(db).values('day', 'product_id').annotate(q=Sum('quantity'), r=Sum('subtotal')).order_by()
+        for row in rows.iterator(chunk_size=batch_size):
+            totals[row['day'], row['product_id']][0] += row['q']
+            totals[row['day'], row['product_id']][1] += row['r']
+
+    with transaction.atomic():
+        existing.delete()
+        DailyProductSales.objects.bulk_create(
+            [DailyProductSales(day=day, product_id=product_id, quantity=q, revenue=r)
+             for (day, product_id), (q, r) in totals.items()],
+            batch_size=batch_size,
+        )
+    return len(totals)
+
+
+def sales_analytics(group='product', start=None, end=None, per_month=False, limit=None):
+    """Quantity and revenue grouped by product/brand/size/type, read from the daily rollup.
+
+    ``per_month`` adds a ``month`` column to the grouping. Ordered by revenue, largest first;
+    ``limit`` keeps the top rows overall, or the top rows of each month with ``per_month``.
+    """
+    keys = ANALYTICS_GROUPS[group]
+    qs = DailyProductSales.objects.all()
+    if start:
+        qs = qs.filter(day__gte=start)
+    if end:
+        qs = qs.filter(day__lte=end)
+    if per_month:
+        qs = qs.annotate(month=TruncMonth('day'))
+        keys = ('month',) + keys
+    qs = qs.values(*keys).annotate(
+        quantity=Sum('quantity'),
+        revenue=Sum('revenue', output_field=DecimalField(max_digits=14, decimal_places=2)),
+    ).order_by(*(['month'] if per_month else []), '-revenue')
+    if limit and per_month:
+        return qs.annotate(rank=Window(RowNumber(), partition_by=F('month'), order_by=F('revenue').desc())).filter(rank__lte=limit)
+    return qs[:limit] if limit else qs
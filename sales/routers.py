@@ -0,0 +1,38 @@
+from django.db import DEFAULT_DB_ALIAS
+
+
+ARCHIVE_DB = 'archive'
+
+# Models whose old rows are moved to ARCHIVE_DB by sales.archive.archive_sales.
+ARCHIVED_MODELS = {'sales.sale', 'sales.saleitem', 'sales.installmentplan', 'sales.installmentpayment'}
+
+
+class SalesArchiveRouter:
+    """Routes lookups made from archived sales.
+
+    Queries start on 'default'; views reach the archive explicitly with ``.using(ARCHIVE_DB)``
+    (see sales.archive). Related sales rows of an archived object are read from the archive
+    too, while its customer, products and cashier always come from 'default'.
+    """
+
+    def _route(self, model, hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == ARCHIVE_DB and model._meta.label_lower not in ARCHIVED_MODELS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, ARCHIVE_DB}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == ARCHIVE_DB:
+            return app_label == 'sales'
+        return None
@@ -0,0 +1,26 @@
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from .routers import ARCHIVE_DB
+
+
+def _disable_foreign_keys(connection):
+    # The archive only holds sales tables; its customer/product/user ids point into the
+    # default database, so SQLite must not enforce those references here.
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA foreign_keys = OFF')
+
+
+@receiver(connection_created)
+def archive_connection_created(sender, connection, **kwargs):
+    if connection.alias == ARCHIVE_DB:
+        _disable_foreign_keys(connection)
+
+
+@receiver(post_migrate)
+def archive_migrated(sender, using, **kwargs):
+    # The migration executor turns constraint checking back on when it finishes.
+    if using == ARCHIVE_DB:
+        _disable_foreign_keys(connections[using])
@@ -1,13 +1,46 @@
+import io
+import os
+import tempfile
 from decimal import Decimal
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
-from django.urls import reverse
+from django.urls import resolve, reverse
 from django.utils import timezone
 
-from products.models import Product
+from products.models import Branch, Product
+from products.utils import set_branch_stock
 from customers.models import Customer
-from .utils import create_sale_from_cart
-from .models import Sale, SaleItem, InstallmentPlan, InstallmentPayment
+from customers.utils import rebuild_customer_stats
+from core.changelog import record_change
+from core.jobs import claim_jobs, run_job
+from .utils import create_sale_from_cart, ingest_sales, record_installment_payment
+from .reports import receivables_aging
+from .models import Sale, SaleItem, InstallmentPlan, InstallmentPayment, DailyProductSales, ProductVelocity, DayClose
+from .filters import filter_sales
+from .rollups import backfill_daily_sales, sales_analytics
+from .forecast import update_sales_velocity
+from .archive import archive_sales
+from .audit import run_audit
+from .dayclose import cashier_totals, close_day
+from .payment_import import import_payments
+from .routers import ARCHIVE_DB
+
+
+def download_via_job(client, url, params=None):
+    """Request a queued export, run its job inline and return the downloaded text."""
+    resp = client.get(url, params or {})
+    job_id = resolve(resp.url).kwargs['pk']
+    with tempfile.TemporaryDirectory() as tmp, override_settings(JOB_RESULTS_DIR=tmp):
+        assert claim_jobs(1) == [job_id]
+        run_job(job_id)
+        download = client.get(reverse('core:job_download', args=[job_id]))
+        content = b''.join(download.streaming_content).decode()
+        download.close()
+    return content
 
 
 class CreateSaleFromCartTests(TestCase):
@@ -77,3 +110,548 @@ class LedgerViewTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         for e in resp.context['page_obj'].object_list:
             self.assertEqual(e['customer'], 'Ali')
+
+
+class AgingReportTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester', password='pass1234')
+        self.client.login(username='tester', password='pass1234')
+        self.ali = Customer.objects.create(name='Ali', phone='123')
+        self.sara = Customer.objects.create(name='Sara', phone='999')
+        self.today = timezone.localdate()
+
+    def _plan(self, customer, total, days_overdue, paid=Decimal('0'), status='PENDING'):
+        sale = Sale.objects.create(customer=customer, created_by=self.user, payment_type='INSTALLMENT', total_amount=total, is_completed=True)
+        plan = InstallmentPlan.objects.create(
+            sale=sale, total_installments=3, installment_amount=total / 3,
+            first_due_date=self.today - timedelta(days=days_overdue), status=status,
+        )
+        if paid:
+            InstallmentPayment.objects.create(plan=plan, amount_paid=paid)
+        return plan
+
+    def test_buckets_per_customer(self):
+        self._plan(self.ali, Decimal('3000.00'), 5, paid=Decimal('1000.00'))
+        self._plan(self.ali, Decimal('1500.00'), 45)
+        self._plan(self.ali, Decimal('900.00'), 120)
+        self._plan(self.sara, Decimal('600.00'), 75)
+        self._plan(self.sara, Decimal('800.00'), 200, paid=Decimal('800.00'), status='PAID')
+
+        rows = {r['customer_name']: r for r in receivables_aging(as_of=self.today)}
+        self.assertEqual(set(rows), {'Ali', 'Sara'})
+        ali = rows['Ali']
+        self.assertEqual(ali['current'], Decimal('2000.00'))
+        self.assertEqual(ali['days_31_60'], Decimal('1500.00'))
+        self.assertEqual(ali['days_61_90'], Decimal('0'))
+        self.assertEqual(ali['days_over_90'], Decimal('900.00'))
+        self.assertEqual(ali['total'], Decimal('4400.00'))
+        self.assertEqual(ali['plan_count'], 3)
+        self.assertEqual(ali['rank'], 1)
+        self.assertEqual(rows['Sara']['days_61_90'], Decimal('600.00'))
+        self.assertEqual(ali['grand_total'], Decimal('5000.00'))
+
+    def test_view_filters_and_csv(self):
+        self._plan(self.ali, Decimal('1000.00'), 10)
+        self._plan(self.sara, Decimal('500.00'), 100)
+        resp = self.client.get(reverse('sales:aging_report') + f'?customer={self.sara.id}')
+        self.assertEqual(resp.status_code, 200)
+        names = [r['customer_name'] for r in resp.context['page_obj'].object_list]
+        self.assertEqual(names, ['Sara'])
+        # The picker is the customer typeahead, not a list of every customer
+        self.assertNotIn('customers', resp.context)
+        self.assertContains(resp, f'name="customer" id="customer_id" value="{self.sara.id}"')
+        self.assertContains(resp, 'id="customer_search" autocomplete="off" value="Sara"')
+        resp = self.client.get(reverse('sales:aging_report'), {'customer': 'abc'})
+        self.assertEqual(len(resp.context['page_obj'].object_list), 2)
+
+        lines = download_via_job(self.client, reverse('sales:aging_report'), {'format': 'csv'}).strip().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Ali', lines[1])
+
+
+class DailyProductSalesTests(TestCase):
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester', password='pass1234')
+        self.client.login(username='tester', password='pass1234')
+        self.customer = Customer.objects.create(name='Ali')
+        self.michelin = Product.objects.create(name='M 195', brand='Michelin', size='195/65R15', price=Decimal('100.00'), stock_quantity=50)
+        self.bridgestone = Product.objects.create(name='B 205', brand='Bridgestone', size='205/55R16', price=Decimal('150.00'), stock_quantity=50)
+
+    def _sell(self, product, qty):
+        cart = {str(product.id): {'product_id': product.id, 'name': product.name, 'price': str(product.price),
+                                  'quantity': qty, 'subtotal': str(product.price * qty)}}
+        return create_sale_from_cart(self.user, self.customer.id, cart, payment_type='FULL')
+
+    def test_checkout_updates_rollup_and_backfill_matches(self):
+        self._sell(self.michelin, 2)
+        self._sell(self.michelin, 1)
+        self._sell(self.bridgestone, 1)
+        today = timezone.localdate()
+        row = DailyProductSales.objects.get(day=today, product=self.michelin)
+        self.assertEqual((row.quantity, row.revenue), (3, Decimal('300.00')))
+
+        before = sorted(DailyProductSales.objects.values_list('day', 'product_id', 'quantity', 'revenue'))
+        DailyProductSales.objects.all().delete()
+        self.assertEqual(backfill_daily_sales(), 2)
+        self.assertEqual(sorted(DailyProductSales.objects.values_list('day', 'product_id', 'quantity', 'revenue')), before)
+
+    def test_analytics_groups_and_csv(self):
+        self._sell(self.michelin, 1)
+        self._sell(self.bridgestone, 2)
+        rows = list(sales_analytics(group='brand'))
+        self.assertEqual([(r['product__brand'], r['revenue']) for r in rows], [('Bridgestone', Decimal('300.00')), ('Michelin', Decimal('100.00'))])
+
+        resp = self.client.get(reverse('sales:analytics'), {'group': 'size', 'limit': 1})
+        self.assertEqual([r['label'] for r in resp.context['rows']], ['205/55R16'])
+        lines = download_via_job(self.client, reverse('sales:analytics'),
+                                 {'group': 'brand', 'per_month': '1', 'format': 'csv'}).strip().splitlines()
+        self.assertEqual(lines[0], 'Month,Brand,Quantity,Revenue (Rs)')
+        self.assertEqual(len(lines), 3)
+
+    def test_per_month_limit_applies_to_each_month(self):
+        self._sell(self.michelin, 1)
+        self._sell(self.bridgestone, 2)
+        last_month = timezone.localdate().replace(day=1) - timedelta(days=1)
+        DailyProductSales.objects.create(day=last_month, product=self.michelin, quantity=5, revenue=Decimal('500.00'))
+        DailyProductSales.objects.create(day=last_month, product=self.bridgestone, quantity=1, revenue=Decimal('150.00'))
+        rows = list(sales_analytics(group='brand', per_month=True, limit=1))
+        self.assertEqual([(r['month'].month, r['product__brand']) for r in rows],
+                         [(last_month.month, 'Michelin'), (timezone.localdate().month, 'Bridgestone')])
+
+
+class SalesVelocityTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester', password='pass1234')
+        self.client.login(username='tester', password='pass1234')
+        self.customer = Customer.objects.create(name='Ali')
+        self.fast = Product.objects.create(name='Fast', price=Decimal('100.00'), stock_quantity=40)
+        self.slow = Product.objects.create(name='Slow', price=Decimal('100.00'), stock_quantity=40)
+        self.idle = Product.objects.create(name='Idle', price=Decimal('100.00'), stock_quantity=5)
+
+    def _sell(self, product, qty):
+        cart = {str(product.id): {'product_id': product.id, 'name': product.name, 'price': str(product.price),
+                                  'quantity': qty, 'subtotal': str(product.price * qty)}}
+        return create_sale_from_cart(self.user, self.customer.id, cart, payment_type='FULL')
+
+    def test_incremental_update_and_window_expiry(self):
+        today = timezone.localdate()
+        self.assertEqual(update_sales_velocity(today=today), 3)
+        self._sell(self.fast, 14)
+        self.assertEqual(update_sales_velocity(today=today), 1)
+        v = ProductVelocity.objects.get(product=self.fast)
+        self.assertEqual((v.avg_7, v.avg_30), (Decimal('2.000'), Decimal('0.467')))
+        self.assertEqual(v.days_of_cover, Decimal('55.7'))
+        self.assertIsNone(ProductVelocity.objects.get(product=self.idle).days_of_cover)
+
+        # Nothing new: nothing recomputed. A restock alone is picked up from the change log.
+        self.assertEqual(update_sales_velocity(today=today), 0)
+        Product.objects.filter(pk=self.fast.pk).update(stock_quantity=0)
+        record_change('product', self.fast.id)
+        self.assertEqual(update_sales_velocity(today=today), 1)
+        self.assertEqual(ProductVelocity.objects.get(product=self.fast).days_of_cover, Decimal('0'))
+
+        # A week later the sale has left the 7-day window only.
+        self.assertEqual(update_sales_velocity(today=today + timedelta(days=7)), 1)
+        v = ProductVelocity.objects.get(product=self.fast)
+        self.assertEqual((v.avg_7, v.avg_30), (Decimal('0.000'), Decimal('0.467')))
+
+    def test_views_sort_by_days_until_stockout(self):
+        self._sell(self.fast, 20)
+        self._sell(self.slow, 1)
+        # Sold at another branch: in the shop-wide velocity, not in this branch's reorder quantity
+        north = Branch.objects.create(name='North')
+        set_branch_stock(self.fast, north, 30)
+        cart = {str(self.fast.id): {'product_id': self.fast.id, 'name': 'Fast', 'price': '100.00', 'quantity': 30, 'subtotal': '3000.00'}}
+        create_sale_from_cart(self.user, self.customer.id, cart, payment_type='FULL', branch=north)
+        update_sales_velocity()
+        resp = self.client.get(reverse('products:product_list'), {'sort': 'stockout'})
+        self.assertEqual([p.name for p in resp.context['page_obj'].object_list], ['Fast', 'Slow', 'Idle'])
+
+        resp = self.client.get(reverse('products:low_stock'), {'days': 60})
+        rows = resp.context['page_obj'].object_list
+        self.assertEqual([p.name for p in rows], ['Fast', 'Idle'])
+        # 20 sold in 30 days -> 0.667/day; 60 days needs 41 units, 20 on hand.
+        self.assertEqual(rows[0].reorder_quantity, 21)
+
+
+class SalesArchiveTests(TestCase):
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester', password='pass1234')
+        self.client.login(username='tester', password='pass1234')
+        self.customer = Customer.objects.create(name='Ali', phone='123')
+        self.product = Product.objects.create(name='Tyre', price=Decimal('1000.00'), stock_quantity=50)
+
+    def _sell(self, payment_type, days_ago, **kwargs):
+        cart = {str(self.product.id): {'product_id': self.product.id, 'name': 'Tyre', 'price': '1000.00',
+                                       'quantity': 2, 'subtotal': '2000.00'}}
+        return create_sale_from_cart(self.user, self.customer.id, cart, payment_type=payment_type,
+                                     sold_at=timezone.now() - timedelta(days=days_ago), **kwargs)
+
+    def _should_check_constraints(self, connection):
+        # Archived rows reference customers and products in the default database by design.
+        return connection.alias != ARCHIVE_DB and super()._should_check_constraints(connection)
+
+    def test_moves_only_old_paid_sales_and_reads_fall_back(self):
+        old_full = self._sell('FULL', 800)
+        old_paid = self._sell('INSTALLMENT', 800, installment_data={'total_installments': 2})
+        record_installment_payment(old_paid.installment_plan, Decimal('2000.00'))
+        old_open = self._sell('INSTALLMENT', 800, installment_data={'total_installments': 2})
+        recent = self._sell('FULL', 5)
+
+        self.assertEqual(archive_sales(timezone.now() - timedelta(days=730), chunk_size=1), 2)
+        self.assertEqual(set(Sale.objects.values_list('id', flat=True)), {old_open.id, recent.id})
+        archived = Sale.objects.using(ARCHIVE_DB).get(pk=old_paid.pk)
+        self.assertEqual(archived.date, old_paid.date)
+        self.assertEqual(archived.installment_plan.payments.get().amount_paid, Decimal('2000.00'))
+        self.assertEqual(SaleItem.objects.using(ARCHIVE_DB).count(), 2)
+
+        resp = self.client.get(reverse('sales:sale_detail', args=[old_full.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['sale'].customer, self.customer)
+        resp = self.client.get(reverse('sales:receipt_print', args=[old_paid.id]))
+        self.assertEqual(resp.context['payments'][0].amount_paid, Decimal('2000.00'))
+        resp = self.client.get(reverse('sales:receipts_print'), {'ids': f'{old_paid.id},{recent.id}'})
+        body = b''.join(resp.streaming_content).decode()
+        self.assertLess(body.index(f'#{recent.id}<'), body.index(f'#{old_paid.id}<'))
+        self.assertIn('Rs 2,000', body)
+        self.assertEqual(self.client.get(reverse('sales:sale_detail', args=[999])).status_code, 404)
+
+        lines = download_via_job(self.client, reverse('sales:export_csv')).strip().splitlines()
+        self.assertEqual([int(line.split(',')[0]) for line in lines[1:]], [recent.id, old_open.id, old_paid.id, old_full.id])
+
+        # Archived sales still count towards customer totals and the daily rollup.
+        self.assertEqual(rebuild_customer_stats(), [])
+        self.assertEqual(backfill_daily_sales(), 2)
+        self.assertEqual(sum(DailyProductSales.objects.values_list('quantity', flat=True)), 8)
+
+
+class DataAuditTests(TestCase):
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='auditor', password='p')
+        self.customer = Customer.objects.create(name='Ali')
+        self.product = Product.objects.create(name='Tyre', price=Decimal('100.00'), stock_quantity=10)
+
+    def _sell(self, qty, **kwargs):
+        cart = {str(self.product.id): {'product_id': self.product.id, 'name': 'Tyre', 'price': '100.00',
+                                       'quantity': qty, 'subtotal': str(100 * qty)}}
+        return create_sale_from_cart(self.user, self.customer.id, cart, **kwargs)
+
+    def _audit(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        output = os.path.join(tmp.name, 'audit.csv')
+        found = run_audit(output, workers=1, range_size=1)
+        with open(output, encoding='utf-8') as fh:
+            return found, fh.read().splitlines()
+
+    def test_consistent_data_has_no_mismatches(self):
+        set_branch_stock(self.product, Branch.objects.create(name='North'), 3)
+        self._sell(1, payment_type='FULL')
+        self._sell(2, payment_type='INSTALLMENT', installment_data={'total_installments': 3})
+        found, lines = self._audit()
+        self.assertEqual(found, {})
+        self.assertEqual(lines, ['check,database,object_id,expected,actual'])
+
+    def test_reports_each_kind_of_mismatch(self):
+        sale = self._sell(2, payment_type='INSTALLMENT', installment_data={'total_installments': 3})
+        Sale.objects.filter(pk=sale.pk).update(total_amount=Decimal('201.00'))
+        InstallmentPlan.objects.filter(sale=sale).update(status='PAID')
+        DailyProductSales.objects.filter(product=self.product).update(quantity=5)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=F('stock_quantity') + 4)
+        found, lines = self._audit()
+        self.assertEqual(found, {'sale_total': 1, 'plan_status': 1, 'rollup': 1, 'stock_total': 1})
+        self.assertIn(f'sale_total,default,{sale.pk},200.00,201.00', lines)
+        self.assertIn(f'stock_total,default,{self.product.pk},8,12', lines)
+
+    def test_fractional_amounts_are_not_mismatches(self):
+        prices = [Decimal('1000.10'), Decimal('234.27'), Decimal('0.20'), Decimal('0.10')]
+        products = [Product.objects.create(name=f'P{i}', price=price, stock_quantity=5) for i, price in enumerate(prices)]
+        cart = lambda *items: {str(p.id): {'product_id': p.id, 'name': p.name, 'price': str(p.price), 'quantity': 1,
+                                           'subtotal': str(p.price)} for p in items}
+        create_sale_from_cart(self.user, self.customer.id, cart(*products[:3]), payment_type='FULL')
+        sale = create_sale_from_cart(self.user, self.customer.id, cart(*products[2:]), payment_type='INSTALLMENT',
+                                     installment_data={'total_installments': 2})
+        self.assertEqual(sale.total_amount, Decimal('0.30'))
+        record_installment_payment(sale.installment_plan, Decimal('0.10'))
+        record_installment_payment(sale.installment_plan, Decimal('0.20'))
+        self.assertEqual(InstallmentPlan.objects.get(sale=sale).status, 'PAID')
+        found, lines = self._audit()
+        self.assertEqual(found, {})
+
+
+class DayCloseTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.ayesha = User.objects.create_user(username='ayesha', password='p')
+        self.bilal = User.objects.create_user(username='bilal', password='p')
+        self.customer = Customer.objects.create(name='Ali')
+        self.product = Product.objects.create(name='Tyre', price=Decimal('100.00'), stock_quantity=50)
+
+    def _sell(self, user, qty, payment_type='FULL', days_ago=1):
+        cart = {str(self.product.id): {'product_id': self.product.id, 'name': 'Tyre', 'price': '100.00',
+                                       'quantity': qty, 'subtotal': str(100 * qty)}}
+        installment = {'total_installments': 2} if payment_type == 'INSTALLMENT' else None
+        return create_sale_from_cart(user, self.customer.id, cart, payment_type=payment_type, installment_data=installment,
+                                     sold_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_close_freezes_per_cashier_totals(self):
+        self._sell(self.ayesha, 1)
+        plan_sale = self._sell(self.ayesha, 2, 'INSTALLMENT')
+        self._sell(self.bilal, 3)
+        payment = record_installment_payment(plan_sale.installment_plan, Decimal('50.00'), received_by=self.bilal)
+        yesterday = timezone.localdate() - timedelta(days=1)
+        InstallmentPayment.objects.filter(pk=payment.pk).update(payment_date=yesterday)
+
+        with self.assertNumQueries(1):
+            totals = cashier_totals(yesterday)
+        self.assertEqual(totals[self.ayesha.pk]['installment_total'], Decimal('200.00'))
+        self.assertEqual(totals[self.bilal.pk]['payments_total'], Decimal('50.00'))
+
+        # The current day is still trading, so it cannot be closed yet
+        with self.assertRaises(ValueError):
+            close_day(timezone.localdate(), self.ayesha)
+        close = close_day(yesterday, self.ayesha)
+        self.assertEqual((close.sale_count, close.full_total, close.installment_total, close.payments_total),
+                         (3, Decimal('400.00'), Decimal('200.00'), Decimal('50.00')))
+        close = DayClose.objects.get(day=yesterday)
+        self.assertEqual([(r['cashier'], r['full_count'], r['payment_count']) for r in close.cashiers],
+                         [('ayesha', 1, 0), ('bilal', 1, 1)])
+        self.assertEqual(close.cashiers[1]['full_total'], '300.00')
+
+        # A day closes once, and the snapshot never changes
+        with self.assertRaises(ValueError):
+            close_day(yesterday, self.bilal)
+        with self.assertRaises(ValueError):
+            close.save()
+        self.assertEqual(DayClose.objects.get(day=yesterday).full_total, Decimal('400.00'))
+
+    def test_views_close_and_show_z_report(self):
+        self._sell(self.bilal, 1)
+        self._sell(self.ayesha, 1, days_ago=0)
+        self.client.login(username='ayesha', password='p')
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        resp = self.client.get(reverse('sales:day_close_list'))
+        self.assertEqual([r['cashier'] for r in resp.context['open_rows']], ['ayesha'])
+
+        # A mistyped day is an error, not a close of some other day
+        resp = self.client.post(reverse('sales:day_close_list'), {'day': '2026-02-30'})
+        self.assertRedirects(resp, reverse('sales:day_close_list'))
+        self.assertFalse(DayClose.objects.exists())
+
+        resp = self.client.post(reverse('sales:day_close_list'), {'day': ''})
+        self.assertRedirects(resp, reverse('sales:z_report', args=[yesterday]))
+        with self.assertNumQueries(4):  # session, user, branches, the close
+            resp = self.client.get(reverse('sales:z_report', args=[yesterday]))
+        self.assertContains(resp, 'bilal')
+        self.assertEqual(self.client.get(reverse('sales:z_report', args=['2001-01-01'])).status_code, 404)
+
+    def test_offline_sales_cannot_land_in_a_closed_day(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        close_day(yesterday, self.ayesha)
+        line = [{'product_id': self.product.id, 'quantity': 1}]
+        results = ingest_sales(self.bilal, [
+            {'client_ref': 'late', 'customer_id': self.customer.id, 'items': line, 'date': f'{yesterday}T18:00:00'},
+            {'client_ref': 'now', 'customer_id': self.customer.id, 'items': line},
+        ])
+        self.assertEqual([(r['client_ref'], r['status']) for r in results], [('late', 'error'), ('now', 'created')])
+        self.assertEqual(results[0]['error'], f'{yesterday} is already closed')
+        self.assertFalse(Sale.objects.filter(client_ref='late').exists())
+        self.assertEqual(cashier_totals(yesterday), {})
+
+
+class BatchReceiptTests(TestCase):
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.customer = Customer.objects.create(name='Ali', phone='0300')
+        self.products = [Product.objects.create(name=f'Tyre {n}', price=Decimal('100.00'), stock_quantity=50) for n in range(3)]
+
+    def _sell(self, product, payment_type='FULL'):
+        cart = {str(product.id): {'product_id': product.id, 'name': product.name, 'price': '100.00', 'quantity': 1, 'subtotal': '100.00'}}
+        installment = {'total_installments': 2} if payment_type == 'INSTALLMENT' else None
+        return create_sale_from_cart(self.user, self.customer.id, cart, payment_type=payment_type, installment_data=installment)
+
+    def _print(self, params):
+        resp = self.client.get(reverse('sales:receipts_print'), params)
+        return b''.join(resp.streaming_content).decode()
+
+    def test_query_count_does_not_grow_with_receipts(self):
+        first = self._sell(self.products[0], 'INSTALLMENT')
+        record_installment_payment(first.installment_plan, Decimal('40.00'))
+        today = timezone.localdate().isoformat()
+
+        with CaptureQueriesContext(connection) as one:
+            body = self._print({'ids': str(first.id)})
+        self.assertEqual(body.count('class="page"'), 3)
+        self.assertIn('Rs 40', body)
+
+        others = [self._sell(product) for product in self.products[1:]] + [self._sell(self.products[0], 'INSTALLMENT')]
+        with CaptureQueriesContext(connection) as many:
+            body = self._print({'start': today, 'end': today})
+        self.assertEqual(len(many), len(one))
+        self.assertEqual(body.count('class="page"'), 3 * 4)
+        self.assertEqual(body.count('<html'), 1)
+        self.assertLess(body.index(f'#{first.id}<'), body.index(f'#{others[-1].id}<'))
+
+        self.assertEqual(self._print({'ids': f'{others[0].id},{others[1].id}'}).count('class="page"'), 6)
+        self.assertRedirects(self.client.get(reverse('sales:receipts_print')), reverse('sales:sale_list'))
+
+
+class PaymentImportTests(TestCase):
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.ali = Customer.objects.create(name='Ali', phone='0300-1234567')
+        Customer.objects.create(name='Sara', phone='0321 5550000')
+        Customer.objects.create(name='Sana', phone='03215550000')
+        product = Product.objects.create(name='Tyre', price=Decimal('200.00'), stock_quantity=10)
+        cart = {str(product.id): {'product_id': product.id, 'name': 'Tyre', 'price': '200.00', 'quantity': 1, 'subtotal': '200.00'}}
+        self.first, self.second = [
+            create_sale_from_cart(self.user, self.ali.id, cart, payment_type='INSTALLMENT',
+                                  installment_data={'total_installments': 2, 'first_due_date': due})
+            for due in ('2026-01-01', '2026-02-01')
+        ]
+
+    def _import(self, text, **kwargs):
+        report = io.StringIO()
+        summary = import_payments(io.StringIO(text), report, user=self.user, **kwargs)
+        return summary, report.getvalue().strip().splitlines()[1:]
+
+    def test_import_allocates_and_reconciles(self):
+        text = (
+            'Sale_ID,Phone,Amount,Reference\n'
+            f'{self.first.id},,50,TX1\n'
+            ',0300 1234567,300,TX2\n'
+            ',0321-5550000,10,TX3\n'
+            ',,abc,TX4\n'
+            f'{self.second.id},,5,TX1\n'
+            ',03001234567,100,TX5\n'
+        )
+        summary, report = self._import(text, batch_size=2)
+        self.assertEqual((summary['lines'], summary['payments'], summary['amount'], summary['plans_paid'], summary['unmatched']),
+                         (6, 4, Decimal('400.00'), 2, 4))
+        self.assertEqual([line.split(',')[0] + ':' + line.split(',')[-1] for line in report], [
+            '4:phone matches several customers',
+            '5:no sale id or phone',
+            '6:reference already imported',
+            '7:more than the plans owed; amount shown not allocated',
+        ])
+        self.assertIn(',50.00,TX5,', report[-1])
+        self.assertEqual(sorted(InstallmentPayment.objects.values_list('plan__sale_id', 'amount_paid')), [
+            (self.first.id, Decimal('50.00')), (self.first.id, Decimal('150.00')),
+            (self.second.id, Decimal('50.00')), (self.second.id, Decimal('150.00')),
+        ])
+        self.assertEqual(set(InstallmentPlan.objects.values_list('status', flat=True)), {'PAID'})
+        self.assertEqual(InstallmentPayment.objects.filter(received_by=self.user).count(), 4)
+        self.assertEqual(rebuild_customer_stats(), [])
+
+        # A second run of the same file skips every referenced line
+        summary, _ = self._import(text)
+        self.assertEqual((summary['payments'], summary['unmatched']), (0, 6))
+
+    def test_upload_is_imported_by_a_job(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(JOB_RESULTS_DIR=tmp):
+            upload = io.BytesIO(f'sale_id,amount\n{self.first.id},200\n999,10\n'.encode())
+            upload.name = 'bank.csv'
+            resp = self.client.post(reverse('sales:installment_import'), {'file': upload})
+            job_id = resolve(resp.url).kwargs['pk']
+            self.assertEqual(claim_jobs(1), [job_id])
+            run_job(job_id)
+            download = self.client.get(reverse('core:job_download', args=[job_id]))
+            lines = b''.join(download.streaming_content).decode().strip().splitlines()
+            download.close()
+            self.assertEqual(os.listdir(os.path.join(tmp, 'uploads')), [])
+        self.assertEqual(lines[1:], ['3,999,,10.00,,no installment plan for this sale'])
+        self.assertEqual(InstallmentPlan.objects.get(sale=self.first).status, 'PAID')
+
+    def test_fractional_payments_mark_plan_paid(self):
+        product = Product.objects.create(name='Valve', price=Decimal('0.80'), stock_quantity=1)
+        cart = {str(product.id): {'product_id': product.id, 'name': 'Valve', 'price': '0.80', 'quantity': 1, 'subtotal': '0.80'}}
+        sale = create_sale_from_cart(self.user, self.ali.id, cart, payment_type='INSTALLMENT',
+                                     installment_data={'total_installments': 2})
+        summary, report = self._import(f'sale_id,amount\n{sale.id},0.70\n{sale.id},0.10\n')
+        self.assertEqual((summary['payments'], summary['plans_paid'], report), (2, 1, []))
+        self.assertEqual(InstallmentPlan.objects.get(sale=sale).status, 'PAID')
+
+
+class SaleListFilterTests(TestCase):
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester', password='pass1234')
+        self.other = User.objects.create_user(username='other', password='pass1234')
+        self.client.login(username='tester', password='pass1234')
+        self.ali = Customer.objects.create(name='Ali', phone='123')
+        self.sara = Customer.objects.create(name='Sara', phone='456')
+        self.product = Product.objects.create(name='Tyre', price=Decimal('1000.00'), stock_quantity=50)
+
+    def _sell(self, user, customer, quantity, days_ago, payment_type='FULL'):
+        cart = {str(self.product.id): {'product_id': self.product.id, 'name': 'Tyre', 'price': '1000.00',
+                                       'quantity': quantity, 'subtotal': str(1000 * quantity)}}
+        extra = {'installment_data': {'total_installments': 2}} if payment_type == 'INSTALLMENT' else {}
+        return create_sale_from_cart(user, customer.id, cart, payment_type=payment_type,
+                                     sold_at=timezone.now() - timedelta(days=days_ago), **extra)
+
+    def test_filters_and_totals(self):
+        old = self._sell(self.user, self.ali, 1, 40)
+        mine = self._sell(self.user, self.sara, 2, 1, 'INSTALLMENT')
+        theirs = self._sell(self.other, self.ali, 3, 0)
+        url = reverse('sales:sale_list')
+
+        # session, user, branches, the count and sum, the page, the cashier list
+        with self.assertNumQueries(6):
+            resp = self.client.get(url)
+        self.assertEqual((resp.context['total_sales'], resp.context['total_revenue']), (3, Decimal('6000.00')))
+        self.assertEqual([s.id for s in resp.context['page_obj']], [theirs.id, mine.id, old.id])
+
+        resp = self.client.get(url, {'cashier': self.user.pk})
+        self.assertEqual((resp.context['total_sales'], resp.context['total_revenue']), (2, Decimal('3000.00')))
+        resp = self.client.get(url, {'payment_type': 'INSTALLMENT'})
+        self.assertEqual([s.id for s in resp.context['page_obj']], [mine.id])
+        resp = self.client.get(url, {'customer': self.ali.pk, 'filter': 'month', 'page': '1'})
+        self.assertEqual([s.id for s in resp.context['page_obj']], [theirs.id])
+        self.assertEqual(resp.context['customer_name'], 'Ali')
+        self.assertEqual(resp.context['query'], f'filter=month&customer={self.ali.pk}')
+        day = (timezone.localtime() - timedelta(days=40)).date().isoformat()
+        resp = self.client.get(url, {'start': day, 'end': day})
+        self.assertEqual([s.id for s in resp.context['page_obj']], [old.id])
+
+        # Nonsense values are dropped rather than raising
+        resp = self.client.get(url, {'cashier': 'x', 'payment_type': 'CASH', 'start': 'soon', 'filter': 'year'})
+        self.assertEqual(resp.context['total_sales'], 3)
+
+        since = (timezone.localtime() - timedelta(days=10)).date().isoformat()
+        lines = download_via_job(self.client, reverse('sales:export_csv'), {'cashier': self.user.pk, 'start': since})
+        self.assertEqual([int(line.split(',')[0]) for line in lines.strip().splitlines()[1:]], [mine.id])
+
+    def test_periods_are_local_calendar_days(self):
+        utc = dt_timezone.utc
+        # 01:30 on 2 March in Karachi (UTC+5) while it is still 1 March in UTC
+        now = datetime(2026, 3, 1, 20, 30, tzinfo=utc)
+        sales = {name: self._sell(self.user, self.ali, 1, 0) for name in ('after_midnight', 'last_night', 'first_hour')}
+        for name, sold_at in (('after_midnight', datetime(2026, 3, 1, 19, 30, tzinfo=utc)),
+                              ('last_night', datetime(2026, 3, 1, 18, 30, tzinfo=utc)),
+                              ('first_hour', datetime(2026, 2, 28, 20, 0, tzinfo=utc))):
+            Sale.objects.filter(pk=sales[name].pk).update(date=sold_at)
+        ids = {sale.pk: name for name, sale in sales.items()}
+
+        def names(period):
+            return sorted(ids[pk] for pk in filter_sales(Sale.objects.all(), {'filter': period}, now=now).values_list('pk', flat=True))
+
+        self.assertEqual(names('today'), ['after_midnight'])
+        self.assertEqual(names('month'), ['after_midnight', 'first_hour', 'last_night'])
@@ -7,9 +7,15 @@ urlpatterns = [
     path('', views.sale_list, name='sale_list'),
     # path('ledger/', views.ledger_view, name='ledger'),
     path('export/', views.export_sales_csv, name='export_csv'),
+    path('analytics/', views.sales_analytics_view, name='analytics'),
     path('<int:pk>/', views.sale_detail, name='sale_detail'),
     path('installments/', views.installment_list, name='installment_list'),
+    path('installments/import/', views.installment_import, name='installment_import'),
+    path('installments/aging/', views.aging_report, name='aging_report'),
     path('installments/<int:plan_id>/pay/', views.installment_payment_create, name='installment_payment_create'),
+    path('close/', views.day_close_list, name='day_close_list'),
+    path('close/<str:day>/', views.z_report, name='z_report'),
     path('receipt/<int:sale_id>/', views.print_receipt_view, name='receipt'),
+    path('receipts/print/', views.print_receipts_batch, name='receipts_print'),
     path('receipt/<int:sale_id>/print/', views.print_receipt_full, name='receipt_print'),
 ]
@@ -1,45 +1,86 @@
+import time
 from decimal import Decimal, ROUND_HALF_UP
 from datetime import date
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-from products.models import Product
+from core.changelog import record_change
+from core.db import retry_on_lock
+from core.metrics import CHECKOUT_LINES, CHECKOUT_SECONDS
+from products.models import Product, StockLevel
+from products.utils import default_branch
 from customers.models import Customer
-from .models import Sale, SaleItem, InstallmentPlan
+from customers.utils import record_payment, record_sale
+from .models import Sale, SaleItem, InstallmentPlan, InstallmentPayment, DayClose
+from .rollups import record_daily_sales
 
 
-def create_sale_from_cart(user, customer_id, cart, payment_type, installment_data=None):
+@retry_on_lock('checkout')
+def create_sale_from_cart(user, customer_id, cart, payment_type, installment_data=None, client_ref=None, sold_at=None,
+                          branch=None):
+    """Persist a session-style cart as a completed Sale, decrementing stock atomically.
+
+    Stock is taken from ``branch`` (the default branch if not given) and from each product's
+    shop-wide total. ``client_ref`` is an optional idempotency key (unique per sale) and
+    ``sold_at`` an optional timestamp for sales rung up offline; both are used by ingest_sales().
+    """
     if not cart or not len(cart):
         raise ValueError('Cart is empty')
 
+    started = time.perf_counter()
     with transaction.atomic():
         total = sum(Decimal(str(item['subtotal'])) for item in cart.values())
         customer = get_object_or_404(Customer, pk=customer_id)
+        branch = branch or default_branch()
         sale = Sale.objects.create(
             customer=customer,
+            branch=branch,
             created_by=user,
             payment_type=payment_type,
             total_amount=total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
             is_completed=True,
+            client_ref=client_ref,
         )
+        if sold_at is not None:
+            # date is auto_now_add, so an explicit timestamp has to be written afterwards
+            Sale.objects.filter(pk=sale.pk).update(date=sold_at)
+            sale.date = sold_at
 
-        # lock and decrement stock, create items
+        # lock all cart products and their stock at this branch in one query each, then
+        # decrement stock and insert items in bulk
+        product_ids = [int(item['product_id']) for item in cart.values()]
+        products = Product.objects.select_for_update().in_bulk(product_ids)
+        levels = {level.product_id: level for level in
+                  StockLevel.objects.select_for_update().filter(branch=branch, product_id__in=product_ids)}
+        items = []
         for item in cart.values():
-            product = Product.objects.select_for_update().get(pk=item['product_id'])
+            product = products.get(int(item['product_id']))
+            if product is None:
+                raise ValueError(f'Product {item.get("name") or item["product_id"]} no longer exists')
             qty = int(item['quantity'])
-            if product.stock_quantity < qty:
-                raise ValueError(f'Insufficient stock for {product.name}')
+            level = levels.get(product.id)
+            if level is None or level.quantity < qty:
+                raise ValueError(f'Insufficient stock for {product.name} at {branch.name}')
             unit_price = Decimal(str(item['price']))
             subtotal = (unit_price * qty).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            SaleItem.objects.create(
+            items.append(SaleItem(
                 sale=sale,
                 product=product,
                 quantity=qty,
                 unit_price=unit_price,
                 subtotal=subtotal,
-            )
+            ))
             product.stock_quantity = product.stock_quantity - qty
-            product.save(update_fields=['stock_quantity'])
+            level.quantity -= qty
+        SaleItem.objects.bulk_create(items)
+        Product.objects.bulk_update(products.values(), ['stock_quantity'])
+        StockLevel.objects.bulk_update(levels.values(), ['quantity'])
+        record_change('product', list(products))
+        record_daily_sales(timezone.localdate(sale.date), items)
 
         if payment_type == 'INSTALLMENT':
             if not installment_data:
@@ -60,4 +101,151 @@ def create_sale_from_cart(user, customer_id, cart, payment_type, installment_dat
                 first_due_date=first_due_date,
             )
 
-        return sale
+        record_sale(sale)
+    CHECKOUT_SECONDS.labels(payment_type).observe(time.perf_counter() - started)
+    CHECKOUT_LINES.observe(len(cart))
+    return sale
+
+
+def record_installment_payment(plan, amount, received_by=None):
+    """Record a payment against an installment plan and mark it PAID once fully covered.
+
+    ``received_by`` is the cashier who took the money (it counts towards their day close).
+    Updates the customer's balance in the same transaction. Returns the payment.
+    """
+    with transaction.atomic():
+        payment = InstallmentPayment.objects.create(plan=plan, amount_paid=amount, received_by=received_by)
+        record_payment(plan.sale.customer_id, amount)
+
+        # Check if installment is fully paid
+        total_paid = plan.payments.aggregate(s=Sum('amount_paid'))['s'] or Decimal('0')
+        if total_paid >= plan.sale.total_amount and plan.status != 'PAID':
+            plan.status = 'PAID'
+            plan.save(update_fields=['status'])
+    return payment
+
+
+def _cart_from_lines(lines, products):
+    """Build a create_sale_from_cart() cart from ``[{product_id, quantity, price?}]`` lines."""
+    if not lines:
+        raise ValueError('Sale has no items')
+    cart = {}
+    for line in lines:
+        product_id = int(line['product_id'])
+        qty = int(line['quantity'])
+        if qty <= 0:
+            raise ValueError('Quantity must be positive')
+        product = products.get(product_id)
+        if product is None:
+            raise ValueError(f'Unknown product {product_id}')
+        # Price the terminal charged offline wins over today's catalog price
+        price = Decimal(str(line['price'])) if line.get('price') not in (None, '') else product.price
+        key = str(product_id)
+        if key in cart:
+            cart[key]['quantity'] += qty
+        else:
+            cart[key] = {'product_id': product_id, 'name': product.name, 'price': str(price), 'quantity': qty}
+        cart[key]['subtotal'] = str((Decimal(cart[key]['price']) * cart[key]['quantity']).quantize(Decimal('0.01')))
+    return cart
+
+
+def _entry_shape_error(entry):
+    """Why an ingest entry is not shaped as documented, or None; checked before anything runs."""
+    items = entry.get('items')
+    if items is not None and (not isinstance(items, list) or not all(isinstance(line, dict) for line in items)):
+        return 'items must be a list of objects'
+    if entry.get('installment') is not None and not isinstance(entry['installment'], dict):
+        return 'installment must be an object'
+    return None
+
+
+def _parse_sold_at(value):
+    if not value:
+        return None
+    sold_at = parse_datetime(value)
+    if sold_at is None:
+        raise ValueError(f'Invalid date "{value}"')
+    if timezone.is_naive(sold_at):
+        sold_at = timezone.make_aware(sold_at)
+    return sold_at
+
+
+def ingest_sales(user, entries, chunk_size=50, default_customer_id=None, branch=None):
+    """Commit a backlog of queued terminal sales; safe to replay.
+
+    Each entry: ``{client_ref, customer_id?, payment_type, items: [{product_id, quantity,
+    price?}], installment?: {total_installments, first_due_date}, date?}``. Already-known
+    ``client_ref`` values are reported as duplicates without touching the database again.
+    A ``date`` on a day that has been closed (sales.dayclose) is rejected, since its Z-report
+    is final. Every sale is taken from ``branch``, as in create_sale_from_cart().
+    Sales are committed ``chunk_size`` per transaction, each inside its own savepoint so a
+    bad entry (stock, validation) fails alone. Returns one result dict per entry, in order.
+    """
+    results = [None] * len(entries)
+    branch = branch or default_branch()
+    refs = [str(e.get('client_ref') or '').strip() for e in entries]
+    existing = dict(Sale.objects.filter(client_ref__in=[r for r in refs if r]).values_list('client_ref', 'id'))
+
+    pending = []
+    seen = set()
+    for index, ref in enumerate(refs):
+        if not ref:
+            results[index] = {'client_ref': None, 'status': 'error', 'error': 'client_ref is required'}
+        elif ref in existing:
+            results[index] = {'client_ref': ref, 'status': 'duplicate', 'sale_id': existing[ref]}
+        elif ref in seen:
+            results[index] = {'client_ref': ref, 'status': 'error', 'error': 'client_ref repeated in batch'}
+        elif _entry_shape_error(entries[index]):
+            results[index] = {'client_ref': ref, 'status': 'error', 'error': _entry_shape_error(entries[index])}
+        else:
+            seen.add(ref)
+            pending.append(index)
+
+    product_ids = {
+        int(line['product_id'])
+        for index in pending for line in (entries[index].get('items') or [])
+        if str(line.get('product_id', '')).isdigit()
+    }
+    products = Product.objects.only('id', 'name', 'price').in_bulk(product_ids)
+    closed = {}
+
+    for start in range(0, len(pending), chunk_size):
+        with transaction.atomic():
+            for index in pending[start:start + chunk_size]:
+                entry, ref = entries[index], refs[index]
+                try:
+                    with transaction.atomic():
+                        payment_type = entry.get('payment_type') or 'FULL'
+                        if payment_type not in dict(Sale.PAYMENT_TYPE_CHOICES):
+                            raise ValueError('payment_type must be FULL or INSTALLMENT')
+                        sold_at = _parse_sold_at(entry.get('date'))
+                        if sold_at:
+                            day = timezone.localdate(sold_at)
+                            if day not in closed:
+                                closed[day] = DayClose.objects.filter(day=day).exists()
+                            if closed[day]:
+                                raise ValueError(f'{day} is already closed')
+                        sale = create_sale_from_cart(
+                            user=user,
+                            customer_id=entry.get('customer_id') or default_customer_id,
+                            cart=_cart_from_lines(entry.get('items'), products),
+                            payment_type=payment_type,
+                            installment_data=entry.get('installment'),
+                            client_ref=ref,
+                            sold_at=sold_at,
+                            branch=branch,
+                        )
+                    results[index] = {'client_ref': ref, 'status': 'created', 'sale_id': sale.id}
+                except IntegrityError:
+                    # Another request committed the same key between our check and insert; any
+                    # other violation (a CHECK constraint) means the sale was not booked at all
+                    sale_id = Sale.objects.filter(client_ref=ref).values_list('id', flat=True).first()
+                    if sale_id is None:
+                        results[index] = {'client_ref': ref, 'status': 'error', 'error': 'Sale rejected by the database'}
+                    else:
+                        results[index] = {'client_ref': ref, 'status': 'duplicate', 'sale_id': sale_id}
+                except Http404:
+                    results[index] = {'client_ref': ref, 'status': 'error', 'error': 'Unknown customer'}
+                except (ValueError, TypeError, KeyError) as e:
+                    results[index] = {'client_ref': ref, 'status': 'error', 'error': str(e) or e.__class__.__name__}
+    return results
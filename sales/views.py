@@ -1,125 +1,81 @@
+import os
+import uuid
 from decimal import Decimal
-from datetime import datetime, timedelta
-import csv
+from datetime import timedelta
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, F
-from django.http import HttpResponse
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Sum, F
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.core.paginator import Paginator
 from django.utils import timezone
+from django.utils.http import urlencode
 
-from .models import Sale, InstallmentPlan, InstallmentPayment
+from core.audit import log_event
+from core.jobs import enqueue
+from core.metrics import instrument
+from core.replica import reads_from_reporting
+from customers.models import Customer
+from .models import Sale, InstallmentPlan, InstallmentPayment, DayClose
+from .utils import record_installment_payment
+from .archive import get_sale_or_404
+from .dayclose import cashier_rows, close_day
+from .filters import clean_sale_filters, filter_sales
+from .receipts import RECEIPT_COPIES, receipt_payments, receipt_queryset, receipt_sales, render_receipts
+from .rollups import ANALYTICS_GROUPS, sales_analytics
+from .reports import AGING_BUCKETS, aging_totals, parse_date, period_start, receivables_aging
 
 
+@instrument
 @login_required
 def sale_list(request):
-    # Get filter parameter
-    date_filter = request.GET.get('filter', 'all')
-    
-    # Start with base queryset
-    qs = Sale.objects.select_related('customer').order_by('-date')
-    
-    # Apply date filters
-    now = timezone.now()
-    if date_filter == 'today':
-        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        qs = qs.filter(date__gte=start_date)
-    elif date_filter == 'week':
-        start_date = now - timedelta(days=now.weekday())  # Monday of current week
-        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        qs = qs.filter(date__gte=start_date)
-    elif date_filter == 'month':
-        start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        qs = qs.filter(date__gte=start_date)
-    
-    # Calculate totals for display
-    total_sales = qs.count()
-    total_revenue = qs.aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-    
-    page_obj = Paginator(qs, 10).get_page(request.GET.get('page'))
-    
+    filters = clean_sale_filters(request.GET)
+    qs = filter_sales(Sale.objects.all(), filters)
+
+    # One pass over the filtered range for both figures; the count also sizes the pages
+    summary = qs.aggregate(count=Count('pk'), revenue=Sum('total_amount'))
+    paginator = Paginator(qs.select_related('customer').order_by('-date', '-id'), 10)
+    paginator.count = summary['count']
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    query = {key: value for key, value in filters.items() if value and value != 'all'}
     return render(request, 'sales/sale_list.html', {
         'page_obj': page_obj,
-        'date_filter': date_filter,
-        'total_sales': total_sales,
-        'total_revenue': total_revenue,
+        'filters': filters,
+        'date_filter': filters['filter'],
+        'query': urlencode(query),
+        # Links for the period buttons keep every filter except the dates
+        'period_query': urlencode({key: value for key, value in query.items() if key not in ('filter', 'start', 'end')}),
+        'all_customers_query': urlencode({key: value for key, value in query.items() if key != 'customer'}),
+        'total_sales': summary['count'],
+        'total_revenue': summary['revenue'] or Decimal('0'),
+        'payment_types': Sale.PAYMENT_TYPE_CHOICES,
+        'cashiers': get_user_model().objects.order_by('username'),
+        'customer_name': Customer.objects.filter(pk=filters['customer']).values_list('name', flat=True).first()
+        if filters['customer'] else None,
     })
 
 
+def _queue_download(request, kind, params, filename):
+    job = enqueue(kind, request.user, params, filename)
+    messages.success(request, f'{filename} is being prepared. It will be ready to download here shortly.')
+    return redirect('core:job_detail', pk=job.pk)
+
+
+@instrument
 @login_required
 def export_sales_csv(request):
-    # Get filter parameter
-    date_filter = request.GET.get('filter', 'all')
-    
-    # Start with base queryset
-    qs = Sale.objects.select_related('customer', 'created_by').prefetch_related('items__product').order_by('-date')
-    
-    # Apply date filters
-    now = timezone.now()
-    if date_filter == 'today':
-        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        qs = qs.filter(date__gte=start_date)
-    elif date_filter == 'week':
-        start_date = now - timedelta(days=now.weekday())
-        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        qs = qs.filter(date__gte=start_date)
-    elif date_filter == 'month':
-        start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        qs = qs.filter(date__gte=start_date)
-    
-    # Create CSV response
-    response = HttpResponse(content_type='text/csv')
-    filename = f'sales_{date_filter}_{now.strftime("%Y%m%d_%H%M%S")}.csv'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    writer = csv.writer(response)
-    
-    # Write header
-    writer.writerow([
-        'Sale ID',
-        'Date',
-        'Time',
-        'Customer Name',
-        'Customer Phone',
-        'Customer Email',
-        'Payment Type',
-        'Total Amount (Rs)',
-        'Status',
-        'Processed By',
-        'Items Count',
-        'Items Details'
-    ])
-    
-    # Write data
-    for sale in qs:
-        # Get items details
-        items_details = '; '.join([
-            f"{item.product.name} (Qty: {item.quantity}, Price: Rs {item.unit_price})"
-            for item in sale.items.all()
-        ])
-        
-        writer.writerow([
-            sale.id,
-            sale.date.strftime('%Y-%m-%d'),
-            sale.date.strftime('%H:%M:%S'),
-            sale.customer.name,
-            sale.customer.phone or '',
-            sale.customer.email or '',
-            sale.get_payment_type_display(),
-            str(sale.total_amount),
-            'Completed' if sale.is_completed else 'Pending',
-            sale.created_by.username,
-            sale.items.count(),
-            items_details
-        ])
-    
-    return response
+    filters = clean_sale_filters(request.GET)
+    filename = f'sales_{filters["filter"]}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    return _queue_download(request, 'sales_export', {key: value for key, value in filters.items() if value}, filename)
 
 
+@instrument
 @login_required
 def sale_detail(request, pk):
-    sale = get_object_or_404(Sale.objects.select_related('customer').prefetch_related('items__product'), pk=pk)
+    sale = get_sale_or_404(Sale.objects.select_related('customer').prefetch_related('items__product'), pk=pk)
     plan = getattr(sale, 'installment_plan', None)
     if plan:
         payments = plan.payments.all().order_by('-payment_date')
@@ -135,6 +91,7 @@ def sale_detail(request, pk):
     })
 
 
+@instrument
 @login_required
 def installment_list(request):
     plans = InstallmentPlan.objects.select_related('sale__customer').annotate(
@@ -153,6 +110,7 @@ def installment_list(request):
     return render(request, 'sales/installment_list.html', {'page_obj': page_obj})
 
 
+@instrument
 @login_required
 def installment_payment_create(request, plan_id):
     plan = get_object_or_404(InstallmentPlan.objects.select_related('sale__customer'), pk=plan_id)
@@ -164,15 +122,10 @@ def installment_payment_create(request, plan_id):
             messages.error(request, 'Invalid amount.')
             return redirect('sales:installment_payment_create', plan_id=plan.id)
         
-        InstallmentPayment.objects.create(plan=plan, amount_paid=amount)
-        
-        # Check if installment is fully paid
-        total_paid = plan.payments.aggregate(s=Sum('amount_paid'))['s'] or Decimal('0')
-        total_due = plan.sale.total_amount
-        
-        if total_paid >= total_due:
-            plan.status = 'PAID'
-            plan.save(update_fields=['status'])
+        payment = record_installment_payment(plan, amount, received_by=request.user)
+        log_event(request.user, 'create', 'payment', payment.pk, f'Rs {amount} on sale #{plan.sale_id}')
+
+        if plan.status == 'PAID':
             messages.success(request, 'Payment recorded. Installment plan is now fully paid!')
         else:
             messages.success(request, 'Payment recorded.')
@@ -182,35 +135,177 @@ def installment_payment_create(request, plan_id):
     return render(request, 'sales/sale_form.html', {'plan': plan})
 
 
+@instrument
+@login_required
+def installment_import(request):
+    """Upload a bank payment file; it is imported by a background job whose result is the report."""
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Choose a CSV file to import.')
+            return redirect('sales:installment_import')
+        directory = os.path.join(settings.JOB_RESULTS_DIR, 'uploads')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{uuid.uuid4().hex}.csv')
+        with open(path, 'wb') as fh:
+            for chunk in upload.chunks():
+                fh.write(chunk)
+        job = enqueue('payment_import', request.user, {'path': path, 'user_id': request.user.pk},
+                      f'payments_unmatched_{timezone.now():%Y%m%d_%H%M%S}.csv')
+        messages.success(request, f'{upload.name} is being imported. Unmatched lines will be listed in the report here.')
+        return redirect('core:job_detail', pk=job.pk)
+    return render(request, 'sales/installment_import.html')
+
+
+@instrument
+@login_required
+@reads_from_reporting
+def aging_report(request):
+    customer_id = (request.GET.get('customer') or '').strip()
+    # Anything but an id would be a 500 in the filter; treat it as no filter
+    customer_id = customer_id if customer_id.isdigit() else None
+    start_date = parse_date(request.GET.get('start'))
+    end_date = parse_date(request.GET.get('end'))
+    as_of = parse_date(request.GET.get('as_of')) or timezone.localdate()
+
+    if request.GET.get('format') == 'csv':
+        params = {'customer_id': customer_id, 'start': request.GET.get('start'), 'end': request.GET.get('end'),
+                  'as_of': as_of.isoformat()}
+        return _queue_download(request, 'aging_report', params, f'aging_{as_of:%Y%m%d}.csv')
+
+    rows = list(receivables_aging(as_of=as_of, customer_id=customer_id, start_date=start_date, end_date=end_date))
+
+    page_obj = Paginator(rows, 25).get_page(request.GET.get('page'))
+    return render(request, 'sales/aging_report.html', {
+        'page_obj': page_obj,
+        'buckets': AGING_BUCKETS,
+        'totals': aging_totals(rows),
+        'customer_id': customer_id,
+        'customer_name': customer_id and Customer.objects.filter(pk=customer_id).values_list('name', flat=True).first(),
+        'start_date': request.GET.get('start', ''),
+        'end_date': request.GET.get('end', ''),
+        'as_of': as_of,
+    })
+
+
+@instrument
+@login_required
+@reads_from_reporting
+def sales_analytics_view(request):
+    group = request.GET.get('group', 'product')
+    if group not in ANALYTICS_GROUPS:
+        group = 'product'
+    today = timezone.localdate()
+    period = request.GET.get('period', '')
+    start_date = parse_date(request.GET.get('start')) or period_start(period, today)
+    end_date = parse_date(request.GET.get('end'))
+    if not start_date and not end_date and not period:
+        period, start_date = 'month', period_start('month', today)
+    per_month = request.GET.get('per_month') == '1'
+    try:
+        limit = max(int(request.GET.get('limit') or 0), 0) or None
+    except ValueError:
+        limit = None
+
+    if request.GET.get('format') == 'csv':
+        params = {'group': group, 'start': start_date and start_date.isoformat(), 'end': end_date and end_date.isoformat(),
+                  'per_month': per_month, 'limit': limit}
+        return _queue_download(request, 'sales_analytics', params, f'sales_by_{group}_{today:%Y%m%d}.csv')
+
+    rows = list(sales_analytics(group=group, start=start_date, end=end_date, per_month=per_month, limit=limit))
+    label_key = ANALYTICS_GROUPS[group][-1]
+    for row in rows:
+        row['label'] = row[label_key] or '(none)'
+
+    return render(request, 'sales/analytics.html', {
+        'rows': rows,
+        'groups': list(ANALYTICS_GROUPS),
+        'group': group,
+        'period': period,
+        'start_date': start_date,
+        'end_date': end_date,
+        'per_month': per_month,
+        'limit': limit or '',
+        'total_quantity': sum(r['quantity'] for r in rows),
+        'total_revenue': sum((r['revenue'] for r in rows), Decimal('0')),
+    })
+
+
+@instrument
+@login_required
+def day_close_list(request):
+    today = timezone.localdate()
+    yesterday = today - timedelta(days=1)
+    if request.method == 'POST':
+        raw_day = (request.POST.get('day') or '').strip()
+        day = parse_date(raw_day) if raw_day else yesterday
+        if day is None:
+            messages.error(request, f'"{raw_day}" is not a valid date.')
+            return redirect('sales:day_close_list')
+        try:
+            close = close_day(day, request.user)
+        except ValueError as exc:
+            messages.error(request, str(exc))
+            return redirect('sales:day_close_list')
+        messages.success(request, f'{day} closed.')
+        return redirect('sales:z_report', day=close.day.isoformat())
+
+    closes = DayClose.objects.select_related('closed_by').defer('cashiers')
+    page_obj = Paginator(closes, 25).get_page(request.GET.get('page'))
+    return render(request, 'sales/day_close_list.html', {
+        'page_obj': page_obj,
+        'today': today,
+        'yesterday': yesterday,
+        # Running totals for the open day, so the till can be checked during the day
+        'open_rows': cashier_rows(today),
+    })
+
+
+@instrument
+@login_required
+def z_report(request, day):
+    day = parse_date(day)
+    if day is None:
+        raise Http404('Invalid date')
+    close = get_object_or_404(DayClose.objects.select_related('closed_by'), day=day)
+    return render(request, 'sales/z_report.html', {'close': close})
+
+
+@instrument
 @login_required
 def print_receipt_view(request, sale_id):
-    sale = get_object_or_404(Sale.objects.select_related('customer').prefetch_related('items__product'), pk=sale_id)
+    sale = get_sale_or_404(Sale.objects.select_related('customer').prefetch_related('items__product'), pk=sale_id)
     return render(request, 'sales/receipt.html', {'sale': sale})
 
 
+@instrument
 @login_required
 def print_receipt_full(request, sale_id):
-    sale = get_object_or_404(
-        Sale.objects.select_related('customer', 'installment_plan')
-        .prefetch_related('items__product', 'installment_plan__payments'),
-        pk=sale_id
-    )
-    
-    # Get payment history for installments
-    payments = []
-    if hasattr(sale, 'installment_plan'):
-        payments = sale.installment_plan.payments.all().order_by('payment_date')
-    
-    # Three copies: Office Copy, Customer Copy, Accounts Copy
-    copy_labels = ['Office Copy', 'Customer Copy', 'Accounts Copy']
-    
+    sale = get_sale_or_404(receipt_queryset(), pk=sale_id)
     return render(request, 'sales/receipt_print.html', {
+        'title': f'Receipt #{sale.id} - Print',
         'sale': sale,
-        'payments': payments,
-        'copy_labels': copy_labels,
+        'payments': receipt_payments(sale),
+        # Three copies: Office Copy, Customer Copy, Accounts Copy
+        'copy_labels': RECEIPT_COPIES,
     })
 
 
+@instrument
+@login_required
+def print_receipts_batch(request):
+    """Every receipt for a date range and/or list of sale numbers as one streamed print document."""
+    start = parse_date(request.GET.get('start'))
+    end = parse_date(request.GET.get('end'))
+    ids = [int(value) for raw in request.GET.getlist('ids') for value in raw.split(',') if value.strip().isdigit()]
+    if not (start or end or ids):
+        messages.error(request, 'Choose a date range or sale numbers to print.')
+        return redirect('sales:sale_list')
+    title = f'Receipts {start or ""} - {end or ""}' if start or end else 'Receipts'
+    return StreamingHttpResponse(render_receipts(receipt_sales(start, end, ids), title=title),
+                                 content_type='text/html; charset=utf-8')
+
+
 # @login_required
 # def ledger_view(request):
 #     """General ledger combining sales (debits) and installment payments (credits).
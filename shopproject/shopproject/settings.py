@@ -1,11 +1,21 @@
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# DJANGO_ENV=production: DEBUG off, secret and hosts from the environment, cached templates
+# compiled (and checked) at startup
+PRODUCTION = os.environ.get('DJANGO_ENV') == 'production'
+
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'dev-secret-key-change-me')
-DEBUG = True
-ALLOWED_HOSTS = ['*']
+if PRODUCTION and 'DJANGO_SECRET_KEY' not in os.environ:
+    raise ImproperlyConfigured('DJANGO_SECRET_KEY must be set when DJANGO_ENV=production')
+DEBUG = os.environ.get('DJANGO_DEBUG', '0' if PRODUCTION else '1') == '1'
+if PRODUCTION and not os.environ.get('DJANGO_ALLOWED_HOSTS'):
+    raise ImproperlyConfigured('DJANGO_ALLOWED_HOSTS must be set when DJANGO_ENV=production')
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', '*').split(',')
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -22,10 +32,12 @@ INSTALLED_APPS = [
     'customers',
     'sales',
     'dashboard',
+    'api',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.PrecompressedStaticMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -47,21 +59,84 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'products.context_processors.branches',
             ],
         },
     },
 ]
 
+if PRODUCTION:
+    # Explicit loaders replace APP_DIRS so templates are parsed once per process
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+# Compile every template when the app registry is ready and refuse to start if one is broken
+PRECOMPILE_TEMPLATES = os.environ.get('PRECOMPILE_TEMPLATES', '1' if PRODUCTION else '0') == '1'
+
+# Cold start (interpreter to WSGI application ready) allowed by the startup test and `manage.py startup_report --check`
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 2.0))
+
 WSGI_APPLICATION = 'shopproject.wsgi.application'
 ASGI_APPLICATION = 'shopproject.asgi.application'
 
+# `manage.py test` writes audit events immediately (see core/testing.py)
+TEST_RUNNER = 'core.testing.TestRunner'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Fully paid sales older than SALES_ARCHIVE_AFTER_DAYS, moved by `manage.py archive_sales`
+    'archive': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SALES_ARCHIVE_DB', BASE_DIR / 'archive.sqlite3'),
+    },
+    # Snapshot of 'default' for dashboards, exports and reports, refreshed by `manage.py refresh_reporting_db`
+    'reporting': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('REPORTING_DB', BASE_DIR / 'reporting.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['sales.routers.SalesArchiveRouter', 'core.routers.ReportingRouter']
+
+SALES_ARCHIVE_AFTER_DAYS = int(os.environ.get('SALES_ARCHIVE_AFTER_DAYS', 730))
+
+# Background jobs (`manage.py run_jobs`): result files, how long finished jobs are kept, how
+# often a worker touches the jobs it runs, and after how long untouched a running job is taken
+# to be abandoned by a dead worker
+JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR', BASE_DIR / 'job_results')
+JOB_RESULT_RETENTION_HOURS = int(os.environ.get('JOB_RESULT_RETENTION_HOURS', 72))
+JOB_HEARTBEAT_SECONDS = int(os.environ.get('JOB_HEARTBEAT_SECONDS', 30))
+JOB_STALE_AFTER_MINUTES = int(os.environ.get('JOB_STALE_AFTER_MINUTES', 5))
+
+# `manage.py maintain_db`: online snapshots of the database and how many to keep
+BACKUP_DIR = os.environ.get('BACKUP_DIR', BASE_DIR / 'backups')
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 7))
+# `manage.py audit_data` reports
+AUDIT_DIR = os.environ.get('AUDIT_DIR', BASE_DIR / 'audit')
+# Audit log of user actions: queued per process and written by a background thread every
+# AUDIT_FLUSH_SECONDS or once AUDIT_BATCH_SIZE events are waiting (0 seconds writes each event at once)
+AUDIT_FLUSH_SECONDS = float(os.environ.get('AUDIT_FLUSH_SECONDS', 5))
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+# Events kept in memory while the database cannot be written
+AUDIT_MAX_BUFFERED = int(os.environ.get('AUDIT_MAX_BUFFERED', 10000))
+
+# Per-process metric files summed by /metrics; unset keeps metrics in memory (one process)
+METRICS_DIR = os.environ.get('METRICS_DIR', BASE_DIR / 'metrics' if PRODUCTION else None)
+# Lets a Prometheus scraper read /metrics without a staff session
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Views opted into the reporting copy read the primary instead once it is older than this (seconds)
+REPORTING_MAX_STALENESS = int(os.environ.get('REPORTING_MAX_STALENESS', 900))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -83,7 +158,15 @@ USE_I18N = True
 USE_TZ = True
 
 STATIC_URL = 'static/'
-STATICFILES_DIRS = []
+STATICFILES_DIRS = [BASE_DIR.parent / 'static']
+# `manage.py collectstatic` target, served by core.middleware.PrecompressedStaticMiddleware
+STATIC_ROOT = os.environ.get('STATIC_ROOT', BASE_DIR / 'staticfiles')
+if PRODUCTION:
+    # Fingerprinted names plus .gz/.br copies; needs collectstatic before the first request
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage'},
+    }
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'accounts:login'
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import RedirectView
 
+from core.views import audit_log, metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
@@ -9,5 +11,9 @@ urlpatterns = [
     path('customers/', include('customers.urls')),
     path('sales/', include('sales.urls')),
     path('dashboard/', include('dashboard.urls')),
+    path('api/', include('api.urls')),
+    path('jobs/', include('core.urls')),
+    path('audit/', audit_log, name='audit_log'),
+    path('metrics', metrics_view, name='metrics'),
     path('', RedirectView.as_view(pattern_name='dashboard:dashboard_view', permanent=False)),
 ]
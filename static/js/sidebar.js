@@ -0,0 +1,27 @@
+// Mobile sidebar toggle functionality
+const hamburgerBtn = document.getElementById('hamburgerBtn');
+const mobileSidebar = document.getElementById('mobileSidebar');
+const sidebarContent = document.getElementById('sidebarContent');
+const closeSidebar = document.getElementById('closeSidebar');
+const sidebarBackdrop = document.getElementById('sidebarBackdrop');
+
+if (hamburgerBtn) {
+  // Open sidebar
+  hamburgerBtn.addEventListener('click', () => {
+    mobileSidebar.classList.remove('hidden');
+    setTimeout(() => {
+      sidebarContent.classList.remove('-translate-x-full');
+    }, 10);
+  });
+
+  // Close sidebar
+  const closeSidebarHandler = () => {
+    sidebarContent.classList.add('-translate-x-full');
+    setTimeout(() => {
+      mobileSidebar.classList.add('hidden');
+    }, 300);
+  };
+
+  closeSidebar.addEventListener('click', closeSidebarHandler);
+  sidebarBackdrop.addEventListener('click', closeSidebarHandler);
+}